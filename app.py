@@ -250,6 +250,20 @@ def show_settings_page():
         if st.button("💾 حفظ Supabase", use_container_width=True, key="save_supabase"):
             st.session_state.supabase_url = su; st.session_state.supabase_key = sk; st.success("✅ تم الحفظ!")
 
+    # ── توجيه المزودين ────────────────────────────────────────────────
+    with st.expander("🧭 توجيه المزودين (تلقائي حسب السرعة والأخطاء والتكلفة)"):
+        st.caption("تلقائي = الموجّه يختار الأسرع والأسلم حالياً — أو ثبّت مزوداً لهذه الجلسة")
+        for kind, label, choices in (
+            ("image", "🖼️ الصور", ["", "fal", "gemini"]),
+            ("text",  "✍️ النصوص", ["", "openrouter", "gemini"]),
+            ("video", "🎬 الفيديو", ["", "kling", "hailuo", "seedance", "luma", "runway"]),
+        ):
+            current = st.session_state.get(f"pin_{kind}", "")
+            st.session_state[f"pin_{kind}"] = st.selectbox(
+                label, choices, index=choices.index(current) if current in choices else 0,
+                format_func=lambda x: x or "🧭 تلقائي", key=f"pin_{kind}_input",
+            )
+
     st.markdown("---")
     if st.button("💾 حفظ جميع الإعدادات", type="primary", use_container_width=True, key="save_all"):
         for attr,key in [("gemini_key","gemini_key_input"),("openrouter_key","openrouter_key_input"),
@@ -281,6 +295,8 @@ IMGBB_API_KEY     = "YOUR_KEY"
 MAKE_WEBHOOK_URL  = "https://hook..."
 SUPABASE_URL      = "https://..."
 SUPABASE_KEY      = "YOUR_KEY"
+# اختياري — حدود المعدل لمفاتيح مدفوعة (الافتراضي حدود المستوى المجاني)
+MAHWOUS_RPM       = "gemini:gemini-2.0-flash=2000, gemini:imagen-3.0-generate-002=20"
 """, language="toml")
 
 
@@ -297,6 +313,17 @@ def show_stats_page():
     c3.metric("✍️ التعليقات", "✅" if "captions_data" in st.session_state else "—")
     c4.metric("🎬 الفيديو", "✅" if st.session_state.get("video_url_ready") else "—")
 
+    from modules.router import ROUTER
+    from modules.circuit import BREAKER
+    routes = ROUTER.snapshot()
+    if routes:
+        st.markdown("#### 🧭 أداء المزودين")
+        st.dataframe(routes, use_container_width=True, hide_index=True)
+    circuits = BREAKER.snapshot()
+    if circuits:
+        st.markdown("#### 🔌 مزودون متوقفون مؤقتاً")
+        st.dataframe(circuits, use_container_width=True, hide_index=True)
+
 
 def show_help_page():
     st.markdown("""<div style="background:linear-gradient(135deg,#1A0E02,#2A1A06);
@@ -48,12 +48,26 @@ h1,h2,h3{color:#6EB4FF!important}
 for k, v in {
     "gemini_key": "", "gen_count": 0,
     "last_text": "", "last_images": {}, "last_audio": None,
-    "veo_operation": None, "veo_state": "idle", "veo_url": None
+    "veo_operation": None, "veo_state": "idle", "veo_url": None, "veo_job": None
 }.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
 
+def _sync_veo_job():
+    """قراءة حالة Veo من المُتابِع الخلفي — إعادة رسم كاملة عند الاكتمال"""
+    from modules.video_poller import POLLER, FINAL_STATES
+    status = POLLER.status(st.session_state.veo_job or "")
+    if not status or status["state"] not in FINAL_STATES:
+        return
+    if status["state"] == "completed":
+        st.session_state.veo_state = "completed"
+        st.session_state.veo_url = status.get("video_url", "")
+    else:
+        st.session_state.veo_state = "failed"
+    st.rerun(scope="app")
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # SIDEBAR
 # ══════════════════════════════════════════════════════════════════════════════
@@ -206,6 +220,7 @@ with tab1:
         }
         system_prompt = systems.get(txt_mode, "أنت مساعد إبداعي.")
 
+        fresh = st.checkbox("🔄 نص جديد (تجاهل النتيجة المحفوظة)", key="txt_fresh")
         if st.button("✨ توليد النص", type="primary", use_container_width=True):
             if not user_prompt.strip():
                 st.warning("أدخل فكرتك أولاً")
@@ -215,7 +230,7 @@ with tab1:
                 with st.spinner("🧠 Gemini يكتب..."):
                     try:
                         from modules.gemini_engine import gemini_text
-                        result = gemini_text(user_prompt, system_prompt)
+                        result = gemini_text(user_prompt, system_prompt, fresh=fresh)
                         st.session_state.last_text = result
                         st.session_state.gen_count += 1
                     except Exception as e:
@@ -371,11 +386,17 @@ with tab3:
                             result = gemini_video_start(
                                 vid_prompt, vid_aspect, vid_duration, ref_bytes
                             )
+                            from modules.video_poller import POLLER
                             st.session_state.veo_operation = result["operation"]
+                            # المتابعة في الخلفية — المفتاح يُمرَّر لأن خيط المتابعة لا يرى الجلسة
+                            st.session_state.veo_job = POLLER.track(
+                                "veo", result["operation"],
+                                api_key=st.session_state.gemini_key, label="Veo 3.1",
+                            )
                             st.session_state.veo_state = "processing"
                             st.session_state.veo_url = None
                             st.session_state.gen_count += 1
-                            st.success("✅ تم الإرسال! اضغط 'تحديث الحالة' خلال 3-5 دقائق")
+                            st.success("✅ تم الإرسال! الحالة تُحدَّث تلقائياً — يمكنك متابعة العمل")
                         except Exception as e:
                             st.error(f"❌ {e}")
 
@@ -384,8 +405,11 @@ with tab3:
                          disabled=(not st.session_state.veo_operation)):
                 with st.spinner("فحص..."):
                     try:
-                        from modules.gemini_engine import gemini_video_status, gemini_video_download
-                        status = gemini_video_status(st.session_state.veo_operation)
+                        from modules.gemini_engine import gemini_video_status
+                        from modules.video_poller import POLLER
+                        status = (POLLER.status(st.session_state.veo_job or "")
+                                  or gemini_video_status(st.session_state.veo_operation))
+                        status.setdefault("video_uri", status.get("video_url", ""))
                         if status["state"] == "completed":
                             st.session_state.veo_state = "completed"
                             st.session_state.veo_url = status.get("video_uri", "")
@@ -418,7 +442,9 @@ with tab3:
         </div>""", unsafe_allow_html=True)
 
         if st.session_state.veo_state == "processing":
-            st.info("⏳ Veo 3.1 يحتاج 3-5 دقائق — اضغط 'تحديث الحالة' كل دقيقة")
+            st.info("⏳ Veo 3.1 يحتاج 3-5 دقائق — الحالة تُحدَّث تلقائياً")
+            if st.session_state.veo_job:
+                st.fragment(_sync_veo_job, run_every=5)()
 
         if st.session_state.veo_url:
             st.video(st.session_state.veo_url)
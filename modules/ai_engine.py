@@ -3,14 +3,32 @@
 Gemini 2.0 Flash + Imagen 3 + Claude 3.5 Sonnet + Luma + RunwayML + Fal.ai + ElevenLabs
 """
 
-import streamlit as st
 import requests
 import json
 import base64
+import contextlib
+import contextvars
 import os
+import sys
 import time
-import concurrent.futures
-from typing import Optional
+from types import MappingProxyType
+from typing import Iterator, Mapping, Optional
+
+from modules import http_client
+from modules.analysis_cache import ANALYSIS_CACHE
+from modules.artifacts import ImageArtifact, as_bytes
+from modules.assets import ASSETS, image_ref
+from modules.deadline import entry_point
+from modules.disk_cache import cached_image, content_key, store_image
+from modules.imaging import resize_variants
+from modules.json_repair import (
+    NUMBER, STRING, STRING_LIST, extract_json, missing_fields, schema_object, top_level_keys,
+)
+from modules.json_stream import JsonFieldStream
+from modules.llm_cache import cache_fresh, cacheable, cached_completion, store_completion
+from modules.router import ROUTER, estimate_cost, request_class
+from modules.single_flight import SingleFlight
+from modules.usage import API, BUNDLE, CACHE, current_usage, track_usage
 
 # ══════════════════════════════════════════════════════════════════════════════
 # الثوابت
@@ -47,42 +65,117 @@ FAL_VIDEO_MODELS = {
     "svd":        "fal-ai/stable-video",
 }
 
+# نماذج كل مزود صور بترتيب المحاولة — للبحث في الكاش قبل التوجيه
+IMAGE_BACKEND_MODELS = {
+    "fal":    ["fal-ai/flux/dev"],
+    "gemini": [
+        "imagen-3.0-generate-002",
+        "gemini-2.0-flash-exp-image-generation",
+        "gemini-2.0-flash-preview-image-generation",
+    ],
+}
+
+# نماذج Gemini للنصوص — الترتيب الافتراضي قبل أن يتعلم الموجّه
+GEMINI_TEXT_MODELS = [
+    "gemini-2.0-flash-lite",
+    "gemini-2.0-flash",
+    "gemini-1.5-flash-8b",
+]
+
+# نموذج OpenRouter للنصوص وحرارة التوليد — جزء من مفتاح كاش الردود
+OPENROUTER_TEXT_MODEL = "anthropic/claude-3.5-sonnet"
+TEXT_TEMPERATURE = 0.8
+
 # ══════════════════════════════════════════════════════════════════════════════
 # الأسرار / المفاتيح
 # ══════════════════════════════════════════════════════════════════════════════
 
-def _get_secrets() -> dict:
-    """جلب مفاتيح API من Streamlit secrets أو session_state"""
-    def _get(toml_key: str, session_key: str, env_key: str = "") -> str:
-        # 1) session_state
-        val = st.session_state.get(session_key, "")
-        if val:
-            return val
-        # 2) streamlit secrets
+def _streamlit():
+    """وحدة streamlit إن كانت الواجهة تعمل — None في الوضع الدفعي (لا نستوردها أبداً هنا)"""
+    return sys.modules.get("streamlit")
+
+
+_FILE_SECRETS = None
+
+
+def _file_secrets() -> dict:
+    """قراءة secrets.toml مباشرة خارج Streamlit (MAHWOUS_SECRETS_FILE أو .streamlit/secrets.toml)"""
+    global _FILE_SECRETS
+    if _FILE_SECRETS is None:
+        path = os.environ.get(
+            "MAHWOUS_SECRETS_FILE",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         ".streamlit", "secrets.toml"),
+        )
         try:
-            return st.secrets.get(toml_key, "")
+            import tomllib
+            with open(path, "rb") as f:
+                _FILE_SECRETS = tomllib.load(f)
         except Exception:
-            pass
-        # 3) env var
-        if env_key:
-            return os.environ.get(env_key, "")
-        return ""
+            _FILE_SECRETS = {}
+    return _FILE_SECRETS
+
+
+# لقطة المفاتيح النشطة في السياق الحالي — تنتقل تلقائياً إلى asyncio.to_thread
+_ACTIVE_CREDENTIALS: contextvars.ContextVar = contextvars.ContextVar(
+    "mahwous_credentials", default=None
+)
+
+
+def snapshot_credentials() -> Mapping:
+    """
+    لقطة ثابتة (للقراءة فقط) لكل المفاتيح — تُحلّ مرة واحدة على خيط السكربت
+    ثم تُمرَّر للعمّال فلا يلمس أي خيط st.session_state أو os.environ
+    """
+    secrets = dict(_get_secrets())
+    secrets["pins"] = MappingProxyType(dict(secrets.get("pins") or {}))
+    return MappingProxyType(secrets)
+
+
+@contextlib.contextmanager
+def use_credentials(creds: Optional[Mapping]):
+    """تفعيل لقطة مفاتيح لكل استدعاءات المحرك داخل الكتلة (وما تطلقه من مهام/خيوط)"""
+    token = _ACTIVE_CREDENTIALS.set(creds)
+    try:
+        yield creds
+    finally:
+        _ACTIVE_CREDENTIALS.reset(token)
+
+
+def _get_secrets(creds: Optional[Mapping] = None) -> Mapping:
+    """جلب المفاتيح: اللقطة الممررة ← اللقطة النشطة ← الحل المباشر"""
+    if creds is not None:
+        return creds
+    active = _ACTIVE_CREDENTIALS.get()
+    if active is not None:
+        return active
+    return _resolve_secrets()
+
+
+def _resolve_secrets() -> dict:
+    """جلب مفاتيح API من session_state أو Streamlit secrets أو متغيرات البيئة أو secrets.toml"""
+    st = _streamlit()
 
     def _get_any(*keys_and_sessions) -> str:
         """يجرب أسماء مفاتيح متعددة للتوافق مع الإصدارات القديمة"""
         for toml_key, session_key in keys_and_sessions:
-            val = st.session_state.get(session_key, "")
-            if val:
-                return val
-            try:
-                v = st.secrets.get(toml_key, "")
-                if v:
-                    return v
-            except Exception:
-                pass
+            if st is not None:
+                val = st.session_state.get(session_key, "")
+                if val:
+                    return val
+                try:
+                    v = st.secrets.get(toml_key, "")
+                    if v:
+                        return v
+                except Exception:
+                    pass
             v = os.environ.get(toml_key, "")
             if v:
                 return v
+            if st is None:
+                v = _file_secrets().get(toml_key, "")
+                if v:
+                    return v
         return ""
 
     return {
@@ -97,6 +190,9 @@ def _get_secrets() -> dict:
         "webhook":      _get_any(("MAKE_WEBHOOK_URL","webhook_url"), ("WEBHOOK_URL","webhook_url")),
         "supabase_url": _get_any(("SUPABASE_URL","supabase_url"),),
         "supabase_key": _get_any(("SUPABASE_KEY","supabase_key"),),
+        # تثبيت مزود لكل نوع (image / text / video) — فارغ = توجيه تلقائي
+        "pins": {kind: _get_any((f"MAHWOUS_PIN_{kind.upper()}", f"pin_{kind}"),)
+                 for kind in ("image", "text", "video")},
     }
 
 
@@ -108,7 +204,7 @@ def check_api_health() -> dict:
     # Gemini
     if secrets.get("gemini"):
         try:
-            r = requests.get(
+            r = http_client.get(
                 f"https://generativelanguage.googleapis.com/v1beta/models?key={secrets['gemini']}",
                 timeout=8
             )
@@ -121,7 +217,7 @@ def check_api_health() -> dict:
     # Luma
     if secrets.get("luma"):
         try:
-            r = requests.get("https://api.lumalabs.ai/dream-machine/v1/generations",
+            r = http_client.get("https://api.lumalabs.ai/dream-machine/v1/generations",
                              headers={"Authorization": f"Bearer {secrets['luma']}"}, timeout=8)
             results["luma"] = {"ok": r.status_code in [200, 404], "msg": "متصل" if r.status_code in [200, 404] else f"خطأ {r.status_code}"}
         except Exception as e:
@@ -132,7 +228,7 @@ def check_api_health() -> dict:
     # OpenRouter
     if secrets.get("openrouter"):
         try:
-            r = requests.get("https://openrouter.ai/api/v1/models",
+            r = http_client.get("https://openrouter.ai/api/v1/models",
                              headers={"Authorization": f"Bearer {secrets['openrouter']}"}, timeout=8)
             results["openrouter"] = {"ok": r.status_code == 200, "msg": "متصل" if r.status_code == 200 else f"خطأ {r.status_code}"}
         except Exception as e:
@@ -150,8 +246,17 @@ def check_api_health() -> dict:
 # تحليل صورة العطر
 # ══════════════════════════════════════════════════════════════════════════════
 
-def analyze_perfume_image(image_bytes: bytes) -> dict:
-    """تحليل صورة العطر بـ Gemini 2.0 Flash Vision"""
+@entry_point("analysis")
+def analyze_perfume_image(image_bytes: bytes, fresh: bool = False) -> dict:
+    """
+    تحليل صورة العطر بـ Gemini 2.0 Flash Vision — الصور المتطابقة إدراكياً
+    (إعادة رفع/ضغط/تغيير مقاس) تُعيد التحليل المحفوظ. fresh=True يعيد التحليل
+    """
+    if not fresh:
+        cached = ANALYSIS_CACHE.lookup(image_bytes)
+        if cached:
+            return cached
+
     secrets = _get_secrets()
     api_key = secrets.get("gemini")
     if not api_key:
@@ -192,9 +297,10 @@ def analyze_perfume_image(image_bytes: bytes) -> dict:
     ]
 
     last_error = None
+    partial = None
     for model in models_to_try:
         try:
-            resp = requests.post(
+            resp = http_client.post(
                 f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}",
                 json=payload, timeout=30
             )
@@ -202,24 +308,31 @@ def analyze_perfume_image(image_bytes: bytes) -> dict:
                 last_error = f"404 النموذج {model} غير متاح"
                 continue
             if resp.status_code == 429:
+                # طبقة HTTP استنفدت محاولاتها مع التراجع — انتقل للنموذج التالي
                 last_error = f"429 Rate Limit on {model}"
-                time.sleep(2)
                 continue
             resp.raise_for_status()
-            text = resp.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
-            if "```" in text:
-                text = text.split("```")[1].lstrip("json").strip()
-            return json.loads(text)
+            text = resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+            info = _as_object(extract_json(text))
+            if missing_fields(info, PERFUME_INFO_SCHEMA):
+                # العلامة/الاسم ناقصان — نجرب النموذج التالي ونحتفظ بهذا الرد احتياطاً
+                partial = partial or info
+                last_error = f"حقول ناقصة من {model}: {missing_fields(info, PERFUME_INFO_SCHEMA)}"
+                continue
+            # التحليل الناقص لا يُحفظ — الرفع التالي يحاول من جديد
+            ANALYSIS_CACHE.store(image_bytes, info)
+            return info
         except requests.exceptions.HTTPError as e:
             if e.response is not None and e.response.status_code in [404, 429]:
                 last_error = str(e)
-                time.sleep(2)
                 continue
             raise
         except Exception as e:
             last_error = str(e)
             continue
 
+    if partial:
+        return partial
     raise ValueError(f"فشل تحليل الصورة بجميع النماذج: {last_error}")
 
 
@@ -278,13 +391,20 @@ def _build_image_prompt(info: dict, platform_key: str, outfit: str, scene: str,
         )
 
 
-def generate_image_gemini(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
+@entry_point("image")
+def generate_image_gemini(prompt: str, aspect: str = "1:1",
+                          creds: Optional[Mapping] = None) -> Optional[bytes]:
     """توليد صورة بـ Imagen 3 أو Gemini 2.0 Flash (يولّد صوراً مجاناً)"""
-    secrets = _get_secrets()
+    secrets = _get_secrets(creds)
     api_key = secrets.get("gemini")
     if not api_key:
         raise ValueError("GEMINI_API_KEY مفقود")
 
+    models_img = IMAGE_BACKEND_MODELS["gemini"][1:]
+    cached = cached_image(prompt, aspect, "gemini", IMAGE_BACKEND_MODELS["gemini"])
+    if cached:
+        return cached
+
     # ─── المحاولة الأولى: Imagen 3 (يتطلب تفعيل الفوترة في Google Cloud) ───
     aspect_map = {"1:1": "1:1", "9:16": "9:16", "16:9": "16:9", "2:3": "2:3"}
     ar = aspect_map.get(aspect, "1:1")
@@ -298,7 +418,7 @@ def generate_image_gemini(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
         }
     }
     try:
-        resp = requests.post(
+        resp = http_client.post(
             f"https://generativelanguage.googleapis.com/v1beta/models/imagen-3.0-generate-002:predict?key={api_key}",
             json=payload_imagen,
             timeout=60
@@ -309,7 +429,9 @@ def generate_image_gemini(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
             if predictions:
                 b64_img = predictions[0].get("bytesBase64Encoded") or predictions[0].get("imageBytes", "")
                 if b64_img:
-                    return base64.b64decode(b64_img)
+                    img = base64.b64decode(b64_img)
+                    store_image(prompt, aspect, "gemini", "imagen-3.0-generate-002", img)
+                    return img
         # 403 = فوترة غير مفعّلة — ننتقل للبديل المجاني
         if resp.status_code in [403, 400]:
             pass  # سنجرب Gemini Flash أدناه
@@ -330,12 +452,8 @@ def generate_image_gemini(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
                 "temperature": 1.0,
             }
         }
-        models_img = [
-            "gemini-2.0-flash-exp-image-generation",
-            "gemini-2.0-flash-preview-image-generation",
-        ]
         for model in models_img:
-            r2 = requests.post(
+            r2 = http_client.post(
                 f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}",
                 json=payload_flash,
                 timeout=90
@@ -345,7 +463,9 @@ def generate_image_gemini(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
                 for part in parts:
                     inline = part.get("inlineData", {})
                     if inline.get("mimeType", "").startswith("image"):
-                        return base64.b64decode(inline["data"])
+                        img = base64.b64decode(inline["data"])
+                        store_image(prompt, aspect, "gemini", model, img)
+                        return img
     except Exception:
         pass
 
@@ -355,34 +475,92 @@ def generate_image_gemini(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
     )
 
 
-def smart_generate_image(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
-    """توليد صورة ذكي: يجرب Fal.ai أولاً ثم Gemini Imagen — مع رسائل خطأ واضحة"""
-    errors = []
+@entry_point("image")
+def smart_generate_image(prompt: str, aspect: str = "1:1",
+                         creds: Optional[Mapping] = None):
+    """
+    توليد صورة ذكي: يجرب Fal.ai أولاً ثم Gemini Imagen — مع رسائل خطأ واضحة.
+    يُرجع bytes أو ImageArtifact (نتيجة Fal) — as_bytes() عند الحاجة للبايتات
+    """
+    return generate_image_with_provider(prompt, aspect, creds)[0]
 
-    # 1) جرّب Fal.ai أولاً (الأكثر موثوقية)
-    try:
-        return _generate_image_fal_flux(prompt, aspect)
-    except ValueError as e:
-        err = str(e)
-        if "FAL_API_KEY مفقود" not in err:
-            errors.append(f"Fal.ai: {err}")
-    except Exception as e:
-        errors.append(f"Fal.ai: {str(e)[:120]}")
 
-    # 2) جرّب Gemini Imagen 3
+def _route_pin(kind: str, secrets: Mapping) -> str:
+    """المزود المثبَّت لهذا المشغّل (من الإعدادات) — فارغ = توجيه تلقائي"""
+    return (secrets.get("pins") or {}).get(kind, "")
+
+
+def _image_error(backend: str, e: Exception) -> str:
+    err = str(e)
+    if backend == "fal":
+        return f"Fal.ai: {err[:120]}"
+    # Imagen 3 يتطلب تفعيل الفوترة في Google Cloud
+    if "403" in err or "PERMISSION_DENIED" in err or "billing" in err.lower():
+        return "Imagen 3: يتطلب تفعيل الفوترة في Google Cloud Console — فعّل Billing أو استخدم FAL_API_KEY بدلاً منه"
+    if "400" in err or "INVALID" in err.upper():
+        return "Imagen 3: معامل خاطئ — " + err[:100]
+    return f"Imagen 3: {err[:120]}"
+
+
+def cached_image_any(prompt: str, aspect: str = "1:1") -> Optional[tuple]:
+    """(بايتات، مزود) لصورة محفوظة لنفس البرومت والنسبة من أي مزود — أو None"""
+    for backend, models in IMAGE_BACKEND_MODELS.items():
+        cached = cached_image(prompt, aspect, backend, models)
+        if cached:
+            return cached, backend
+    return None
+
+
+def image_backend_order(aspect: str = "1:1", creds: Optional[Mapping] = None) -> tuple:
+    """(فئة الطلب، مزودو الصور المتاحون مرتبين حسب الموجّه)"""
+    secrets = _get_secrets(creds)
+    klass = request_class("image", aspect)
+    backends = [b for b in IMAGE_BACKEND_MODELS if secrets.get(b)]
+    order = ROUTER.order(klass, backends, _route_pin("image", secrets),
+                         costs={b: estimate_cost(b, "image") for b in backends})
+    return klass, order
+
+
+def generate_image_on(backend: str, prompt: str, aspect: str = "1:1",
+                      creds: Optional[Mapping] = None):
+    """توليد صورة لدى مزود محدد وتسجيل زمنه ونتيجته لدى الموجّه"""
+    generate = _generate_image_fal_flux if backend == "fal" else generate_image_gemini
+    klass = request_class("image", aspect)
+    started = time.monotonic()
     try:
-        return generate_image_gemini(prompt, aspect)
-    except ValueError as e:
-        err = str(e)
-        # Imagen 3 يتطلب تفعيل الفوترة في Google Cloud
-        if "403" in err or "PERMISSION_DENIED" in err or "billing" in err.lower():
-            errors.append("Imagen 3: يتطلب تفعيل الفوترة في Google Cloud Console — فعّل Billing أو استخدم FAL_API_KEY بدلاً منه")
-        elif "400" in err or "INVALID" in err.upper():
-            errors.append("Imagen 3: معامل خاطئ — " + err[:100])
-        elif "GEMINI_API_KEY مفقود" not in err:
-            errors.append(f"Imagen 3: {err[:120]}")
-    except Exception as e:
-        errors.append(f"Imagen 3: {str(e)[:120]}")
+        img = generate(prompt, aspect, creds)
+    except Exception:
+        ROUTER.record(klass, backend, time.monotonic() - started, False)
+        raise
+    ROUTER.record(klass, backend, time.monotonic() - started, True)
+    return img
+
+
+def no_image_backend_error() -> ValueError:
+    return ValueError(
+        "فشل توليد الصورة — تأكد من إضافة FAL_API_KEY أو GEMINI_API_KEY في الإعدادات.\n"
+        "• Fal.ai (الأسهل): سجّل على fal.ai واحصل على مفتاح مجاني\n"
+        "• Gemini Imagen 3: يتطلب تفعيل الفوترة في Google Cloud"
+    )
+
+
+@entry_point("image")
+def generate_image_with_provider(prompt: str, aspect: str = "1:1",
+                                 creds: Optional[Mapping] = None) -> tuple:
+    """مثل smart_generate_image لكن يُرجع (الصورة، المزود الذي نجح)"""
+    # الكاش أولاً — الإصابة لا تُحتسب في قياسات الموجّه
+    cached = cached_image_any(prompt, aspect)
+    if cached:
+        return cached
+
+    # الترتيب من الموجّه: الأسرع والأسلم حالياً أولاً (الافتراضي Fal ثم Gemini)
+    _, order = image_backend_order(aspect, creds)
+    errors = []
+    for backend in order:
+        try:
+            return generate_image_on(backend, prompt, aspect, creds), backend
+        except Exception as e:
+            errors.append(_image_error(backend, e))
 
     # رسالة الخطأ النهائية
     if errors:
@@ -390,22 +568,21 @@ def smart_generate_image(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
         raise ValueError(f"فشل توليد الصورة: {combined}")
 
     # لا يوجد أي مفتاح
-    raise ValueError(
-        "فشل توليد الصورة — تأكد من إضافة FAL_API_KEY أو GEMINI_API_KEY في الإعدادات.\n"
-        "• Fal.ai (الأسهل): سجّل على fal.ai واحصل على مفتاح مجاني\n"
-        "• Gemini Imagen 3: يتطلب تفعيل الفوترة في Google Cloud"
-    )
+    raise no_image_backend_error()
 
 
-def _generate_image_fal_flux(prompt: str, aspect: str = "1:1") -> Optional[bytes]:
-    """توليد صورة بـ Fal.ai Flux Dev"""
-    secrets = _get_secrets()
+def _generate_image_fal_flux(prompt: str, aspect: str = "1:1",
+                             creds: Optional[Mapping] = None):
+    """توليد صورة بـ Fal.ai Flux Dev — البايتات من الكاش، أو ImageArtifact برابط Fal"""
+    cached = cached_image(prompt, aspect, "fal", IMAGE_BACKEND_MODELS["fal"])
+    if cached:
+        return cached
+
+    secrets = _get_secrets(creds)
     api_key = secrets.get("fal")
     if not api_key:
         raise ValueError("FAL_API_KEY مفقود")
 
-    os.environ["FAL_KEY"] = api_key
-
     # FIX: تصحيح قيم image_size لتتوافق مع Fal.ai API
     # القيم الصحيحة: square_hd, square, portrait_4_3, portrait_16_9, landscape_4_3, landscape_16_9
     aspect_map = {
@@ -418,7 +595,7 @@ def _generate_image_fal_flux(prompt: str, aspect: str = "1:1") -> Optional[bytes
     img_size = aspect_map.get(aspect, "square_hd")
 
     # FIX: endpoint صحيح لـ Fal.ai Flux Dev
-    resp = requests.post(
+    resp = http_client.post(
         "https://fal.run/fal-ai/flux/dev",
         headers={
             "Authorization": f"Key {api_key}",
@@ -441,84 +618,109 @@ def _generate_image_fal_flux(prompt: str, aspect: str = "1:1") -> Optional[bytes
     img_url = images[0].get("url", "")
     if not img_url:
         raise ValueError("رابط الصورة فارغ من Fal.ai")
-    img_resp = requests.get(img_url, timeout=30)
-    img_resp.raise_for_status()
-    return img_resp.content
-
-
-def generate_platform_images(info: dict, selected_platforms: list,
-                              outfit: str = "suit", scene: str = "store",
-                              include_character: bool = True,
-                              ramadan_mode: bool = False) -> dict:
-    """توليد صور لمنصات محددة"""
-    results = {}
+    # التنزيل يبدأ في الخلفية ويُحفظ في الكاش عند اكتماله — لا ينتظره التوليد
+    return ImageArtifact(
+        img_url, on_fetch=lambda data: store_image(prompt, aspect, "fal", "fal-ai/flux/dev", data)
+    ).prefetch()
+
+
+def plan_platform_groups(info: dict, selected_platforms: list,
+                         outfit: str = "suit", scene: str = "store",
+                         include_character: bool = True,
+                         ramadan_mode: bool = False) -> list:
+    """تجميع المنصات حسب (البرومت، النسبة) — توليد واحد لكل مجموعة بدل توليد لكل منصة"""
+    groups = {}
     for platform_key in selected_platforms:
         plat = PLATFORMS.get(platform_key, {})
         if not plat:
             continue
         prompt = _build_image_prompt(info, platform_key, outfit, scene, include_character, ramadan_mode)
-        try:
-            img_bytes = smart_generate_image(prompt, plat.get("aspect", "1:1"))
-            results[platform_key] = {
-                "bytes": img_bytes,
-                "w": plat["w"], "h": plat["h"],
-                "label": plat["label"],
-                "emoji": plat["emoji"],
-            }
-        except Exception as e:
-            results[platform_key] = {
-                "bytes": None, "error": str(e),
-                "w": plat["w"], "h": plat["h"],
-                "label": plat["label"],
-                "emoji": plat["emoji"],
-            }
-    return results
-
-
-def generate_concurrent_images(info: dict, outfit: str = "suit", scene: str = "store",
-                                include_character: bool = True,
-                                ramadan_mode: bool = False) -> dict:
-    """توليد صور لجميع المنصات بشكل متوازي"""
-    all_platforms = list(PLATFORMS.keys())
+        aspect = plat.get("aspect", "1:1")
+        groups.setdefault((prompt, aspect), []).append(platform_key)
+    return [
+        {"prompt": prompt, "aspect": aspect, "platforms": platforms}
+        for (prompt, aspect), platforms in groups.items()
+    ]
 
-    def _gen_one(platform_key):
-        plat = PLATFORMS[platform_key]
-        prompt = _build_image_prompt(info, platform_key, outfit, scene, include_character, ramadan_mode)
-        try:
-            img_bytes = smart_generate_image(prompt, plat.get("aspect", "1:1"))
-            return platform_key, {
-                "bytes": img_bytes,
-                "w": plat["w"], "h": plat["h"],
-                "label": plat["label"], "emoji": plat["emoji"]
-            }
-        except Exception as e:
-            return platform_key, {
-                "bytes": None, "error": str(e),
-                "w": plat["w"], "h": plat["h"],
-                "label": plat["label"], "emoji": plat["emoji"]
-            }
 
+def _fan_out_group(group: dict, img_bytes: Optional[bytes] = None, error: str = "",
+                   provider: str = "", cached: bool = False) -> dict:
+    """
+    توزيع نتيجة المجموعة على منصاتها — فك ترميز واحد للصورة لكل مقاسات المجموعة.
+    تكلفة التوليد الواحد تُقسم على منصات المجموعة، وإصابة الكاش بلا تكلفة
+    """
+    # رابط المزود (إن وُجد) يبقى مع النتيجة: الواجهة تعرض منه و Supabase يحفظه
+    url = img_bytes.url if isinstance(img_bytes, ImageArtifact) else ""
+    img_bytes = as_bytes(img_bytes)
     results = {}
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {executor.submit(_gen_one, pk): pk for pk in all_platforms}
-        for future in concurrent.futures.as_completed(futures):
-            pk, data = future.result()
-            results[pk] = data
+    resized = {}
+    if img_bytes:
+        resized = resize_variants(img_bytes, [(PLATFORMS[p]["w"], PLATFORMS[p]["h"])
+                                              for p in group["platforms"]])
+    for platform_key in group["platforms"]:
+        plat = PLATFORMS[platform_key]
+        entry = {
+            "bytes": None,
+            "w": plat["w"], "h": plat["h"],
+            "label": plat["label"],
+            "emoji": plat["emoji"],
+        }
+        if img_bytes:
+            entry["bytes"] = resized[(plat["w"], plat["h"])] or img_bytes
+            entry["provider"] = provider
+            entry["source"] = CACHE if cached else API
+            entry["cost"] = 0.0 if cached else estimate_cost(provider, "image") / len(group["platforms"])
+            if url:
+                entry["url"] = url
+        else:
+            entry["error"] = error
+        results[platform_key] = entry
     return results
 
 
-def generate_image_remix_fal(prompt: str, image_bytes: bytes, strength: float = 0.6) -> Optional[bytes]:
-    """ريمكس صورة (تغيير الخلفية مع الحفاظ على الشكل)"""
+@entry_point("image")
+def generate_platform_images(info: dict, selected_platforms: list,
+                              outfit: str = "suit", scene: str = "store",
+                              include_character: bool = True,
+                              ramadan_mode: bool = False,
+                              creds: Optional[Mapping] = None) -> dict:
+    """
+    توليد صور لمنصات محددة — المجموعات بالتوازي عبر الجدولة العامة، فلا تستهلك
+    المجموعات الأولى ميزانية الواجهة على حساب الأخيرة
+    """
+    if not selected_platforms:
+        return {}
+    from modules.async_engine import SCHEDULER, generate_platform_images_async
+    return SCHEDULER.run(generate_platform_images_async(
+        info, selected_platforms, outfit, scene, include_character, ramadan_mode
+    ), creds=creds)
+
+
+@entry_point("image")
+def generate_concurrent_images(info: dict, outfit: str = "suit", scene: str = "store",
+                                include_character: bool = True,
+                                ramadan_mode: bool = False,
+                                creds: Optional[Mapping] = None) -> dict:
+    """توليد صور لجميع المنصات بشكل متوازي (عبر الجدولة العامة بحدود كل مزود)"""
+    from modules.async_engine import SCHEDULER, generate_platform_images_async
+    return SCHEDULER.run(generate_platform_images_async(
+        info, list(PLATFORMS.keys()), outfit, scene, include_character, ramadan_mode
+    ), creds=creds)
+
+
+@entry_point("image")
+def generate_image_remix_fal(prompt: str, image_bytes: bytes, strength: float = 0.6) -> ImageArtifact:
+    """ريمكس صورة (تغيير الخلفية مع الحفاظ على الشكل) — رابط Fal وبايتات كسولة"""
     secrets = _get_secrets()
     api_key = secrets.get("fal")
     if not api_key:
         raise ValueError("FAL_API_KEY مفقود")
 
-    b64 = base64.b64encode(image_bytes).decode()
-    data_uri = f"data:image/jpeg;base64,{b64}"
+    # رابط Fal storage يُرفع مرة لكل صورة (بديله data URI إن تعذر الرفع)
+    image_url = image_ref(image_bytes, ("fal",))
 
     # FIX: endpoint صحيح لـ image-to-image في Fal.ai
-    resp = requests.post(
+    resp = http_client.post(
         "https://fal.run/fal-ai/flux/dev/image-to-image",
         headers={
             "Authorization": f"Key {api_key}",
@@ -526,7 +728,7 @@ def generate_image_remix_fal(prompt: str, image_bytes: bytes, strength: float =
         },
         json={
             "prompt": prompt,
-            "image_url": data_uri,
+            "image_url": image_url,
             "strength": strength,
             "num_inference_steps": 28,
             "num_images": 1,
@@ -542,139 +744,406 @@ def generate_image_remix_fal(prompt: str, image_bytes: bytes, strength: float =
     img_url = images[0].get("url", "")
     if not img_url:
         raise ValueError("رابط الصورة فارغ")
-    img_resp = requests.get(img_url, timeout=30)
-    img_resp.raise_for_status()
-    return img_resp.content
+    return ImageArtifact(img_url).prefetch()
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # توليد النصوص (Claude 3.5 via OpenRouter)
 # ══════════════════════════════════════════════════════════════════════════════
 
-def _call_gemini_text(prompt: str, max_tokens: int = 2000) -> str:
-    """استدعاء Gemini مباشرةً كـ fallback للنصوص"""
-    secrets = _get_secrets()
+def _call_gemini_text(prompt: str, max_tokens: int = 2000,
+                      creds: Optional[Mapping] = None, schema: Optional[dict] = None) -> str:
+    """
+    استدعاء Gemini مباشرةً كـ fallback للنصوص.
+    schema = مخطط responseSchema لإجبار استجابة JSON بهذا الشكل
+    """
+    secrets = _get_secrets(creds)
     gemini_key = secrets.get("gemini")
     if not gemini_key:
         raise ValueError("GEMINI_API_KEY مفقود — أضفه في إعدادات API")
 
-    # الأولوية: 2.0 Flash Lite (مجاني وسريع) ← 2.0 Flash ← 1.5 Flash 8B (أصغر وأسرع)
-    models_to_try = [
-        "gemini-2.0-flash-lite",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash-8b",
-    ]
+    # الافتراضي: 2.0 Flash Lite (مجاني وسريع) ← 2.0 Flash ← 1.5 Flash 8B — ثم يعيد الموجّه الترتيب
+    config = {"maxOutputTokens": max_tokens, "temperature": TEXT_TEMPERATURE}
+    if schema:
+        config.update(responseMimeType="application/json", responseSchema=schema)
+
+    cached = _cached_text(prompt, max_tokens, _text_models(["gemini"]), schema)
+    if cached:
+        return cached
+
+    klass = request_class("text", prompt=prompt, max_tokens=max_tokens)
+    models_to_try = ROUTER.order(klass, [f"gemini/{m}" for m in GEMINI_TEXT_MODELS])
     last_error = None
-    for model in models_to_try:
+    for backend in models_to_try:
+        model = backend.split("/", 1)[1]
+        started = time.monotonic()
         try:
-            resp = requests.post(
+            resp = http_client.post(
                 f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={gemini_key}",
                 headers={"Content-Type": "application/json"},
                 json={
                     "contents": [{"parts": [{"text": prompt}]}],
-                    "generationConfig": {"maxOutputTokens": max_tokens, "temperature": 0.8}
+                    "generationConfig": config,
                 },
                 timeout=60
             )
             if resp.status_code == 404:
                 # النموذج غير موجود — جرّب التالي
                 last_error = f"404 النموذج {model} غير متاح"
-                continue
-            if resp.status_code == 429:
-                time.sleep(3)
-                continue
-            resp.raise_for_status()
-            data = resp.json()
-            candidates = data.get("candidates", [])
-            if candidates:
-                return candidates[0]["content"]["parts"][0]["text"].strip()
-            raise ValueError(f"استجابة Gemini فارغة: {str(data)[:200]}")
+            elif resp.status_code == 429:
+                # طبقة HTTP استنفدت محاولاتها مع التراجع — انتقل للنموذج التالي
+                last_error = f"429 Rate Limit on {model}"
+            else:
+                resp.raise_for_status()
+                data = resp.json()
+                candidates = data.get("candidates", [])
+                if not candidates:
+                    raise ValueError(f"استجابة Gemini فارغة: {str(data)[:200]}")
+                text = candidates[0]["content"]["parts"][0]["text"].strip()
+                ROUTER.record(klass, backend, time.monotonic() - started, True)
+                store_completion(text, prompt, backend, TEXT_TEMPERATURE, max_tokens, schema=schema)
+                return text
         except requests.exceptions.HTTPError as e:
             if e.response is not None and e.response.status_code == 404:
                 last_error = f"404 النموذج {model} غير متاح"
-                continue
+            else:
+                last_error = e
+        except Exception as e:
             last_error = e
-            time.sleep(1)
+        ROUTER.record(klass, backend, time.monotonic() - started, False)
+    raise ValueError(f"فشل Gemini بعد {len(models_to_try)} محاولات: {last_error}")
+
+
+def _stream_gemini_text(prompt: str, max_tokens: int = 2000,
+                        creds: Optional[Mapping] = None) -> Iterator[str]:
+    """مثل _call_gemini_text عبر streamGenerateContent (SSE) — البديل ممكن قبل أول جزء فقط"""
+    secrets = _get_secrets(creds)
+    gemini_key = secrets.get("gemini")
+    if not gemini_key:
+        raise ValueError("GEMINI_API_KEY مفقود — أضفه في إعدادات API")
+
+    klass = request_class("text", prompt=prompt, max_tokens=max_tokens)
+    models_to_try = ROUTER.order(klass, [f"gemini/{m}" for m in GEMINI_TEXT_MODELS])
+    last_error = None
+    for backend in models_to_try:
+        model = backend.split("/", 1)[1]
+        started = time.monotonic()
+        yielded = False
+        full = []
+        try:
+            resp = http_client.post(
+                f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+                f"?alt=sse&key={gemini_key}",
+                headers={"Content-Type": "application/json"},
+                json={
+                    "contents": [{"parts": [{"text": prompt}]}],
+                    "generationConfig": {"maxOutputTokens": max_tokens, "temperature": TEXT_TEMPERATURE}
+                },
+                timeout=60,
+                stream=True,
+            )
+            if resp.status_code in (404, 429):
+                resp.close()
+                raise ValueError(f"{resp.status_code} النموذج {model} غير متاح حالياً")
+            resp.raise_for_status()
+            for event in http_client.iter_sse(resp):
+                candidates = json.loads(event).get("candidates") or [{}]
+                parts = (candidates[0].get("content") or {}).get("parts") or []
+                chunk = "".join(p.get("text", "") for p in parts)
+                if chunk:
+                    yielded = True
+                    full.append(chunk)
+                    yield chunk
+            if not yielded:
+                raise ValueError(f"استجابة Gemini فارغة من {model}")
         except Exception as e:
+            ROUTER.record(klass, backend, time.monotonic() - started, False)
+            if yielded:
+                raise  # وصل جزء للمستخدم — لا يمكن إكمال النص من نموذج آخر
             last_error = e
-            time.sleep(1)
+            continue
+        ROUTER.record(klass, backend, time.monotonic() - started, True)
+        store_completion("".join(full).strip(), prompt, backend, TEXT_TEMPERATURE, max_tokens)
+        return
     raise ValueError(f"فشل Gemini بعد {len(models_to_try)} محاولات: {last_error}")
 
 
-def _call_claude(prompt: str, max_tokens: int = 2000) -> str:
-    """استدعاء Claude 3.5 Sonnet عبر OpenRouter مع fallback تلقائي إلى Gemini"""
-    secrets = _get_secrets()
-    api_key = secrets.get("openrouter")
+def _openrouter_request(prompt: str, max_tokens: int, api_key: str,
+                        stream: bool = False) -> requests.Response:
+    payload = {
+        "model": OPENROUTER_TEXT_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
+        "temperature": TEXT_TEMPERATURE
+    }
+    if stream:
+        payload["stream"] = True
+    resp = http_client.post(
+        "https://openrouter.ai/api/v1/chat/completions",
+        headers={
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://mahwousstore.com",
+            "X-Title": "Mahwous AI Studio"
+        },
+        json=payload,
+        timeout=60,
+        stream=stream,
+    )
+    resp.raise_for_status()
+    return resp
+
+
+def _call_openrouter(prompt: str, max_tokens: int, api_key: str) -> str:
+    """Claude 3.5 Sonnet عبر OpenRouter — يرفع استثناءً عند أي فشل ليتولى الموجّه البديل"""
+    cached = _cached_text(prompt, max_tokens, _text_models(["openrouter"]))
+    if cached:
+        return cached
+    data = _openrouter_request(prompt, max_tokens, api_key).json()
+
+    # FIX: التحقق من وجود 'choices' قبل الوصول إليه
+    if "choices" not in data or not data["choices"]:
+        err_msg = str(data.get("error", {}).get("message", ""))
+        raise ValueError(f"استجابة OpenRouter غير متوقعة: {err_msg or json.dumps(data)[:200]}")
+    text = data["choices"][0]["message"]["content"].strip()
+    store_completion(text, prompt, f"openrouter/{OPENROUTER_TEXT_MODEL}", TEXT_TEMPERATURE, max_tokens)
+    return text
+
+
+def _stream_openrouter(prompt: str, max_tokens: int, api_key: str) -> Iterator[str]:
+    """نفس _call_openrouter بالبث (stream: true) — أجزاء النص فور وصولها"""
+    resp = _openrouter_request(prompt, max_tokens, api_key, stream=True)
+    full = []
+    for event in http_client.iter_sse(resp):
+        if event == "[DONE]":
+            break
+        data = json.loads(event)
+        if data.get("error"):
+            raise ValueError(f"خطأ OpenRouter أثناء البث: {str(data['error'].get('message', ''))[:200]}")
+        chunk = ((data.get("choices") or [{}])[0].get("delta") or {}).get("content") or ""
+        if chunk:
+            full.append(chunk)
+            yield chunk
+    store_completion("".join(full).strip(), prompt, f"openrouter/{OPENROUTER_TEXT_MODEL}",
+                     TEXT_TEMPERATURE, max_tokens)
+
+
+def _text_models(backends: list) -> list:
+    """معرّفات النماذج (مزود/نموذج) لمزودي النصوص — لمفاتيح كاش الردود"""
+    models = []
+    for backend in backends:
+        if backend == "openrouter":
+            models.append(f"openrouter/{OPENROUTER_TEXT_MODEL}")
+        else:
+            models += [f"gemini/{m}" for m in GEMINI_TEXT_MODELS]
+    return models
 
-    # إذا لم يكن هناك مفتاح OpenRouter، انتقل مباشرةً إلى Gemini
-    if not api_key:
-        return _call_gemini_text(prompt, max_tokens)
 
-    try:
-        resp = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://mahwousstore.com",
-                "X-Title": "Mahwous AI Studio"
-            },
-            json={
-                "model": "anthropic/claude-3.5-sonnet",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": max_tokens,
-                "temperature": 0.8
-            },
-            timeout=60
-        )
-        resp.raise_for_status()
-        data = resp.json()
-
-        # FIX: التحقق من وجود 'choices' قبل الوصول إليه
-        if "choices" not in data or not data["choices"]:
-            # رسالة الخطأ تحتوي على 'credits' أو 'Insufficient' → fallback إلى Gemini
-            err_msg = str(data.get("error", {}).get("message", ""))
-            if any(kw in err_msg.lower() for kw in ["credit", "insufficient", "balance", "quota"]):
-                return _call_gemini_text(prompt, max_tokens)
-            raise ValueError(f"استجابة OpenRouter غير متوقعة: {json.dumps(data)[:200]}")
-        return data["choices"][0]["message"]["content"].strip()
-
-    except requests.exceptions.HTTPError as http_err:
-        # 402 Payment Required أو 429 Rate Limit → fallback إلى Gemini
-        status = http_err.response.status_code if http_err.response is not None else 0
-        if status in [402, 429, 403]:
-            return _call_gemini_text(prompt, max_tokens)
-        raise
-    except ValueError as ve:
-        # إذا كانت رسالة الخطأ تشير إلى نقص الرصيد → fallback
-        if any(kw in str(ve).lower() for kw in ["credit", "insufficient", "balance", "quota"]):
-            return _call_gemini_text(prompt, max_tokens)
-        raise
+def _cached_text(prompt: str, max_tokens: int, models: list,
+                 schema: Optional[dict] = None) -> Optional[str]:
+    """أول رد محفوظ لأي نموذج مرشّح — يُفحص قبل أي طلب شبكة"""
+    for model in models:
+        text = cached_completion(prompt, model, TEXT_TEMPERATURE, max_tokens, schema=schema)
+        if text:
+            return text
+    return None
 
 
-def _parse_json_response(text: str) -> dict:
-    """تحويل استجابة النص إلى JSON"""
-    if "```" in text:
-        parts = text.split("```")
-        for part in parts:
-            if part.startswith("json"):
-                text = part[4:].strip()
-                break
-            elif "{" in part or "[" in part:
-                text = part.strip()
+@entry_point("text")
+def _call_claude(prompt: str, max_tokens: int = 2000,
+                 creds: Optional[Mapping] = None) -> str:
+    """
+    توليد نص: Claude 3.5 Sonnet عبر OpenRouter أو Gemini مباشرةً —
+    الترتيب من الموجّه (الأسرع والأسلم أولاً) والفشل ينتقل للبديل تلقائياً
+    """
+    secrets = _get_secrets(creds)
+    backends = [b for b in ("openrouter", "gemini") if secrets.get(b)]
+    # إذا لم يكن هناك أي مفتاح، يتولى Gemini رسالة الخطأ الواضحة
+    if not backends:
+        return _call_gemini_text(prompt, max_tokens, creds)
+    cached = _cached_text(prompt, max_tokens, _text_models(backends))
+    if cached:
+        return cached
+
+    klass = request_class("text", prompt=prompt, max_tokens=max_tokens)
+    order = ROUTER.order(klass, backends, _route_pin("text", secrets),
+                         costs={b: estimate_cost(b, "text") for b in backends})
+    last_error: Optional[Exception] = None
+    for backend in order:
+        started = time.monotonic()
+        try:
+            if backend == "openrouter":
+                text = _call_openrouter(prompt, max_tokens, secrets["openrouter"])
+            else:
+                text = _call_gemini_text(prompt, max_tokens, creds)
+        except Exception as e:
+            # 402 رصيد / 429 / 403 / قاطع مفتوح / استجابة غير متوقعة → البديل التالي
+            ROUTER.record(klass, backend, time.monotonic() - started, False)
+            last_error = e
+            continue
+        ROUTER.record(klass, backend, time.monotonic() - started, True)
+        return text
+    raise last_error
+
+
+@entry_point("text")
+def stream_text(prompt: str, max_tokens: int = 2000,
+                creds: Optional[Mapping] = None) -> Iterator[str]:
+    """
+    مثل _call_claude لكن مولّد يُرجع النص أجزاءً فور وصولها (SSE) —
+    الانتقال للبديل ممكن فقط قبل وصول أول جزء
+    """
+    secrets = _get_secrets(creds)
+    backends = [b for b in ("openrouter", "gemini") if secrets.get(b)]
+    if not backends:
+        yield from _stream_gemini_text(prompt, max_tokens, creds)
+        return
+    cached = _cached_text(prompt, max_tokens, _text_models(backends))
+    if cached:
+        yield cached
+        return
+
+    klass = request_class("text", prompt=prompt, max_tokens=max_tokens)
+    order = ROUTER.order(klass, backends, _route_pin("text", secrets),
+                         costs={b: estimate_cost(b, "text") for b in backends})
+    last_error: Optional[Exception] = None
+    for backend in order:
+        started = time.monotonic()
+        yielded = False
+        try:
+            if backend == "openrouter":
+                parts = _stream_openrouter(prompt, max_tokens, secrets["openrouter"])
+            else:
+                parts = _stream_gemini_text(prompt, max_tokens, creds)
+            for chunk in parts:
+                yielded = True
+                yield chunk
+        except Exception as e:
+            ROUTER.record(klass, backend, time.monotonic() - started, False)
+            if yielded:
+                raise
+            last_error = e
+            continue
+        ROUTER.record(klass, backend, time.monotonic() - started, True)
+        return
+    raise last_error
+
+
+def stream_json_fields(prompt: str, max_tokens: int = 2000) -> Iterator[tuple]:
+    """
+    بث استجابة JSON — يُرجع (المفتاح، القيمة) لكل حقل أعلى فور اكتماله.
+    إن لم يُلتقط أي حقل أثناء البث يُحلَّل النص الكامل في النهاية
+    """
+    parser = JsonFieldStream()
+    for chunk in stream_text(prompt, max_tokens):
+        yield from parser.feed(chunk)
+    if not parser.fields:
+        yield from _as_object(extract_json(parser.buf)).items()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# مخططات الاستجابات + JSON المُتحقق منه
+# ══════════════════════════════════════════════════════════════════════════════
+
+_CAPTION_SCHEMA = schema_object({"caption": STRING, "hashtags": STRING_LIST}, ["caption"])
+
+CAPTIONS_SCHEMA = schema_object({
+    k: _CAPTION_SCHEMA
+    for k in ("instagram_post", "instagram_story", "tiktok", "twitter", "youtube_short", "facebook")
+})
+DESCRIPTIONS_SCHEMA = schema_object({
+    "short": STRING, "medium": STRING, "long": STRING, "ad": STRING,
+    "seo": schema_object({"title": STRING, "meta": STRING, "content": STRING}),
+})
+HASHTAGS_SCHEMA = schema_object({
+    "arabic": STRING_LIST, "english": STRING_LIST, "brand": STRING_LIST, "trending": STRING_LIST,
+})
+CONTENT_BUNDLE_SCHEMA = schema_object({
+    "captions": CAPTIONS_SCHEMA, "descriptions": DESCRIPTIONS_SCHEMA, "hashtags": HASHTAGS_SCHEMA,
+})
+SCENARIO_SCHEMA = schema_object({
+    "title": STRING, "hook": STRING,
+    "scenes": {"type": "ARRAY", "items": schema_object(
+        {"time": STRING, "action": STRING, "camera": STRING, "audio": STRING}, ["time", "action"])},
+    "cta": STRING, "video_prompt": STRING, "flow_prompt": STRING,
+})
+COMPETITOR_SCHEMA = schema_object({
+    "competitor_weakness": STRING, "our_advantage": STRING,
+    "attack_angle": STRING, "suggested_content": STRING,
+})
+TRENDS_SCHEMA = schema_object({
+    "product_summary": STRING, "target_audience": STRING,
+    "trending_topics": {"type": "ARRAY", "items": schema_object(
+        {"platform": STRING, "topic": STRING, "hook": STRING, "relevance": STRING}, ["platform", "topic"])},
+    "viral_hooks": STRING_LIST,
+    "content_angles": {"type": "ARRAY", "items": schema_object(
+        {"angle": STRING, "description": STRING, "format": STRING}, ["angle"])},
+    "trending_hashtags": schema_object({"viral": STRING_LIST, "niche": STRING_LIST, "buying": STRING_LIST}),
+    "best_post_times": schema_object({"TikTok": STRING, "Instagram": STRING}, []),
+    "competitor_gap": STRING, "seasonal_angle": STRING,
+}, ["product_summary", "target_audience", "trending_topics", "viral_hooks", "trending_hashtags"])
+PERFUME_INFO_SCHEMA = schema_object({
+    "brand": STRING, "product_name": STRING, "type": STRING, "size": STRING,
+    "gender": STRING, "style": STRING, "colors": STRING_LIST, "bottle_shape": STRING,
+    "mood": STRING, "notes_guess": STRING, "confidence": NUMBER,
+}, ["brand", "product_name"])
+
+# مرات سؤال النموذج عن الحقول الناقصة بعد الإصلاح المحلي
+JSON_REASKS = 1
+
+
+def _as_object(value) -> dict:
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return value[0]
+    return value if isinstance(value, dict) else {}
+
+
+@entry_point("text")
+def generate_json(prompt: str, schema: dict, max_tokens: int = 2000) -> dict:
+    """
+    توليد JSON مُتحقق منه: إصلاح الرد محلياً أولاً، ثم سؤال النموذج عن الحقول
+    الناقصة فقط (لا إعادة توليد كاملة) — يرفع ValueError إن لم يُستخرج شيء.
+    أخطاء المزود (مفتاح مفقود، فشل HTTP) في الطلب الأول تُرفع كما هي
+    """
+    text = _call_claude(prompt, max_tokens)
+    try:
+        data = _as_object(extract_json(text))
+    except ValueError:
+        data = {}
+    for _ in range(JSON_REASKS):
+        missing = missing_fields(data, schema)
+        if not missing:
+            break
+        keys = top_level_keys(missing)
+        followup = (
+            f"{prompt}\n\n---\nأكمل فقط الحقول التالية: {', '.join(keys)}\n"
+            f"أعطني JSON فقط بهذه المفاتيح دون غيرها، بنفس الشكل المطلوب أعلاه."
+        )
+        try:
+            text = _call_claude(followup, max_tokens)
+        except Exception:
+            # فشل المزود في الاستكمال (مهلة، HTTP، قاطع…) — نكتفي بما استُخرج إن وُجد
+            if data:
                 break
-    text = text.strip()
-    return json.loads(text)
+            raise
+        try:
+            patch = _as_object(extract_json(text))
+        except ValueError:
+            break
+        data.update({k: v for k, v in patch.items() if k in keys})
+    if not data:
+        raise ValueError("تعذر استخراج JSON من استجابة النموذج")
+    return data
 
 
-def generate_all_captions(info: dict) -> dict:
-    """توليد تعليقات لجميع المنصات"""
+def _captions_prompt(info: dict) -> str:
+    """برومت تعليقات جميع المنصات"""
     brand   = info.get("brand", "Unknown")
     product = info.get("product_name", "Unknown")
     mood    = info.get("mood", "فاخر")
     notes   = info.get("notes_guess", "عود وعنبر")
 
-    prompt = f"""أنت خبير تسويق رقمي للعطور الفاخرة. اكتب تعليقات تسويقية احترافية باللغة العربية الخليجية الراقية.
+    return f"""أنت خبير تسويق رقمي للعطور الفاخرة. اكتب تعليقات تسويقية احترافية باللغة العربية الخليجية الراقية.
 
 العطر: {brand} - {product}
 المزاج: {mood}
@@ -706,21 +1175,28 @@ def generate_all_captions(info: dict) -> dict:
   }}
 }}"""
 
+
+@entry_point("text")
+@cacheable("captions")
+def generate_all_captions(info: dict) -> dict:
+    """توليد تعليقات لجميع المنصات"""
+    bundle = _bundle_part(info, "captions")
+    if bundle:
+        return bundle
     try:
-        text = _call_claude(prompt, max_tokens=2500)
-        return _parse_json_response(text)
+        return generate_json(_captions_prompt(info), CAPTIONS_SCHEMA, max_tokens=2500)
     except Exception as e:
         return {"error": str(e)}
 
 
-def generate_descriptions(info: dict) -> dict:
-    """توليد أوصاف تسويقية بأطوال مختلفة"""
+def _descriptions_prompt(info: dict) -> str:
+    """برومت الأوصاف التسويقية"""
     brand   = info.get("brand", "Unknown")
     product = info.get("product_name", "Unknown")
     mood    = info.get("mood", "فاخر")
     notes   = info.get("notes_guess", "")
 
-    prompt = f"""اكتب أوصافاً تسويقية للعطر التالي باللغة العربية الراقية:
+    return f"""اكتب أوصافاً تسويقية للعطر التالي باللغة العربية الراقية:
 العطر: {brand} - {product} | المزاج: {mood} | الملاحظات: {notes}
 
 أعطني JSON فقط:
@@ -736,20 +1212,48 @@ def generate_descriptions(info: dict) -> dict:
   }}
 }}"""
 
+
+@entry_point("text")
+@cacheable("descriptions")
+def generate_descriptions(info: dict) -> dict:
+    """توليد أوصاف تسويقية بأطوال مختلفة"""
+    bundle = _bundle_part(info, "descriptions")
+    if bundle:
+        return bundle
     try:
-        text = _call_claude(prompt, max_tokens=2000)
-        return _parse_json_response(text)
+        return generate_json(_descriptions_prompt(info), DESCRIPTIONS_SCHEMA, max_tokens=2000)
     except Exception as e:
         return {"error": str(e)}
 
 
-def generate_hashtags(info: dict) -> dict:
-    """توليد هاشتاقات منظمة"""
+@cacheable("captions")
+def stream_all_captions(info: dict) -> Iterator[tuple]:
+    """مثل generate_all_captions بالبث — (المنصة، بياناتها) فور اكتمال كل منصة"""
+    bundle = None if cache_fresh() else _BUNDLES.peek(_bundle_key(info))
+    if bundle:
+        yield from bundle["captions"].items()
+        return
+    yield from stream_json_fields(_captions_prompt(info), max_tokens=2500)
+
+
+@cacheable("descriptions")
+def stream_descriptions(info: dict) -> Iterator[tuple]:
+    """مثل generate_descriptions بالبث — (نوع الوصف، نصه) فور اكتمال كل وصف"""
+    bundle = None if cache_fresh() else _BUNDLES.peek(_bundle_key(info))
+    if bundle:
+        yield from bundle["descriptions"].items()
+        return
+    yield from stream_json_fields(_descriptions_prompt(info), max_tokens=2000)
+
+
+def _hashtags_prompt(info: dict) -> str:
+    """برومت الهاشتاقات"""
     brand   = info.get("brand", "Unknown")
     product = info.get("product_name", "Unknown")
     gender  = info.get("gender", "unisex")
+    brand_no_spaces = brand.replace(" ", "")
 
-    prompt = f"""اقترح هاشتاقات تسويقية للعطر: {brand} - {product} (للجنس: {gender})
+    return f"""اقترح هاشتاقات تسويقية للعطر: {brand} - {product} (للجنس: {gender})
 
 أعطني JSON فقط:
 {{
@@ -759,13 +1263,121 @@ def generate_hashtags(info: dict) -> dict:
   "trending": ["#شراء_عطور_فاخرة", "#أفضل_عطور_نيش_في_السعودية", "#عطور_أصلية_للبيع", "#متجر_عطور_موثوق"]
 }}"""
 
+
+@entry_point("text")
+@cacheable("hashtags")
+def generate_hashtags(info: dict) -> dict:
+    """توليد هاشتاقات منظمة"""
+    bundle = _bundle_part(info, "hashtags")
+    if bundle:
+        return bundle
     try:
-        text = _call_claude(prompt, max_tokens=800)
-        return _parse_json_response(text)
+        return generate_json(_hashtags_prompt(info), HASHTAGS_SCHEMA, max_tokens=800)
     except Exception as e:
         return {"error": str(e)}
 
 
+# ══════════════════════════════════════════════════════════════════════════════
+# الحزمة النصية المدمجة — تعليقات + أوصاف + هاشتاقات في استدعاء واحد
+# ══════════════════════════════════════════════════════════════════════════════
+
+# MAHWOUS_COMBINED_TEXT=0 يعيد الاستدعاءات المنفصلة الثلاثة
+COMBINED_TEXT = os.environ.get("MAHWOUS_COMBINED_TEXT", "1") != "0"
+
+# مهام الحزمة المتوازية (التعليقات/الأوصاف/الهاشتاقات) تنتظر استدعاءً واحداً
+_BUNDLES = SingleFlight(ttl=600)
+
+
+def _bundle_key(info: dict) -> str:
+    fields = ("brand", "product_name", "mood", "notes_guess", "gender")
+    return content_key("content_bundle", {f: info.get(f, "") for f in fields})
+
+
+def _bundle_prompt(info: dict) -> str:
+    """السياق مرة واحدة + تعليمات الأجزاء الثلاثة"""
+    return f"""{_captions_prompt(info)}
+
+ثم اكتب أوصافاً تسويقية للعطر نفسه باللغة العربية الراقية:
+{_descriptions_prompt(info).split("أعطني JSON فقط:", 1)[1].strip()}
+
+ثم اقترح هاشتاقات تسويقية للعطر نفسه (للجنس: {info.get("gender", "unisex")}):
+{_hashtags_prompt(info).split("أعطني JSON فقط:", 1)[1].strip()}
+
+أعطني كائن JSON واحداً فقط بثلاثة مفاتيح: "captions" (كائن التعليقات الأول)
+و "descriptions" (كائن الأوصاف) و "hashtags" (كائن الهاشتاقات)."""
+
+
+def _generate_bundle(info: dict, creds: Optional[Mapping] = None) -> dict:
+    secrets = _get_secrets(creds)
+    backends = [b for b in ("gemini", "openrouter") if secrets.get(b)]
+    if not backends:
+        raise ValueError("GEMINI_API_KEY أو OPENROUTER_API_KEY مطلوب لتوليد النصوص")
+
+    prompt = _bundle_prompt(info)
+    klass = request_class("text", prompt=prompt, max_tokens=6000)
+    order = ROUTER.order(klass, backends, _route_pin("text", secrets),
+                         costs={b: estimate_cost(b, "text") for b in backends})
+    last_error: Optional[Exception] = None
+    for backend in order:
+        started = time.monotonic()
+        try:
+            if backend == "gemini":
+                # responseSchema يضمن الشكل، لكن الرد قد يُقطع عند MAX_TOKENS — المستخرج يصلحه
+                bundle = _as_object(extract_json(
+                    _call_gemini_text(prompt, 6000, creds, schema=CONTENT_BUNDLE_SCHEMA)))
+            else:
+                bundle = _as_object(extract_json(_call_openrouter(prompt, 6000, secrets["openrouter"])))
+            # الأجزاء الناقصة تُكمل باستدعاءاتها المنفصلة (_bundle_part) — الحزمة الفارغة فشل
+            if not any(isinstance(bundle.get(k), dict) for k in CONTENT_BUNDLE_SCHEMA["properties"]):
+                raise ValueError("الحزمة المدمجة فارغة")
+        except Exception as e:
+            ROUTER.record(klass, backend, time.monotonic() - started, False)
+            last_error = e
+            continue
+        ROUTER.record(klass, backend, time.monotonic() - started, True)
+        # مهام الحزمة الأخرى تأخذ أجزاءها من SingleFlight — تحتاج معرفة من أنتجها
+        bundle["_provider"] = backend
+        return bundle
+    raise last_error
+
+
+@entry_point("text")
+def generate_content_bundle(info: dict, creds: Optional[Mapping] = None) -> dict:
+    """
+    التعليقات + الأوصاف + الهاشتاقات باستدعاء واحد (JSON مقيّد بمخطط).
+    الاستدعاءات المتزامنة لنفس العطر تتشارك نفس الطلب، والنتيجة تبقى 10 دقائق
+    (إلا عند إعادة التوليد)
+    """
+    key = _bundle_key(info)
+    if cache_fresh():
+        _BUNDLES.forget(key)
+    return _BUNDLES.run(key, lambda: _generate_bundle(info, creds))
+
+
+def _bundle_part(info: dict, part: str) -> Optional[dict]:
+    """جزء من الحزمة المدمجة — None عند تعطيلها أو فشلها (فيُستخدم الاستدعاء المنفصل)"""
+    if not COMBINED_TEXT:
+        return None
+    outer = current_usage()
+    with track_usage() as usage:
+        try:
+            bundle = generate_content_bundle(info)
+        except Exception:
+            bundle = None
+    # المهمة التي أرسلت طلب الحزمة تتحمل تكلفته، والبقية تأخذ أجزاءها مجاناً
+    if outer is not None:
+        outer.events += usage.events
+        if bundle is not None and not usage.events:
+            outer.note(bundle.get("_provider", ""), BUNDLE)
+    if bundle is None:
+        return None
+    data = bundle.get(part)
+    schema = CONTENT_BUNDLE_SCHEMA["properties"][part]
+    return data if isinstance(data, dict) and not missing_fields(data, schema) else None
+
+
+@entry_point("text")
+@cacheable("scenario")
 def generate_scenario(info: dict, scene_type: str = "مهووس مع العطر",
                        scene: str = "store", outfit: str = "suit",
                        duration: int = 7) -> dict:
@@ -792,30 +1404,43 @@ def generate_scenario(info: dict, scene_type: str = "مهووس مع العطر"
 }}"""
 
     try:
-        text = _call_claude(prompt, max_tokens=1500)
-        return _parse_json_response(text)
+        return generate_json(prompt, SCENARIO_SCHEMA, max_tokens=1500)
     except Exception as e:
         return {"error": str(e)}
 
 
-def generate_perfume_story(info: dict) -> str:
-    """توليد قصة شعرية للعطر"""
+def _story_prompt(info: dict) -> str:
+    """برومت قصة العطر"""
     brand   = info.get("brand", "Unknown")
     product = info.get("product_name", "Unknown")
     mood    = info.get("mood", "فاخر")
     notes   = info.get("notes_guess", "")
 
-    prompt = f"""اكتب قصة شعرية راقية وجذابة عن العطر: {brand} - {product}
+    return f"""اكتب قصة شعرية راقية وجذابة عن العطر: {brand} - {product}
 المزاج: {mood} | الملاحظات: {notes}
 القصة يجب أن تكون باللغة العربية الفصيحة الراقية، 150-200 كلمة، تصف تجربة ارتداء العطر بأسلوب سردي شعري.
 لا تضف أي تعليق قبل أو بعد القصة، فقط القصة مباشرة."""
 
+
+@entry_point("text")
+@cacheable("story")
+def generate_perfume_story(info: dict) -> str:
+    """توليد قصة شعرية للعطر"""
+    prompt = _story_prompt(info)
     try:
         return _call_claude(prompt, max_tokens=600)
     except Exception as e:
         return f"خطأ في توليد القصة: {e}"
 
 
+@cacheable("story")
+def stream_perfume_story(info: dict) -> Iterator[str]:
+    """مثل generate_perfume_story بالبث — أجزاء القصة فور وصولها"""
+    yield from stream_text(_story_prompt(info), max_tokens=600)
+
+
+@entry_point("text")
+@cacheable("competitor")
 def analyze_competitor(info: dict, competitor_name: str) -> dict:
     """تحليل المنافس"""
     brand   = info.get("brand", "Unknown")
@@ -833,34 +1458,67 @@ def analyze_competitor(info: dict, competitor_name: str) -> dict:
 }}"""
 
     try:
-        text = _call_claude(prompt, max_tokens=600)
-        return _parse_json_response(text)
+        return generate_json(prompt, COMPETITOR_SCHEMA, max_tokens=600)
     except Exception as e:
         return {"competitor_weakness": "—", "our_advantage": "—", "attack_angle": "—", "suggested_content": str(e)}
 
 
+@entry_point("text")
+@cacheable("trends")
+def generate_trend_insights(info: dict) -> dict:
+    """توليد تحليل ترندات للمنتج — يستخدم Claude أو Gemini تلقائياً"""
+    brand = info.get("brand", "Unknown")
+    product = info.get("product_name", "Unknown")
+    mood = info.get("mood", "luxury")
+    prompt = f"""أنت خبير تسويق رقمي متخصص في العطور الفاخرة.
+حلّل هذا المنتج واقترح ترندات محتوى:
+العطر: {brand} - {product}
+المزاج: {mood}
+
+أعطني JSON فقط بهذا الشكل بدون أي نص إضافي:
+{{
+  "product_summary": "ملخص هوية العطر في جملتين",
+  "target_audience": "وصف الجمهور المستهدف",
+  "trending_topics": [
+    {{"platform": "TikTok", "topic": "موضوع رائج", "hook": "هوك جذاب", "relevance": "سبب الارتباط"}},
+    {{"platform": "Instagram", "topic": "موضوع رائج", "hook": "هوك جذاب", "relevance": "سبب الارتباط"}},
+    {{"platform": "Twitter", "topic": "موضوع رائج", "hook": "هوك جذاب", "relevance": "سبب الارتباط"}}
+  ],
+  "viral_hooks": ["هوك 1", "هوك 2", "هوك 3"],
+  "content_angles": [
+    {{"angle": "زاوية 1", "description": "وصف الزاوية", "format": "ريلز"}},
+    {{"angle": "زاوية 2", "description": "وصف الزاوية", "format": "بوست"}}
+  ],
+  "trending_hashtags": {{
+    "viral": ["#هاشتاق1", "#هاشتاق2"],
+    "niche": ["#هاشتاق3", "#هاشتاق4"],
+    "buying": ["#شراء_عطور_فاخرة", "#عطور_أصلية"]
+  }},
+  "best_post_times": {{"TikTok": "8-10 مساءً", "Instagram": "12-2 ظهراً"}},
+  "competitor_gap": "فرصة غير مستغلة في السوق",
+  "seasonal_angle": "زاوية موسمية مناسبة"
+}}"""
+    try:
+        # _call_claude يتضمن fallback تلقائي إلى Gemini عند نقص رصيد OpenRouter
+        return generate_json(prompt, TRENDS_SCHEMA, max_tokens=1500)
+    except Exception as e:
+        return {"error": str(e)}
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 # توليد الفيديو
 # ══════════════════════════════════════════════════════════════════════════════
 
-def _img_to_url_imgbb(image_bytes: bytes) -> Optional[str]:
-    """رفع الصورة إلى ImgBB والحصول على رابط"""
-    secrets = _get_secrets()
-    api_key = secrets.get("imgbb")
-    if not api_key or not image_bytes:
-        return None
-    try:
-        b64 = base64.b64encode(image_bytes).decode()
-        resp = requests.post(
-            "https://api.imgbb.com/1/upload",
-            data={"key": api_key, "image": b64},
-            timeout=30
-        )
-        if resp.status_code == 200:
-            return resp.json()["data"]["url"]
-    except Exception:
-        pass
-    return None
+# مزودو الفيديو بالترتيب الافتراضي ومفتاح كل منهم
+VIDEO_BACKENDS = {"luma": "luma", "runway": "runway", "kling": "fal", "hailuo": "fal", "seedance": "fal"}
+
+
+def video_provider_order(creds: Optional[Mapping] = None) -> list:
+    """مزودو الفيديو المتاحون (لهم مفتاح) مرتبين حسب الموجّه — الأول هو الاختيار التلقائي"""
+    secrets = _get_secrets(creds)
+    backends = [b for b, key in VIDEO_BACKENDS.items() if secrets.get(key)]
+    return ROUTER.order("video", backends, _route_pin("video", secrets),
+                        costs={b: estimate_cost(VIDEO_BACKENDS[b], "video") for b in backends})
 
 
 def generate_video_luma(prompt: str, image_bytes: Optional[bytes] = None,
@@ -886,12 +1544,13 @@ def generate_video_luma(prompt: str, image_bytes: Optional[bytes] = None,
         payload["duration"] = luma_duration
 
     if image_bytes:
-        img_url = _img_to_url_imgbb(image_bytes)
+        # Luma يقبل روابط فقط — ImgBB أولاً كما كان، ثم Fal storage أو الخادم المحلي
+        img_url = ASSETS.public_url(image_bytes, ("imgbb", "fal", "local"))
         if img_url:
             payload["keyframes"] = {"frame0": {"type": "image", "url": img_url}}
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
             "https://api.lumalabs.ai/dream-machine/v1/generations",
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -927,14 +1586,13 @@ def generate_video_luma(prompt: str, image_bytes: Optional[bytes] = None,
         return {"error": str(e)}
 
 
-def check_luma_status(generation_id: str) -> dict:
+def check_luma_status(generation_id: str, api_key: str = "") -> dict:
     """فحص حالة توليد Luma"""
-    secrets = _get_secrets()
-    api_key = secrets.get("luma")
+    api_key = api_key or _get_secrets().get("luma")
     if not api_key or not generation_id:
         return {"state": "error", "error": "مفتاح أو معرف مفقود"}
     try:
-        resp = requests.get(
+        resp = http_client.get(
             f"https://api.lumalabs.ai/dream-machine/v1/generations/{generation_id}",
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -955,16 +1613,10 @@ def check_luma_status(generation_id: str) -> dict:
 
 
 def poll_luma_video(generation_id: str, timeout: int = 300) -> dict:
-    """انتظار اكتمال فيديو Luma"""
-    start = time.time()
-    while time.time() - start < timeout:
-        status = check_luma_status(generation_id)
-        if status.get("state") == "completed":
-            return status
-        if status.get("state") in ["failed", "error"]:
-            return status
-        time.sleep(10)
-    return {"state": "timeout", "error": "انتهت المهلة الزمنية"}
+    """انتظار اكتمال فيديو Luma — المتابعة تجري في مُتابِع الفيديو الخلفي"""
+    from modules.video_poller import POLLER
+    job_id = POLLER.track("luma", generation_id, api_key=_get_secrets().get("luma", ""))
+    return POLLER.wait(job_id, timeout)
 
 
 def generate_video_runway(prompt: str, image_bytes: Optional[bytes] = None,
@@ -989,11 +1641,10 @@ def generate_video_runway(prompt: str, image_bytes: Optional[bytes] = None,
     try:
         if image_bytes:
             # image-to-video: gen4_turbo يتطلب صورة
-            b64 = base64.b64encode(image_bytes).decode()
             payload: dict = {
                 "model": "gen4_turbo",
                 "promptText": prompt,
-                "promptImage": f"data:image/jpeg;base64,{b64}",
+                "promptImage": image_ref(image_bytes),
                 "ratio": ratio,
                 "duration": safe_duration,
             }
@@ -1008,7 +1659,7 @@ def generate_video_runway(prompt: str, image_bytes: Optional[bytes] = None,
             }
             endpoint = f"{BASE_URL}/text_to_video"
 
-        resp = requests.post(
+        resp = http_client.post(
             endpoint,
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -1026,14 +1677,13 @@ def generate_video_runway(prompt: str, image_bytes: Optional[bytes] = None,
         return {"error": str(e)}
 
 
-def check_runway_status(generation_id: str) -> dict:
+def check_runway_status(generation_id: str, api_key: str = "") -> dict:
     """فحص حالة توليد RunwayML"""
-    secrets = _get_secrets()
-    api_key = secrets.get("runway")
+    api_key = api_key or _get_secrets().get("runway")
     if not api_key or not generation_id:
         return {"state": "error", "error": "مفتاح أو معرف مفقود"}
     try:
-        resp = requests.get(
+        resp = http_client.get(
             f"https://api.runwayml.com/v1/tasks/{generation_id}",
             headers={
                 "Authorization": f"Bearer {api_key}",
@@ -1078,11 +1728,10 @@ def generate_video_fal(prompt: str, model: str = "kling",
         "negative_prompt": "blurry, low quality, text, watermark, distorted"
     }
     if image_bytes:
-        b64 = base64.b64encode(image_bytes).decode()
-        payload["image_url"] = f"data:image/jpeg;base64,{b64}"
+        payload["image_url"] = image_ref(image_bytes, ("fal",))
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
             f"https://fal.run/{model_id}",
             headers={
                 "Authorization": f"Key {api_key}",
@@ -1111,16 +1760,15 @@ def generate_video_fal(prompt: str, model: str = "kling",
         return {"error": str(e)[:200]}
 
 
-def check_fal_video_status(generation_id: str, model_id: str = "") -> dict:
+def check_fal_video_status(generation_id: str, model_id: str = "", api_key: str = "") -> dict:
     """فحص حالة توليد Fal.ai غير المتزامن"""
-    secrets = _get_secrets()
-    api_key = secrets.get("fal")
+    api_key = api_key or _get_secrets().get("fal")
     if not api_key or not generation_id:
         return {"state": "error", "error": "بيانات مفقودة"}
     if not model_id:
         return {"state": "completed", "video_url": generation_id}
     try:
-        sr = requests.get(
+        sr = http_client.get(
             f"https://queue.fal.run/{model_id}/requests/{generation_id}/status",
             headers={"Authorization": f"Key {api_key}"}, timeout=15
         )
@@ -1129,7 +1777,7 @@ def check_fal_video_status(generation_id: str, model_id: str = "") -> dict:
         sdata = sr.json()
         status = sdata.get("status", "IN_QUEUE")
         if status == "COMPLETED":
-            rr = requests.get(
+            rr = http_client.get(
                 f"https://queue.fal.run/{model_id}/requests/{generation_id}",
                 headers={"Authorization": f"Key {api_key}"}, timeout=15
             )
@@ -1161,7 +1809,7 @@ def generate_voiceover_elevenlabs(text: str, voice_id: str = "default",
     # الصوت الافتراضي
     v_id = voice_id if voice_id and voice_id != "default" else "pNInz6obpgDQGcFmaJgB"
 
-    resp = requests.post(
+    resp = http_client.post(
         f"https://api.elevenlabs.io/v1/text-to-speech/{v_id}",
         headers={"xi-api-key": key, "Content-Type": "application/json"},
         json={
@@ -1206,7 +1854,7 @@ def send_to_make(payload: dict) -> dict:
     if not webhook_url:
         return {"success": False, "error": "MAKE_WEBHOOK_URL غير محدد — أضفه في الإعدادات"}
     try:
-        resp = requests.post(webhook_url, json=payload, timeout=30)
+        resp = http_client.post(webhook_url, json=payload, timeout=30)
         return {
             "success": resp.status_code in [200, 201, 202, 204],
             "status_code": resp.status_code,
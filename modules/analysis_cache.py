@@ -0,0 +1,125 @@
+"""
+🔍 كاش تحليل الصور بالبصمة الإدراكية — Mahwous AI Studio v13.1
+نتيجة تحليل زجاجة العطر تُحفظ على القرص مع بصمة dHash للصورة: نفس الصورة المعاد
+رفعها (من مشغّل آخر، أو بجودة JPEG مختلفة، أو بمقاس آخر) تُعيد التحليل المحفوظ
+دون استدعاء Gemini Vision. البحث بمسافة Hamming عبر فهرس نطاقات (bands) في SQLite
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from modules.disk_cache import CACHE_ROOT
+from modules.imaging import dhash
+
+# أقصى مسافة Hamming (من 64 بت) لاعتبار الصورتين نفس الزجاجة — محافظة عمداً:
+# صور عطور مختلفة بنفس الخلفية قد تتقارب، والخطأ هنا يعني علامة تجارية خاطئة
+MAX_DISTANCE = int(os.environ.get("MAHWOUS_PHASH_DISTANCE", "4"))
+
+# 8 نطاقات × 8 بت: مسافة ≤ 7 تعني تطابق نطاق واحد على الأقل (مبدأ برج الحمام)
+BANDS = 8
+BAND_BITS = 64 // BANDS
+
+ANALYSIS_TTL = float(os.environ.get("MAHWOUS_ANALYSIS_CACHE_TTL_D", "90")) * 86400
+MAX_ENTRIES = int(os.environ.get("MAHWOUS_ANALYSIS_CACHE_MAX", "20000"))
+
+
+def _bands(value: int) -> list:
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+
+def _signed(value: int) -> int:
+    """SQLite يخزن أعداداً موقعة 64 بت"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class AnalysisCache:
+    """فهرس SQLite للتحليلات حسب البصمة — آمن بين الخيوط والعمليات (وضع WAL)"""
+
+    def __init__(self, path: str, max_distance: int = MAX_DISTANCE,
+                 ttl: float = ANALYSIS_TTL, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # ─── الفهرس ───────────────────────────────────────────────────────────────
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            bands = ", ".join(f"b{i} INTEGER" for i in range(BANDS))
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                f" phash INTEGER PRIMARY KEY, {bands}, data TEXT, created REAL, accessed REAL)"
+            )
+            for i in range(BANDS):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_b{i} ON analyses(b{i})")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON analyses(accessed)")
+            self._conn = conn
+        return self._conn
+
+    # ─── البحث والحفظ ────────────────────────────────────────────────────────
+    def lookup(self, image_bytes: bytes) -> Optional[dict]:
+        """أقرب تحليل محفوظ ضمن max_distance — None إن لم يوجد أو تعذرت قراءة الصورة"""
+        try:
+            value = dhash(image_bytes)
+        except Exception:
+            return None
+        return self.lookup_hash(value)
+
+    def lookup_hash(self, value: int) -> Optional[dict]:
+        now = time.time()
+        where = " OR ".join(f"b{i}=?" for i in range(BANDS))
+        with self._lock:
+            db = self._db()
+            rows = db.execute(
+                f"SELECT phash, data FROM analyses WHERE ({where}) AND created >= ?",
+                (*_bands(value), now - self.ttl),
+            ).fetchall()
+            best = None
+            for stored, data in rows:
+                distance = bin((stored & ((1 << 64) - 1)) ^ value).count("1")
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, stored, data)
+            if best is None:
+                return None
+            db.execute("UPDATE analyses SET accessed=? WHERE phash=?", (now, best[1]))
+            db.commit()
+        return json.loads(best[2])
+
+    def store(self, image_bytes: bytes, info: dict):
+        try:
+            value = dhash(image_bytes)
+        except Exception:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                f"INSERT OR REPLACE INTO analyses VALUES (?, {', '.join('?' * BANDS)}, ?, ?, ?)",
+                (_signed(value), *_bands(value), json.dumps(info, ensure_ascii=False), now, now),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    # ─── الإخلاء ──────────────────────────────────────────────────────────────
+    def _evict(self, db: sqlite3.Connection, now: float):
+        db.execute("DELETE FROM analyses WHERE created < ?", (now - self.ttl,))
+        count = db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM analyses WHERE phash IN"
+                " (SELECT phash FROM analyses ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+
+ANALYSIS_CACHE = AnalysisCache(os.path.join(CACHE_ROOT, "analysis", "index.db"))
@@ -0,0 +1,85 @@
+"""
+🧾 نتائج الصور الكسولة — Mahwous AI Studio v13.1
+نتيجة التوليد تحمل رابط المزود، والبايتات تُجلب عند الحاجة فقط (ZIP، تغيير المقاس،
+النشر) — مع بدء الجلب في الخلفية فور التوليد. الواجهة تعرض من الرابط مباشرةً
+فلا تمر الصورة عبر خادم Streamlit
+"""
+
+import concurrent.futures
+import threading
+from typing import Callable, Optional, Union
+
+from modules import http_client
+
+# خيوط الجلب في الخلفية — التنزيل من CDN المزود لا يحتاج حصة توليد
+_FETCHERS = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="mahwous-fetch")
+
+
+class ImageArtifact:
+    """رابط صورة لدى المزود + بايتات تُجلب مرة واحدة عند أول طلب"""
+
+    def __init__(self, url: str = "", data: Optional[bytes] = None,
+                 on_fetch: Optional[Callable[[bytes], None]] = None):
+        self.url = url
+        self._data = data
+        self._on_fetch = on_fetch
+        self._future = None
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.url or self._data)
+
+    @property
+    def ready(self) -> bool:
+        """البايتات في الذاكرة — القراءة لن تنتظر الشبكة"""
+        return self._data is not None
+
+    def _fetch(self) -> bytes:
+        resp = http_client.get(self.url, timeout=30)
+        resp.raise_for_status()
+        data = resp.content
+        self._data = data
+        if self._on_fetch:
+            try:
+                self._on_fetch(data)
+            except Exception:
+                pass
+        return data
+
+    def prefetch(self) -> "ImageArtifact":
+        """بدء الجلب في الخلفية (مرة واحدة) — يُرجع نفس الكائن"""
+        with self._lock:
+            if self._data is None and self._future is None and self.url:
+                self._future = _FETCHERS.submit(self._fetch)
+        return self
+
+    @property
+    def content(self) -> bytes:
+        """البايتات — تنتظر الجلب الجاري أو تبدؤه؛ يرفع استثناء الشبكة عند الفشل"""
+        if self._data is not None:
+            return self._data
+        future = self.prefetch()._future
+        try:
+            return future.result()
+        except Exception:
+            # جلب فاشل لا يُحفظ — الطلب التالي يعيد المحاولة
+            with self._lock:
+                if self._future is future:
+                    self._future = None
+            raise
+
+    @property
+    def display(self) -> Union[str, bytes]:
+        """ما يُمرَّر لـ st.image: الرابط إن وُجد (يجلبه المتصفح)، وإلا البايتات"""
+        return self.url or self._data
+
+
+def as_bytes(image: Union[bytes, ImageArtifact, None]) -> Optional[bytes]:
+    """بايتات الصورة أياً كان شكل النتيجة"""
+    if isinstance(image, ImageArtifact):
+        return image.content
+    return image
+
+
+def display_source(image: Union[bytes, ImageArtifact]) -> Union[str, bytes]:
+    return image.display if isinstance(image, ImageArtifact) else image
@@ -0,0 +1,213 @@
+"""
+📎 سجل الأصول المرفوعة — Mahwous AI Studio v13.1
+كل صورة (منتج/مرجع شخصية) تُرفع مرة واحدة لمخزن مناسب للمزود وتُعاد روابطها
+حسب بصمة المحتوى مع تتبع انتهاء الصلاحية — بدل إرسال data:…;base64 بحجم ميغابايتات
+في كل طلب توليد
+"""
+
+import base64
+import functools
+import hashlib
+import http.server
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from modules import http_client
+from modules.disk_cache import CACHE_ROOT
+from modules.single_flight import SingleFlight
+
+ASSETS_DIR = os.path.join(CACHE_ROOT, "assets")
+
+# صلاحية الرابط في كل مخزن (ثوانٍ) — تقديرات محافظة أقل من سياسة الاحتفاظ الفعلية
+STORE_TTL = {
+    "fal":   7 * 86400,
+    "imgbb": 30 * 86400,
+    "local": 365 * 86400,
+}
+
+# رابط قريب من الانتهاء لا يُعطى: المزود قد يجلبه بعد دقائق (مهام الفيديو)
+EXPIRY_MARGIN = 3600
+
+# ترتيب المخازن الافتراضي لروابط عامة يجلبها المزود (Runway/Luma/Fal)
+PUBLIC_STORES = ("fal", "imgbb", "local")
+
+# البديل المحلي: خادم HTTP يقدّم ملفات الأصول — يعمل فقط عند ضبط رابط عام يصل إليه
+# (نفق/وكيل عكسي)، لأن المزودين لا يصلون إلى localhost. يستمع على 127.0.0.1
+# افتراضياً: الإتاحة العامة مسؤولية الوكيل
+LOCAL_BASE_URL = os.environ.get("MAHWOUS_ASSET_BASE_URL", "").rstrip("/")
+LOCAL_HOST = os.environ.get("MAHWOUS_ASSET_HOST", "127.0.0.1")
+LOCAL_PORT = int(os.environ.get("MAHWOUS_ASSET_PORT", "8765"))
+
+_EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+
+
+def asset_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def data_uri(data: bytes, mime: str = "image/jpeg") -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# المخازن — كل دالة تُرجع (الرابط، وقت الانتهاء) أو ترفع استثناءً
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _secrets() -> dict:
+    from modules.ai_engine import _get_secrets
+    return _get_secrets()
+
+
+def _upload_fal(data: bytes, key: str, mime: str) -> tuple:
+    """Fal storage (CDN): طلب رابط رفع موقّع ثم PUT للبايتات"""
+    api_key = _secrets().get("fal")
+    if not api_key:
+        raise ValueError("FAL_API_KEY مفقود")
+    resp = http_client.post(
+        "https://rest.alpha.fal.ai/storage/upload/initiate?storage_type=fal-cdn-v3",
+        headers={"Authorization": f"Key {api_key}", "Content-Type": "application/json"},
+        json={"content_type": mime, "file_name": f"{key[:24]}.{_EXTENSIONS.get(mime, 'bin')}"},
+        timeout=30,
+    )
+    resp.raise_for_status()
+    target = resp.json()
+    put = http_client.put(target["upload_url"], provider="fal", data=data,
+                          headers={"Content-Type": mime}, timeout=60)
+    put.raise_for_status()
+    return target["file_url"], time.time() + STORE_TTL["fal"]
+
+
+def _upload_imgbb(data: bytes, key: str, mime: str) -> tuple:
+    api_key = _secrets().get("imgbb")
+    if not api_key:
+        raise ValueError("IMGBB_API_KEY مفقود")
+    resp = http_client.post(
+        "https://api.imgbb.com/1/upload",
+        data={"key": api_key, "image": base64.b64encode(data).decode(), "name": key[:24]},
+        timeout=30,
+    )
+    resp.raise_for_status()
+    return resp.json()["data"]["url"], time.time() + STORE_TTL["imgbb"]
+
+
+def _upload_local(data: bytes, key: str, mime: str) -> tuple:
+    if not LOCAL_BASE_URL:
+        raise ValueError("MAHWOUS_ASSET_BASE_URL غير مضبوط — لا رابط عام للخادم المحلي")
+    name = f"{key}.{_EXTENSIONS.get(mime, 'bin')}"
+    path = os.path.join(ASSETS_DIR, "files", name)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    _ensure_local_server()
+    return f"{LOCAL_BASE_URL}/{name}", time.time() + STORE_TTL["local"]
+
+
+_UPLOADERS = {"fal": _upload_fal, "imgbb": _upload_imgbb, "local": _upload_local}
+
+_server = None
+_server_lock = threading.Lock()
+
+
+class _AssetHandler(http.server.SimpleHTTPRequestHandler):
+    """ملفات بأسمائها (بصمة المحتوى) فقط — لا فهرسة للمجلد ولا سجلات"""
+
+    def list_directory(self, path):
+        self.send_error(404)
+        return None
+
+    def log_message(self, *args):
+        pass
+
+
+def _ensure_local_server():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return
+        handler = functools.partial(_AssetHandler, directory=os.path.join(ASSETS_DIR, "files"))
+        _server = http.server.ThreadingHTTPServer((LOCAL_HOST, LOCAL_PORT), handler)
+        threading.Thread(target=_server.serve_forever, daemon=True,
+                         name="mahwous-assets").start()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# السجل
+# ══════════════════════════════════════════════════════════════════════════════
+
+class AssetRegistry:
+    """(بصمة المحتوى، المخزن) → الرابط ووقت انتهائه — فهرس SQLite مشترك بين الجلسات"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        # رفعات متزامنة لنفس الصورة (مهام الدفعات المتوازية) تنتظر رفعاً واحداً
+        self._uploads = SingleFlight(ttl=0)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS assets ("
+                " key TEXT, store TEXT, url TEXT, expires REAL, created REAL,"
+                " PRIMARY KEY (key, store))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, key: str, store: str) -> Optional[str]:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT url FROM assets WHERE key=? AND store=? AND expires > ?",
+                (key, store, time.time() + EXPIRY_MARGIN),
+            ).fetchone()
+        return row[0] if row else None
+
+    def record(self, key: str, store: str, url: str, expires: float):
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO assets VALUES (?,?,?,?,?)",
+                       (key, store, url, expires, time.time()))
+            db.execute("DELETE FROM assets WHERE expires < ?", (time.time(),))
+            db.commit()
+
+    def url_for(self, data: bytes, store: str, mime: str = "image/jpeg") -> str:
+        """رابط الصورة في المخزن — يُرفع عند أول طلب أو بعد انتهاء الصلاحية فقط"""
+        key = asset_key(data)
+        url = self.lookup(key, store)
+        if url:
+            return url
+
+        def upload():
+            url, expires = _UPLOADERS[store](data, key, mime)
+            self.record(key, store, url, expires)
+            return url
+        return self._uploads.run(f"{store}:{key}", upload)
+
+    def public_url(self, data: bytes, stores: tuple = PUBLIC_STORES,
+                   mime: str = "image/jpeg") -> Optional[str]:
+        """أول رابط متاح من المخازن بالترتيب — None إن لم يتوفر أي مخزن"""
+        if not data:
+            return None
+        for store in stores:
+            try:
+                return self.url_for(data, store, mime)
+            except Exception:
+                continue
+        return None
+
+
+ASSETS = AssetRegistry(os.path.join(ASSETS_DIR, "index.db"))
+
+
+def image_ref(data: bytes, stores: tuple = PUBLIC_STORES, mime: str = "image/jpeg") -> str:
+    """رابط مرفوع إن أمكن، وإلا data URI كما كان سابقاً — للمزودين الذين يقبلون الاثنين"""
+    return ASSETS.public_url(data, stores, mime) or data_uri(data, mime)
@@ -0,0 +1,239 @@
+"""
+⚡ المحرك غير المتزامن — Mahwous AI Studio v13.1
+حلقة asyncio واحدة في خيط خلفي + جدولة عامة بحدود تزامن لكل مزود
+تتداخل فيها استدعاءات الصور والنصوص والفيديو دون حجز خيط سكربت Streamlit
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Mapping, Optional
+
+from modules.ai_engine import (
+    PLATFORMS, _get_secrets, snapshot_credentials, use_credentials,
+    _call_claude,
+    cached_image_any, image_backend_order, generate_image_on, no_image_backend_error,
+    _image_error,
+    plan_platform_groups, _fan_out_group,
+    generate_video_luma, generate_video_runway, generate_video_fal,
+)
+from modules.deadline import Deadline, current_deadline, entry_point, use_deadline
+from modules.router import HEDGE
+
+# ══════════════════════════════════════════════════════════════════════════════
+# حدود التزامن لكل مزود (على مستوى العملية كاملة)
+# ══════════════════════════════════════════════════════════════════════════════
+
+PROVIDER_LIMITS = {
+    "fal":        8,
+    "gemini":     6,
+    "openrouter": 4,
+    "luma":       2,
+    "runway":     2,
+    "default":    4,
+}
+
+# تجاوز من البيئة: MAHWOUS_CONCURRENCY_FAL=32 …
+for _provider in list(PROVIDER_LIMITS):
+    _env = os.environ.get(f"MAHWOUS_CONCURRENCY_{_provider.upper()}", "")
+    if _env.isdigit():
+        PROVIDER_LIMITS[_provider] = int(_env)
+
+
+async def _with_context(coro, creds: Mapping, deadline: Optional[Deadline]):
+    # المهام الفرعية و asyncio.to_thread ترث السياق — فكل العمّال يرون نفس اللقطة والموعد
+    with use_credentials(creds), use_deadline(deadline):
+        return await coro
+
+
+class Scheduler:
+    """حلقة asyncio خلفية مع Semaphore لكل مزود — تُشارك بين كل الجلسات"""
+
+    def __init__(self, limits: dict):
+        self.limits = dict(limits)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._sems: dict = {}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+                        max_workers=sum(self.limits.values()),
+                        thread_name_prefix="mahwous-io",
+                    ))
+                    threading.Thread(target=loop.run_forever, name="mahwous-async",
+                                     daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _sem(self, provider: str) -> asyncio.Semaphore:
+        # يُستدعى داخل الحلقة فقط — لا حاجة لقفل
+        if provider not in self._sems:
+            limit = self.limits.get(provider, self.limits["default"])
+            self._sems[provider] = asyncio.Semaphore(limit)
+        return self._sems[provider]
+
+    async def call(self, provider: str, fn, *args, **kwargs):
+        """تشغيل دالة متزامنة (طلب HTTP) ضمن حصة المزود"""
+        async with self._sem(provider):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def submit(self, coro, creds: Optional[Mapping] = None) -> concurrent.futures.Future:
+        """
+        جدولة coroutine من أي خيط — يُرجع Future لا يحجز المستدعي.
+        المفاتيح والموعد النهائي النشط تُلتقط هنا على خيط المستدعي (خيط السكربت)
+        ما لم تُمرَّر لقطة جاهزة.
+        """
+        creds = creds if creds is not None else snapshot_credentials()
+        return asyncio.run_coroutine_threadsafe(_with_context(coro, creds, current_deadline()),
+                                                self._ensure_loop())
+
+    def run(self, coro, timeout: Optional[float] = None, creds: Optional[Mapping] = None):
+        """تشغيل coroutine وانتظار نتيجته"""
+        return self.submit(coro, creds).result(timeout)
+
+
+SCHEDULER = Scheduler(PROVIDER_LIMITS)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# اختيار المزود
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _text_provider() -> str:
+    return "openrouter" if _get_secrets().get("openrouter") else "gemini"
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# واجهات غير متزامنة
+# ══════════════════════════════════════════════════════════════════════════════
+
+async def generate_image_routed_async(prompt: str, aspect: str = "1:1") -> tuple:
+    """
+    مثل generate_image_with_provider لكن الموجّه يختار الترتيب أولاً ثم يُستدعى كل
+    مزود ضمن حصته هو — فلا تستهلك صور Gemini حصة Fal. يُرجع (الصورة، مزود)
+    """
+    cached = cached_image_any(prompt, aspect)
+    if cached:
+        return cached
+    _, order = image_backend_order(aspect)
+    errors = []
+    for backend in order:
+        try:
+            img = await SCHEDULER.call(backend, generate_image_on, backend, prompt, aspect)
+            return img, backend
+        except Exception as e:
+            errors.append(_image_error(backend, e))
+    if errors:
+        raise ValueError(f"فشل توليد الصورة: {' | '.join(errors)}")
+    raise no_image_backend_error()
+
+
+async def generate_image_async(prompt: str, aspect: str = "1:1"):
+    img, _ = await generate_image_routed_async(prompt, aspect)
+    return img
+
+
+async def generate_image_hedged_async(prompt: str, aspect: str = "1:1") -> tuple:
+    """
+    توليد صورة بتحوّط: إن تأخر المزود الأول عن زمن p90 المعتاد له يُطلق الثاني
+    بالتوازي ويُعتمد أول نجاح — ضمن ميزانية HEDGE. الخاسر لا يُلغى (طلب HTTP جارٍ)
+    بل تُهمل نتيجته، وصورته تبقى في الكاش. يُرجع (الصورة، مزود)
+    """
+    cached = cached_image_any(prompt, aspect)
+    if cached:
+        return cached
+    klass, queue = image_backend_order(aspect)
+    if not queue:
+        raise no_image_backend_error()
+    HEDGE.note_request()
+
+    def _launch(backend: str) -> asyncio.Task:
+        return asyncio.ensure_future(SCHEDULER.call(backend, generate_image_on, backend, prompt, aspect))
+
+    primary = queue.pop(0)
+    running = {_launch(primary): primary}
+    hedge_checked = False
+    errors = []
+    try:
+        while running:
+            timeout = HEDGE.delay(klass, primary) if queue and not hedge_checked else None
+            done, _ = await asyncio.wait(running, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # الأول بطيء — بديل واحد فقط إن سمحت الميزانية
+                hedge_checked = True
+                if HEDGE.allow():
+                    backend = queue.pop(0)
+                    running[_launch(backend)] = backend
+                continue
+            for task in done:
+                backend = running.pop(task)
+                try:
+                    return task.result(), backend
+                except Exception as e:
+                    errors.append(_image_error(backend, e))
+            if not running and queue:
+                # فشل كل الجاري — البديل التالي فوراً كالتسلسل العادي
+                backend = queue.pop(0)
+                running[_launch(backend)] = backend
+    finally:
+        # الخاسر يكمل في الخلفية — نستهلك نتيجته حتى لا تُطبع تحذيرات asyncio
+        for task in running:
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    raise ValueError(f"فشل توليد الصورة: {' | '.join(errors)}")
+
+
+@entry_point("image")
+def generate_image_hedged(prompt: str, aspect: str = "1:1") -> tuple:
+    """نسخة متزامنة للواجهة — (الصورة، مزود) ضمن الموعد النهائي النشط"""
+    return SCHEDULER.run(generate_image_hedged_async(prompt, aspect), current_deadline().remaining())
+
+
+async def call_text_async(prompt: str, max_tokens: int = 2000) -> str:
+    return await SCHEDULER.call(_text_provider(), _call_claude, prompt, max_tokens)
+
+
+async def run_text_task(fn, *args, **kwargs):
+    """تشغيل مولّد نصوص (generate_all_captions وأخواتها) ضمن حصة مزود النصوص"""
+    return await SCHEDULER.call(_text_provider(), fn, *args, **kwargs)
+
+
+async def submit_video_async(provider: str, prompt: str, **kwargs) -> dict:
+    """إرسال طلب فيديو (luma / runway / fal) — يُرجع معرف المهمة دون انتظار اكتمالها"""
+    if provider == "luma":
+        return await SCHEDULER.call("luma", generate_video_luma, prompt, **kwargs)
+    if provider == "runway":
+        return await SCHEDULER.call("runway", generate_video_runway, prompt, **kwargs)
+    return await SCHEDULER.call("fal", generate_video_fal, prompt, model=provider, **kwargs)
+
+
+async def generate_platform_images_async(info: dict, selected_platforms: Optional[list] = None,
+                                         outfit: str = "suit", scene: str = "store",
+                                         include_character: bool = True,
+                                         ramadan_mode: bool = False) -> dict:
+    """توليد صور المنصات — مجموعة واحدة لكل (برومت، نسبة) وكلها بالتوازي"""
+    selected = selected_platforms or list(PLATFORMS.keys())
+    groups = plan_platform_groups(info, selected, outfit, scene, include_character, ramadan_mode)
+
+    async def _one(group):
+        try:
+            cached = cached_image_any(group["prompt"], group["aspect"])
+            if cached:
+                img, provider = cached
+            else:
+                img, provider = await generate_image_routed_async(group["prompt"], group["aspect"])
+            # جلب البايتات وتغيير المقاس خارج حلقة الأحداث
+            return await asyncio.to_thread(_fan_out_group, group, img, provider=provider,
+                                           cached=bool(cached))
+        except Exception as e:
+            return _fan_out_group(group, error=str(e))
+
+    results = {}
+    for part in await asyncio.gather(*[_one(g) for g in groups]):
+        results.update(part)
+    return {k: results[k] for k in selected if k in results}
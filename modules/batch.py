@@ -0,0 +1,428 @@
+"""
+🏭 التوليد الدفعي بدون واجهة — Mahwous AI Studio v13.1
+توليد محتوى كتالوج كامل من CSV/JSONL دون Streamlit:
+
+    python -m modules.batch products.csv --out output/ --concurrency 4 --video luma
+
+الأعمدة: brand, product_name, colors, image (مسار أو رابط)، واختيارياً
+sku, bottle_shape, mood, notes_guess. المفاتيح من متغيرات البيئة أو
+.streamlit/secrets.toml (أو MAHWOUS_SECRETS_FILE).
+
+حالة كل (منتج × مُخرَج) تُحفظ في <out>/jobs.db — إعادة التشغيل تتخطى المكتمل
+وتعيد الفاشل فقط (حتى --max-attempts محاولات).
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import re
+import sys
+from typing import Optional
+
+from modules import http_client
+from modules.ai_engine import (
+    PLATFORMS, analyze_perfume_image, build_manual_info, snapshot_credentials, use_credentials,
+)
+from modules.async_engine import SCHEDULER
+from modules.deadline import BATCH_BUDGET, use_deadline
+from modules.imaging import RESIZE_WORKERS, shutdown_resize_pool, start_resize_pool
+from modules.job_store import DONE, JobStore
+from modules.pipeline import PACK_TASKS, iter_content_pack
+from modules.rate_limit import configure_limit, use_shared_store
+from modules.router import estimate_cost
+from modules.supabase_db import save_perfume_to_supabase
+from modules.usage import API, Usage
+
+DEFAULT_TASKS = ["images", "captions"]
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# قراءة المنتجات
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _parse_colors(value) -> list:
+    if isinstance(value, list):
+        return value
+    value = (value or "").strip()
+    if value.startswith("["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return [c.strip() for c in re.split(r"[|;,]", value) if c.strip()]
+
+
+def read_products(path: str) -> list:
+    """قراءة ملف المنتجات (CSV أو JSONL)"""
+    products = []
+    with open(path, encoding="utf-8-sig") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    products.append(json.loads(line))
+        else:
+            products.extend(csv.DictReader(f))
+    for p in products:
+        p["colors"] = _parse_colors(p.get("colors"))
+    return products
+
+
+def product_key(product: dict) -> str:
+    """معرّف ثابت للمنتج — sku أو brand-product_name"""
+    raw = product.get("sku") or f"{product.get('brand', '')}-{product.get('product_name', '')}"
+    slug = re.sub(r"[^\w\-]+", "_", str(raw).strip(), flags=re.UNICODE).strip("_").lower()
+    return slug or "product"
+
+
+def _load_image(ref: str) -> Optional[bytes]:
+    if not ref:
+        return None
+    if ref.startswith(("http://", "https://")):
+        resp = http_client.get(ref, timeout=30)
+        resp.raise_for_status()
+        return resp.content
+    with open(ref, "rb") as f:
+        return f.read()
+
+
+def build_info(product: dict) -> dict:
+    """تحليل صورة المنتج إن وُجدت، والقيم المُدخلة في الملف تتقدم على التحليل"""
+    manual = build_manual_info(
+        brand=product.get("brand", ""),
+        product_name=product.get("product_name", ""),
+        colors=product.get("colors") or [],
+        bottle_shape=product.get("bottle_shape", ""),
+        mood=product.get("mood", "") or "فاخر",
+        notes_guess=product.get("notes_guess", ""),
+    )
+    image_bytes = _load_image(product.get("image", ""))
+    if not image_bytes:
+        return manual
+    try:
+        info = analyze_perfume_image(image_bytes)
+    except Exception:
+        return manual
+    for k in ("brand", "product_name", "bottle_shape", "mood", "notes_guess"):
+        if product.get(k):
+            info[k] = product[k]
+    if product.get("colors"):
+        info["colors"] = product["colors"]
+    return info
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# كتابة المخرجات
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def write_result(out_dir: str, name: str, result) -> list:
+    """حفظ نتيجة مهمة في مجلد المنتج — يُرجع المسارات المكتوبة"""
+    written = []
+    if name == "images":
+        img_dir = os.path.join(out_dir, "images")
+        os.makedirs(img_dir, exist_ok=True)
+        for key, data in (result or {}).items():
+            if data.get("bytes"):
+                path = os.path.join(img_dir, f"{key}_{data['w']}x{data['h']}.jpg")
+                with open(path, "wb") as f:
+                    f.write(data["bytes"])
+                written.append(path)
+        errors = {k: v["error"] for k, v in (result or {}).items() if v.get("error")}
+        if errors:
+            path = os.path.join(img_dir, "errors.json")
+            _write_json(path, errors)
+            written.append(path)
+    elif name == "story":
+        path = os.path.join(out_dir, "story.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(result or "")
+        written.append(path)
+    else:
+        path = os.path.join(out_dir, f"{name}.json")
+        _write_json(path, result)
+        written.append(path)
+    return written
+
+
+def _task_ok(name: str, result) -> bool:
+    if name == "images":
+        return bool(result) and all(v.get("bytes") for v in result.values())
+    if name == "story":
+        return bool(result) and not str(result).startswith("خطأ")
+    return isinstance(result, dict) and "error" not in result
+
+
+def _image_path(out_dir: str, platform: str, data: dict) -> str:
+    return os.path.join(out_dir, "images", f"{platform}_{data['w']}x{data['h']}.jpg")
+
+
+def _load_saved_images(out_dir: str) -> dict:
+    """الصور المحفوظة من تشغيل سابق — مرجع للفيديو دون إعادة توليدها"""
+    images = {}
+    img_dir = os.path.join(out_dir, "images")
+    if not os.path.isdir(img_dir):
+        return images
+    for fname in os.listdir(img_dir):
+        if fname.endswith(".jpg"):
+            platform = fname[:-4].rsplit("_", 1)[0]
+            with open(os.path.join(img_dir, fname), "rb") as f:
+                images[platform] = {"bytes": f.read()}
+    return images
+
+
+def _load_saved_json(out_dir: str, name: str) -> Optional[dict]:
+    path = os.path.join(out_dir, f"{name}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# التشغيل (قابل للاستئناف عبر jobs.db)
+# ══════════════════════════════════════════════════════════════════════════════
+
+def product_artifacts(opts: dict) -> list:
+    """مهام المنتج الواحد: info + صورة لكل منصة + كل مهمة نصية + فيديو/Supabase"""
+    artifacts = ["info"]
+    tasks = opts.get("tasks") or DEFAULT_TASKS
+    if "images" in tasks:
+        artifacts += [f"image:{p}" for p in opts.get("platforms") or PLATFORMS]
+    artifacts += [t for t in tasks if t not in ("images", "video")]
+    if opts.get("video_provider"):
+        artifacts.append("video")
+    if opts.get("supabase"):
+        artifacts.append("supabase")
+    return artifacts
+
+
+def _video_cost_kind(provider: str) -> str:
+    return provider if provider in ("luma", "runway") else "fal"
+
+
+def _run_info(product: dict, key: str, out_dir: str, store: JobStore, pending: list) -> dict:
+    path = os.path.join(out_dir, "info.json")
+    if "info" not in pending and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    store.start(key, "info")
+    try:
+        info = build_info(product)
+    except Exception as e:
+        store.finish(key, "info", False, error=str(e))
+        raise
+    _write_json(path, info)
+    store.finish(key, "info", True, output=path)
+    return info
+
+
+def _record_result(key: str, out_dir: str, name: str, result, pending: list,
+                   store: JobStore, opts: dict, usage: Optional[Usage] = None):
+    """
+    حفظ نتيجة مهمة من الحزمة وتحديث حالتها في سجل المهام — بالمزود والمصدر
+    والتكلفة كما سجّلها المحرك فعلاً (usage)، لا كما تتوقعه المفاتيح المتاحة
+    """
+    written = write_result(out_dir, name, result)
+    if name == "images":
+        for platform, data in (result or {}).items():
+            artifact = f"image:{platform}"
+            if artifact not in pending:
+                continue
+            if data.get("bytes"):
+                # حصة المنصة من توليد المجموعة المشترك، وصفر لإصابة الكاش
+                store.finish(key, artifact, True, provider=data.get("provider", ""),
+                             source=data.get("source", ""), cost=data.get("cost", 0.0),
+                             output=_image_path(out_dir, platform, data))
+            else:
+                store.finish(key, artifact, False, error=data.get("error", ""))
+        return
+    if name not in pending:
+        return
+    ok = _task_ok(name, result)
+    error = "" if ok else str(result.get("error", "") if isinstance(result, dict) else result)
+    if name == "video":
+        provider = opts.get("video_provider", "")
+        store.finish(key, name, ok, provider=provider,
+                     source=API if ok else "",
+                     cost=estimate_cost(_video_cost_kind(provider), "video") if ok else 0.0,
+                     output=written[0] if written else None, error=error)
+    else:
+        # الحزمة المدمجة تُحتسب مرة واحدة على المهمة التي أرسلتها، والكاش بلا تكلفة
+        usage = usage or Usage()
+        store.finish(key, name, ok, provider=usage.provider, source=usage.source,
+                     cost=usage.cost("text"),
+                     output=written[0] if written else None, error=error)
+
+
+def process_product(product: dict, out_root: str, opts: dict, store: JobStore,
+                    max_attempts: int = 3) -> dict:
+    # ميزانية سخية لكل منتج — تنتقل إلى كل مهام الحزمة عبر SCHEDULER
+    with use_credentials(opts.get("credentials")), use_deadline(opts.get("budget", BATCH_BUDGET)):
+        return _process_product(product, out_root, opts, store, max_attempts)
+
+
+def _process_product(product: dict, out_root: str, opts: dict, store: JobStore,
+                     max_attempts: int) -> dict:
+    key = product_key(product)
+    out_dir = os.path.join(out_root, key)
+    os.makedirs(out_dir, exist_ok=True)
+    artifacts = product_artifacts(opts)
+    pending = store.pending(key, artifacts, max_attempts)
+    record = {"key": key, "status": "done", "ran": pending, "failed": []}
+    if not pending:
+        return record
+    try:
+        info = _run_info(product, key, out_dir, store, pending)
+
+        platforms = [a.split(":", 1)[1] for a in pending if a.startswith("image:")]
+        tasks = [a for a in pending if a in PACK_TASKS]
+        if platforms:
+            tasks.append("images")
+        pack_opts = dict(opts, tasks=tasks, platforms=platforms,
+                         video_provider=opts.get("video_provider") if "video" in pending else "")
+        # اعتماديات الفيديو المكتملة سابقاً تُحمَّل من القرص بدل إعادة دفع ثمنها
+        prefilled = {}
+        if "video" in pending:
+            if not platforms:
+                prefilled["images"] = _load_saved_images(out_dir)
+            if "scenario" not in pending:
+                scenario = _load_saved_json(out_dir, "scenario")
+                if scenario is not None:
+                    prefilled["scenario"] = scenario
+        pack_opts["prefilled"] = prefilled
+        pack_opts["usage"] = usage = {}
+
+        for artifact in pending:
+            if artifact not in ("info", "supabase"):
+                store.start(key, artifact)
+        if tasks:
+            for name, result in iter_content_pack(info, pack_opts):
+                _record_result(key, out_dir, name, result, pending, store, opts, usage.get(name))
+
+        if "supabase" in pending:
+            store.start(key, "supabase")
+            video = _load_saved_json(out_dir, "video") or {}
+            res = save_perfume_to_supabase(info, {}, video.get("video_url", ""))
+            store.finish(key, "supabase", bool(res.get("success")), provider="supabase",
+                         error=res.get("error", ""))
+    except Exception as e:
+        record["error"] = str(e)[:300]
+
+    states = {a: (store.get(key, a) or {}).get("status") for a in artifacts}
+    record["failed"] = [a for a, s in states.items() if s != DONE]
+    if record["failed"]:
+        record["status"] = "failed" if states.get("info") != DONE else "partial"
+    return record
+
+
+def run_batch(products: list, out_root: str, opts: dict, concurrency: int = 2,
+              resume: bool = True, max_attempts: int = 3, log=print) -> list:
+    os.makedirs(out_root, exist_ok=True)
+    store = JobStore(os.path.join(out_root, "jobs.db"))
+    if not resume:
+        store.reset()
+    # المفاتيح تُحل مرة واحدة وتُشارك بين كل العمّال
+    opts = dict(opts, credentials=opts.get("credentials") or snapshot_credentials())
+    recovered = store.recover_running()
+    if recovered:
+        log(f"♻️ {recovered} مهمة عالقة من تشغيل سابق ستُعاد")
+
+    records = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(process_product, p, out_root, opts, store, max_attempts): p
+                   for p in products}
+        for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            rec = future.result()
+            records.append(rec)
+            if not rec["ran"]:
+                status = "skipped (done)"
+            else:
+                status = rec["status"]
+            extra = f" ({', '.join(rec['failed'])})" if rec["failed"] else ""
+            log(f"[{i}/{len(products)}] {rec['key']}: {status}{extra}")
+
+    summary = store.summary()
+    cost = sum(v["cost"] for v in summary.values())
+    log("📊 " + " | ".join(f"{s}: {v['count']}" for s, v in summary.items())
+        + f" | التكلفة التقديرية: ${cost:.2f}")
+    store.close()
+    return records
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m modules.batch",
+        description="توليد محتوى كتالوج العطور دفعياً بدون Streamlit",
+    )
+    parser.add_argument("products", help="ملف CSV أو JSONL للمنتجات")
+    parser.add_argument("--out", default="batch_output", help="مجلد المخرجات")
+    parser.add_argument("--concurrency", type=int, default=2, help="عدد المنتجات المتوازية")
+    parser.add_argument("--tasks", default=",".join(DEFAULT_TASKS),
+                        help=f"المهام مفصولة بفواصل من: {', '.join(t for t in PACK_TASKS if t != 'video')}")
+    parser.add_argument("--platforms", default="", help="المنصات مفصولة بفواصل (الافتراضي: الكل)")
+    parser.add_argument("--outfit", default="suit")
+    parser.add_argument("--scene", default="store")
+    parser.add_argument("--no-character", action="store_true", help="صور المنتج بدون شخصية مهووس")
+    parser.add_argument("--ramadan", action="store_true")
+    parser.add_argument("--video", default="", help="إرسال فيديو: luma / runway / kling / hailuo / seedance")
+    parser.add_argument("--limit", action="append", default=[], metavar="PROVIDER=N",
+                        help="حد التزامن لمزود (مثال: --limit fal=12)")
+    parser.add_argument("--rpm", action="append", default=[], metavar="KEY=N",
+                        help="ميزانية الطلبات في الدقيقة لمزود أو نموذج (مثال: --rpm gemini:imagen-3.0-generate-002=20)")
+    parser.add_argument("--rate-db", default=os.environ.get("MAHWOUS_RATE_DB", ""),
+                        help="ملف SQLite لمشاركة حدود المعدل مع عمّال آخرين")
+    parser.add_argument("--supabase", action="store_true", help="حفظ كل منتج في Supabase بعد توليده")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="أقصى عدد محاولات للمهمة الواحدة عبر التشغيلات")
+    parser.add_argument("--budget", type=float, default=BATCH_BUDGET,
+                        help="المهلة الكلية لكل منتج بالثواني (افتراضي 1800)")
+    parser.add_argument("--no-resume", action="store_true", help="مسح سجل المهام وإعادة كل شيء")
+    parser.add_argument("--resize-workers", type=int, default=RESIZE_WORKERS,
+                        help="عمليات تغيير مقاس الصور المتوازية (0 = داخل العملية)")
+    args = parser.parse_args(argv)
+
+    for item in args.limit:
+        provider, _, n = item.partition("=")
+        SCHEDULER.limits[provider.strip()] = int(n)
+    for item in args.rpm:
+        key, _, n = item.partition("=")
+        configure_limit(key.strip(), rpm=float(n))
+    if args.rate_db:
+        use_shared_store(args.rate_db)
+
+    tasks = [t.strip() for t in args.tasks.split(",") if t.strip()]
+    unknown = [t for t in tasks if t not in PACK_TASKS]
+    if unknown:
+        parser.error(f"مهام غير معروفة: {', '.join(unknown)}")
+    platforms = [p.strip() for p in args.platforms.split(",") if p.strip()] or list(PLATFORMS.keys())
+
+    opts = {
+        "tasks": tasks,
+        "platforms": platforms,
+        "outfit": args.outfit,
+        "scene": args.scene,
+        "include_character": not args.no_character,
+        "ramadan_mode": args.ramadan,
+        "video_provider": args.video,
+        "supabase": args.supabase,
+        "budget": args.budget,
+    }
+    start_resize_pool(args.resize_workers)
+    try:
+        records = run_batch(read_products(args.products), args.out, opts,
+                            concurrency=args.concurrency, resume=not args.no_resume,
+                            max_attempts=args.max_attempts)
+    finally:
+        shutdown_resize_pool()
+    http_client.close_all()
+    return 0 if all(r["status"] == "done" for r in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+🗃️ مخزن الوسائط خارج الجلسة — Mahwous AI Studio v13.1
+الصور والصوت المولدة تُكتب مرة واحدة على القرص (عنوانها بصمة المحتوى) وتحتفظ
+st.session_state بمقابض صغيرة فقط. كل جلسة تحجز "خانات" تشير إلى الكتل (عدّاد مراجع):
+استبدال الخانة يحرر الكتلة القديمة، ولكل جلسة حصة حجم، والجلسات المهجورة تُخلى
+"""
+
+import contextlib
+import hashlib
+import mmap
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+from modules.disk_cache import CACHE_ROOT
+
+# حصة الجلسة الواحدة — تتجاوزها فتُخلى أقدم خاناتها استخداماً
+SESSION_QUOTA = int(os.environ.get("MAHWOUS_SESSION_MEDIA_MB", "200")) * 1024 * 1024
+
+# جلسة بلا نشاط لهذه المدة تُعتبر مهجورة وتُحرر مراجعها
+SESSION_IDLE_TTL = float(os.environ.get("MAHWOUS_SESSION_IDLE_MIN", "120")) * 60
+
+# أقل فاصل بين عمليتي تنظيف الجلسات المهجورة
+SWEEP_INTERVAL = 60.0
+
+
+class BlobHandle:
+    """مقبض صغير يُحفظ في الجلسة بدل البايتات — القراءة من القرص عند الحاجة"""
+
+    __slots__ = ("key", "size", "mime")
+
+    def __init__(self, key: str, size: int, mime: str = "image/jpeg"):
+        self.key = key
+        self.size = size
+        self.mime = mime
+
+    @property
+    def path(self) -> str:
+        """مسار الملف — st.image / st.audio يقرآنه مباشرةً"""
+        return BLOBS.path(self.key)
+
+    @property
+    def alive(self) -> bool:
+        """الكتلة ما زالت في المخزن (لم تُخلَ بالحصة أو بانتهاء الجلسة)"""
+        return BLOBS.has(self.key)
+
+    def read(self) -> bytes:
+        return BLOBS.read(self.key)
+
+    def __repr__(self) -> str:
+        return f"BlobHandle({self.key[:12]}…, {self.size // 1024} KB)"
+
+
+class BlobStore:
+    """
+    الفهرس في الذاكرة (الجلسات لا تنجو من إعادة التشغيل) والكتل في مجلد خاص
+    بالعملية يُحذف ما تبقى منه عند التشغيل التالي
+    """
+
+    def __init__(self, root: str, session_quota: int = SESSION_QUOTA,
+                 idle_ttl: float = SESSION_IDLE_TTL):
+        self.root = root
+        self.dir = os.path.join(root, str(os.getpid()))
+        self.session_quota = session_quota
+        self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._sizes: dict = {}       # key → الحجم
+        self._refs: dict = {}        # key → عدد الخانات التي تشير إليها
+        self._slots: dict = {}       # session → {slot: [key, آخر استخدام]}
+        self._seen: dict = {}        # session → آخر نشاط
+        self._last_sweep = 0.0
+        self._prepared = False
+
+    # ─── الملفات ──────────────────────────────────────────────────────────────
+    def _prepare(self):
+        """إنشاء مجلد العملية وحذف مجلدات العمليات المنتهية"""
+        if self._prepared:
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        for name in os.listdir(self.root):
+            if name.isdigit() and int(name) != os.getpid() and not _pid_alive(int(name)):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        self._prepared = True
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.dir, key)
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return key in self._sizes
+
+    def read(self, key: str) -> bytes:
+        """قراءة عبر mmap — يرفع KeyError إن أُخليت الكتلة"""
+        with self.view(key) as view:
+            return bytes(view)
+
+    @contextlib.contextmanager
+    def view(self, key: str):
+        """memoryview على الملف دون نسخه إلى الذاكرة (للتجزئة/الكتابة المباشرة)"""
+        try:
+            f = open(self.path(key), "rb")
+        except FileNotFoundError:
+            raise KeyError(key) from None
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    # ─── الخانات والمراجع ────────────────────────────────────────────────────
+    def put(self, session: str, slot: str, data: bytes, mime: str = "image/jpeg") -> BlobHandle:
+        """حفظ البايتات في خانة الجلسة — الخانة السابقة (إن وُجدت) تُحرر"""
+        key = hashlib.sha256(data).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._prepare()
+            if key not in self._sizes:
+                path = self.path(key)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                self._sizes[key] = len(data)
+                self._refs[key] = 0
+            slots = self._slots.setdefault(session, {})
+            old = slots.get(slot)
+            if old is None or old[0] != key:
+                self._refs[key] += 1
+                if old is not None:
+                    self._unref(old[0])
+            slots[slot] = [key, now]
+            self._seen[session] = now
+            self._enforce_quota(session, keep=slot)
+        self.sweep()
+        return BlobHandle(key, len(data), mime)
+
+    def release(self, session: str, prefix: str = ""):
+        """تحرير خانات الجلسة (كلها، أو التي تبدأ بـ prefix)"""
+        with self._lock:
+            slots = self._slots.get(session, {})
+            for slot in [s for s in slots if s.startswith(prefix)]:
+                self._unref(slots.pop(slot)[0])
+            if not slots:
+                self._slots.pop(session, None)
+
+    def touch(self, session: str):
+        """نبضة نشاط الجلسة — تُستدعى في كل تشغيل للصفحة"""
+        with self._lock:
+            self._seen[session] = time.time()
+        self.sweep()
+
+    def _unref(self, key: str):
+        self._refs[key] -= 1
+        if self._refs[key] <= 0:
+            self._refs.pop(key, None)
+            self._sizes.pop(key, None)
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def _enforce_quota(self, session: str, keep: str):
+        slots = self._slots.get(session, {})
+        used = sum(self._sizes[k] for k, _ in slots.values())
+        for slot, (key, _) in sorted(slots.items(), key=lambda item: item[1][1]):
+            if used <= self.session_quota:
+                break
+            if slot == keep:
+                continue
+            used -= self._sizes[key]
+            del slots[slot]
+            self._unref(key)
+
+    def sweep(self):
+        """تحرير مراجع الجلسات المهجورة (مرة كل SWEEP_INTERVAL على الأكثر)"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+            for session, seen in list(self._seen.items()):
+                if now - seen > self.idle_ttl:
+                    for key, _ in self._slots.pop(session, {}).values():
+                        self._unref(key)
+                    del self._seen[session]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._slots),
+                "blobs": len(self._sizes),
+                "mb": round(sum(self._sizes.values()) / 1024 / 1024, 1),
+            }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+BLOBS = BlobStore(os.path.join(CACHE_ROOT, "blobs"))
+
+
+def blob_bytes(value) -> Optional[bytes]:
+    """بايتات مقبض أو بايتات خام — None إن أُخليت الكتلة"""
+    if isinstance(value, BlobHandle):
+        try:
+            return value.read()
+        except KeyError:
+            return None
+    return value
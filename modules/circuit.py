@@ -0,0 +1,136 @@
+"""
+🔌 قاطع الدائرة — Mahwous AI Studio v13.1
+يتذكر فشل كل (مفتاح، مزود، نموذج أو مسار): الفشل الدائم (401/402/403 فوترة وصلاحيات،
+404 نموذج غير موجود) يُحجب لساعات، والضغط العابر (429 / 5xx) يفتح القاطع مؤقتاً
+ثم يسمح بطلب تجريبي واحد (half-open) — فتُتخطى الطلبات المحكوم عليها بالفشل فوراً
+"""
+
+import hashlib
+import threading
+import time
+from typing import Optional
+
+import requests
+
+CLOSED    = "closed"
+OPEN      = "open"
+HALF_OPEN = "half_open"
+
+PERMANENT_STATUS = (401, 402, 403, 404)
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+
+PERMANENT_TTL      = 6 * 3600   # إعادة فحص القدرة بعد ست ساعات (أو عند تغيير المفتاح)
+FAILURE_THRESHOLD  = 3          # إخفاقات عابرة متتالية قبل الفتح
+COOLDOWN_FIRST     = 30.0
+COOLDOWN_MAX       = 600.0
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """الطلب لم يُرسل — القاطع مفتوح لهذا (المفتاح، المزود، النموذج)"""
+
+    def __init__(self, provider: str, model: str, reason: str, retry_in: float):
+        self.provider = provider
+        self.model = model
+        self.reason = reason
+        self.retry_in = retry_in
+        target = f"{provider}/{model}" if model else provider
+        super().__init__(f"⛔ {target} متوقف مؤقتاً ({reason}) — إعادة المحاولة بعد {int(retry_in)} ث")
+
+
+def key_fingerprint(api_key: str) -> str:
+    """بصمة قصيرة للمفتاح — المفتاح نفسه لا يُخزن"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12] if api_key else ""
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self._state: dict = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: tuple) -> dict:
+        return self._state.setdefault(key, {
+            "state": CLOSED, "failures": 0, "opened": 0.0, "cooldown": COOLDOWN_FIRST,
+            "reason": "", "probing": False,
+        })
+
+    def before(self, fingerprint: str, provider: str, model: str) -> bool:
+        """
+        يرفع CircuitOpenError إن كان الطلب محجوباً — ويحجز الطلب التجريبي عند half-open.
+        يُرجع True إن حُجز الطلب التجريبي: على المستدعي إنهاؤه بـ record أو release
+        """
+        key = (fingerprint, provider, model)
+        now = time.time()
+        with self._lock:
+            entry = self._state.get(key)
+            if entry is None or entry["state"] == CLOSED:
+                return False
+            remaining = entry["opened"] + entry["cooldown"] - now
+            if entry["state"] == OPEN and remaining > 0:
+                raise CircuitOpenError(provider, model, entry["reason"], remaining)
+            # انتهت المهلة: طلب تجريبي واحد فقط، والبقية تُحجب حتى تظهر نتيجته
+            if entry["probing"]:
+                raise CircuitOpenError(provider, model, entry["reason"], entry["cooldown"])
+            entry["state"] = HALF_OPEN
+            entry["probing"] = True
+            return True
+
+    def release(self, fingerprint: str, provider: str, model: str):
+        """تحرير الطلب التجريبي دون نتيجة (لم يُرسل) — الطلب التالي يصبح هو التجريبي"""
+        with self._lock:
+            entry = self._state.get((fingerprint, provider, model))
+            if entry is not None:
+                entry["probing"] = False
+
+    def record(self, fingerprint: str, provider: str, model: str,
+               status: Optional[int] = None, error: bool = False):
+        """تسجيل نتيجة طلب: status من الاستجابة، أو error=True لفشل الشبكة"""
+        key = (fingerprint, provider, model)
+        now = time.time()
+        with self._lock:
+            entry = self._entry(key)
+            entry["probing"] = False
+            if status in PERMANENT_STATUS:
+                entry.update(state=OPEN, opened=now, cooldown=PERMANENT_TTL,
+                             reason=f"HTTP {status}", failures=0)
+            elif error or status in TRANSIENT_STATUS:
+                entry["failures"] += 1
+                if entry["state"] == HALF_OPEN:
+                    entry.update(state=OPEN, opened=now,
+                                 cooldown=min(entry["cooldown"] * 2, COOLDOWN_MAX),
+                                 reason=f"HTTP {status}" if status else "network")
+                elif entry["failures"] >= FAILURE_THRESHOLD:
+                    entry.update(state=OPEN, opened=now, cooldown=COOLDOWN_FIRST,
+                                 reason=f"HTTP {status}" if status else "network")
+            else:
+                # نجاح (أو خطأ من جهة الطلب مثل 400) — القدرة متاحة
+                self._state.pop(key, None)
+
+    def state(self, fingerprint: str, provider: str, model: str) -> str:
+        with self._lock:
+            entry = self._state.get((fingerprint, provider, model))
+            if entry is None:
+                return CLOSED
+            if entry["state"] == OPEN and time.time() >= entry["opened"] + entry["cooldown"]:
+                return HALF_OPEN
+            return entry["state"]
+
+    def is_open(self, api_key: str, provider: str, model: str = "") -> bool:
+        """هل سيُحجب الطلب الآن؟ (للموجّه وللواجهة)"""
+        return self.state(key_fingerprint(api_key), provider, model) == OPEN
+
+    def snapshot(self) -> list:
+        """حالة كل القواطع غير المغلقة — للوحة الصحة"""
+        now = time.time()
+        with self._lock:
+            return [
+                {"provider": p, "model": m, "state": e["state"], "reason": e["reason"],
+                 "retry_in": max(0, int(e["opened"] + e["cooldown"] - now))}
+                for (_, p, m), e in self._state.items() if e["state"] != CLOSED
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._state.clear()
+
+
+BREAKER = CircuitBreaker()
@@ -0,0 +1,127 @@
+"""
+⏱️ المهل الكلية — Mahwous AI Studio v13.1
+ميزانية زمنية واحدة لكل استدعاء من الواجهة أو الدفعات تنتقل عبر سلسلة البدائل كاملة:
+كل طلب HTTP يأخذ مهلة لا تتجاوز المتبقي، وتفشل السلسلة فوراً عند نفاده
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import time
+from typing import Optional, Union
+
+import requests
+
+# ميزانيات الواجهة (ثوانٍ) — ضيقة لأن المستخدم ينتظر أمام الشاشة
+UI_BUDGETS = {
+    "image":    90.0,
+    "text":     60.0,
+    "analysis": 45.0,
+}
+
+# ميزانية الدفعات لكل منتج — سخية: لا أحد ينتظر، والأهم أن تكتمل المهمة
+BATCH_BUDGET = 30 * 60.0
+
+# أقل مهلة قراءة تُعطى لطلب — تحت ذلك لا فائدة من الإرسال
+MIN_ATTEMPT_TIMEOUT = 2.0
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """نفدت الميزانية الزمنية قبل إرسال الطلب"""
+
+
+class Deadline:
+    """موعد نهائي مطلق (ساعة monotonic)"""
+
+    __slots__ = ("at",)
+
+    def __init__(self, seconds: float):
+        self.at = time.monotonic() + seconds
+
+    @classmethod
+    def coerce(cls, value: Union["Deadline", float, None]) -> Optional["Deadline"]:
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(float(value))
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() < MIN_ATTEMPT_TIMEOUT
+
+    def clamp(self, timeout: float) -> float:
+        """مهلة طلب واحد: الافتراضية أو المتبقي أيهما أقل — يرفع DeadlineExceeded إن نفد"""
+        if self.expired():
+            raise DeadlineExceeded("⏱️ انتهت المهلة الكلية قبل اكتمال العملية")
+        return min(timeout, self.remaining())
+
+
+_ACTIVE_DEADLINE: contextvars.ContextVar = contextvars.ContextVar(
+    "mahwous_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _ACTIVE_DEADLINE.get()
+
+
+@contextlib.contextmanager
+def use_deadline(deadline: Union[Deadline, float, None]):
+    """
+    تفعيل موعد نهائي داخل الكتلة (وما تطلقه من مهام/خيوط عبر السياق).
+    الموعد الأقرب يفوز — استدعاء داخلي لا يستطيع تمديد ميزانية المستدعي
+    """
+    deadline = Deadline.coerce(deadline)
+    active = _ACTIVE_DEADLINE.get()
+    if deadline is None or (active is not None and active.at <= deadline.at):
+        deadline = active
+    token = _ACTIVE_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _ACTIVE_DEADLINE.reset(token)
+
+
+def entry_point(kind: str):
+    """
+    مُزخرف لنقاط دخول المحرك: يضيف معامل deadline (ثوانٍ أو Deadline).
+    دون معامل ودون موعد نشط تُطبق ميزانية الواجهة لهذا النوع
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            return _stream_wrapper(fn, kind)
+
+        @functools.wraps(fn)
+        def wrapper(*args, deadline: Union[Deadline, float, None] = None, **kwargs):
+            if deadline is None and current_deadline() is None:
+                deadline = UI_BUDGETS[kind]
+            with use_deadline(deadline):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _stream_wrapper(fn, kind: str):
+    """
+    للمولّدات (البث): الموعد يُثبَّت عند الاستدعاء ويُفعَّل حول كل خطوة فقط —
+    فلا يتسرب السياق إلى المستهلك بين الأجزاء
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, deadline: Union[Deadline, float, None] = None, **kwargs):
+        if deadline is None and current_deadline() is None:
+            deadline = UI_BUDGETS[kind]
+        deadline = Deadline.coerce(deadline)
+        it = fn(*args, **kwargs)
+        try:
+            while True:
+                with use_deadline(deadline):
+                    try:
+                        item = next(it)
+                    except StopIteration as stop:
+                        return stop.value
+                yield item
+        finally:
+            it.close()
+    return wrapper
@@ -0,0 +1,155 @@
+"""
+💾 كاش القرص المُعنوَن بالمحتوى — Mahwous AI Studio v13.1
+ملفات على القرص مع فهرس SQLite: حد أقصى للحجم (إخلاء LRU) + مدة صلاحية (TTL)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+CACHE_ROOT = os.environ.get(
+    "MAHWOUS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+
+
+def content_key(*parts) -> str:
+    """مفتاح sha256 ثابت من أجزاء قابلة للتسلسل JSON"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """كاش بايتات على القرص — آمن بين الخيوط والعمليات (فهرس SQLite بوضع WAL)"""
+
+    def __init__(self, namespace: str, max_bytes: int, ttl: float):
+        self.dir = os.path.join(CACHE_ROOT, namespace)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # ─── الفهرس ───────────────────────────────────────────────────────────────
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.dir, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.dir, "index.db"),
+                                   timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, size INTEGER, created REAL, accessed REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON entries(accessed)")
+            self._conn = conn
+        return self._conn
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dir, key[:2], key)
+
+    # ─── القراءة والكتابة ────────────────────────────────────────────────────
+    def get(self, key: str, ttl: Optional[float] = None) -> Optional[bytes]:
+        """ttl = صلاحية أقصر لهذه القراءة فقط (الملف يبقى حتى صلاحية الكاش العامة)"""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT created FROM entries WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            age = now - row[0]
+            if age > self.ttl:
+                self._drop(key)
+                db.commit()
+                return None
+            if ttl is not None and age > ttl:
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                self._drop(key)
+                db.commit()
+                return None
+            db.execute("UPDATE entries SET accessed=? WHERE key=?", (now, key))
+            db.commit()
+            return data
+
+    def put(self, key: str, data: bytes):
+        if not data:
+            return
+        path = self._path(key)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            db.execute(
+                "INSERT OR REPLACE INTO entries(key, size, created, accessed) VALUES (?,?,?,?)",
+                (key, len(data), now, now),
+            )
+            self._evict(db, now)
+            db.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._drop(key)
+            self._db().commit()
+
+    # ─── الإخلاء ──────────────────────────────────────────────────────────────
+    def _drop(self, key: str):
+        self._db().execute("DELETE FROM entries WHERE key=?", (key,))
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        # 1) المنتهية الصلاحية
+        for (key,) in db.execute("SELECT key FROM entries WHERE created < ?",
+                                 (now - self.ttl,)).fetchall():
+            self._drop(key)
+        # 2) الأقدم استخداماً حتى نعود تحت الحد
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self._drop(key)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# كاش الصور المولدة
+# ══════════════════════════════════════════════════════════════════════════════
+
+IMAGE_CACHE = DiskCache(
+    "images",
+    max_bytes=int(os.environ.get("MAHWOUS_IMAGE_CACHE_MB", "2048")) * 1024 * 1024,
+    ttl=float(os.environ.get("MAHWOUS_IMAGE_CACHE_TTL_H", "168")) * 3600,
+)
+
+
+def image_cache_key(prompt: str, aspect: str, provider: str, model: str) -> str:
+    """المفتاح = البرومت النهائي + النسبة + المزود + النموذج"""
+    return content_key("image", prompt, aspect, provider, model)
+
+
+def cached_image(prompt: str, aspect: str, provider: str, models: list) -> Optional[bytes]:
+    """البحث عن صورة محفوظة لأي نموذج من سلسلة المزود بالترتيب"""
+    for model in models:
+        data = IMAGE_CACHE.get(image_cache_key(prompt, aspect, provider, model))
+        if data:
+            return data
+    return None
+
+
+def store_image(prompt: str, aspect: str, provider: str, model: str, data: bytes):
+    IMAGE_CACHE.put(image_cache_key(prompt, aspect, provider, model), data)
@@ -0,0 +1,114 @@
+"""
+📦 تصدير ZIP — Mahwous AI Studio v13.1
+الأرشيف يُبنى عند طلب التحميل فقط ويُحفظ على القرص حسب بصمة محتواه: إعادة تشغيل
+الصفحة لا تعيد الترميز، وتغيير صورة واحدة لا يعيد إلا مقاسها (fit_jpeg مُخزَّن).
+صور JPEG تُخزَّن دون ضغط (ZIP_STORED) — ضغطها مرة أخرى لا يوفر شيئاً
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime
+from typing import Optional
+
+from modules.blob_store import BlobHandle, blob_bytes
+from modules.disk_cache import CACHE_ROOT, content_key
+from modules.imaging import fit_jpeg
+
+EXPORT_DIR = os.path.join(CACHE_ROOT, "exports")
+
+# الأرشيفات الأقدم من هذا تُحذف عند بناء أرشيف جديد
+EXPORT_TTL = 24 * 3600
+
+_lock = threading.Lock()
+
+
+def _image_id(data: dict) -> Optional[str]:
+    """بصمة صورة النتيجة — مفتاح المقبض مباشرةً، أو sha256 للبايتات الخام"""
+    blob = data.get("blob")
+    if isinstance(blob, BlobHandle):
+        return blob.key
+    if data.get("bytes"):
+        return hashlib.sha256(data["bytes"]).hexdigest()
+    return None
+
+
+def exportable_images(images: dict) -> dict:
+    """الصور التي يمكن تصديرها الآن — المقابض التي أُخليت من مخزن الوسائط تُستبعد"""
+    kept = {}
+    for key, data in images.items():
+        blob = data.get("blob")
+        if (isinstance(blob, BlobHandle) and blob.alive) or data.get("bytes"):
+            kept[key] = data
+    return kept
+
+
+def zip_signature(images: dict, info: dict) -> str:
+    """
+    بصمة الأرشيف: الصور القابلة للتصدير (بصمة + مقاس) ووسوم العطر — دون قراءة الصور.
+    مفتاح الكتلة بصمة محتواها، فصورة أُخليت لا تدخل البصمة وإلا طابقت أرشيفاً ناقصاً
+    """
+    entries = [(key, _image_id(data), data.get("w"), data.get("h"))
+               for key, data in exportable_images(images).items()]
+    return content_key("zip", entries, info.get("brand"), info.get("product_name"))
+
+
+def _zip_path(signature: str) -> str:
+    return os.path.join(EXPORT_DIR, f"{signature}.zip")
+
+
+def cached_zip(images: dict, info: dict) -> Optional[str]:
+    """مسار أرشيف جاهز لنفس المحتوى — None إن لم يُبنَ بعد"""
+    path = _zip_path(zip_signature(images, info))
+    return path if os.path.exists(path) else None
+
+
+def build_zip(images: dict, info: dict) -> str:
+    """
+    بناء الأرشيف في ملف مؤقت ثم نقله لمكانه — يُرجع المسار (الموجود إن سبق بناؤه).
+    الاسم النهائي بصمة ما كُتب فعلاً: صورة أُخليت أثناء البناء لا تُنتج أرشيفاً ناقصاً
+    باسم المجموعة الكاملة
+    """
+    expected = exportable_images(images)
+    path = _zip_path(zip_signature(expected, info))
+    with _lock:
+        if os.path.exists(path):
+            return path
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        _prune()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        written = {}
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+            for key, data in expected.items():
+                img = blob_bytes(data.get("blob")) or data.get("bytes")
+                if img:
+                    fname = f"{key}_{data['w']}x{data['h']}.jpg"
+                    zf.writestr(fname, fit_jpeg(img, data["w"], data["h"]))
+                    written[key] = data
+            meta = {
+                "brand": info.get("brand"),
+                "product_name": info.get("product_name"),
+                "generated_at": datetime.now().isoformat(),
+                "platforms": list(written.keys()),
+                "source": "Mahwous AI Studio v13.0"
+            }
+            zf.writestr("info.json", json.dumps(meta, ensure_ascii=False, indent=2),
+                        compress_type=zipfile.ZIP_DEFLATED)
+        if len(written) != len(expected):
+            path = _zip_path(zip_signature(written, info))
+        os.replace(tmp, path)
+    return path
+
+
+def _prune():
+    cutoff = time.time() - EXPORT_TTL
+    for name in os.listdir(EXPORT_DIR):
+        full = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(full) < cutoff:
+                os.remove(full)
+        except OSError:
+            pass
@@ -9,12 +9,17 @@
 
 import base64
 import io
-import json
 import time
 import requests
-import streamlit as st
 from typing import Optional
 
+from modules import http_client
+from modules.deadline import entry_point
+from modules.json_repair import extract_json
+from modules.llm_cache import cacheable, cached_completion, store_completion
+from modules.disk_cache import cached_image, store_image
+from modules.router import ROUTER, request_class
+
 # ══════════════════════════════════════════════════════════════════════════════
 # BASE URL
 # ══════════════════════════════════════════════════════════════════════════════
@@ -28,6 +33,9 @@ MODEL_IMAGE_2   = "gemini-2.0-flash-exp-image-generation"   # مجاني كـ fa
 MODEL_VIDEO     = "veo-3.1-generate-preview"
 MODEL_TTS       = "gemini-2.5-flash-preview-tts"
 
+# حرارة توليد النصوص — جزء من مفتاح كاش الردود
+TEXT_TEMPERATURE = 0.85
+
 # أصوات TTS المتاحة (تدعم العربية)
 TTS_VOICES = {
     "Kore":    "🎙️ كور — نبرة هادئة واحترافية",
@@ -44,19 +52,9 @@ TTS_VOICES = {
 # مفتاح API
 # ══════════════════════════════════════════════════════════════════════════════
 def _get_key() -> str:
-    """جلب مفتاح Google Gemini من session أو secrets"""
-    for sk in ["gemini_key", "google_key"]:
-        v = st.session_state.get(sk, "")
-        if v:
-            return v
-    try:
-        for k in ["GEMINI_API_KEY", "GOOGLE_KEY", "GOOGLE_API_KEY"]:
-            v = st.secrets.get(k, "")
-            if v:
-                return v
-    except Exception:
-        pass
-    return ""
+    """جلب مفتاح Google Gemini من session أو secrets (أو البيئة خارج Streamlit)"""
+    from modules.ai_engine import _get_secrets
+    return _get_secrets().get("gemini", "")
 
 
 def _check_key() -> str:
@@ -69,35 +67,56 @@ def _check_key() -> str:
 # ══════════════════════════════════════════════════════════════════════════════
 # 1. توليد النصوص
 # ══════════════════════════════════════════════════════════════════════════════
+@entry_point("text")
+@cacheable("text")
 def gemini_text(prompt: str, system: str = "", model: str = MODEL_TEXT) -> str:
     """توليد نص بـ Gemini 2.5 Flash"""
     key = _check_key()
     body = {
         "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.85, "maxOutputTokens": 8192},
+        "generationConfig": {"temperature": TEXT_TEMPERATURE, "maxOutputTokens": 8192},
     }
     if system:
         body["systemInstruction"] = {"parts": [{"text": system}]}
 
-    models = [model, MODEL_TEXT_FAST, "gemini-2.0-flash-lite"]
-    for m in models:
+    # النموذج الممرَّر صراحةً يُثبَّت أولاً، وإلا يرتّب الموجّه حسب الأداء الحالي
+    klass = request_class("text", prompt=prompt, max_tokens=8192)
+    models = list(dict.fromkeys([model, MODEL_TEXT, MODEL_TEXT_FAST, "gemini-2.0-flash-lite"]))
+    order = ROUTER.order(klass, [f"gemini/{m}" for m in models],
+                         pin=f"gemini/{model}" if model != MODEL_TEXT else "")
+    for backend in order:
+        cached = cached_completion(prompt, backend, TEXT_TEMPERATURE, 8192, system)
+        if cached:
+            return cached
+    last_error = None
+    for backend in order:
+        m = backend.split("/", 1)[1]
+        started = time.monotonic()
         try:
-            r = requests.post(
+            r = http_client.post(
                 f"{GEMINI_BASE}/models/{m}:generateContent?key={key}",
                 json=body, timeout=60
             )
             if r.status_code == 404:
-                continue
-            r.raise_for_status()
-            data = r.json()
-            if "error" in data:
-                continue
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception:
-            continue
-    raise ValueError("فشل توليد النص — تأكد من صحة المفتاح")
+                last_error = f"404 النموذج {m} غير متاح"
+            else:
+                r.raise_for_status()
+                data = r.json()
+                if "error" in data:
+                    last_error = data["error"].get("message", data["error"])
+                else:
+                    text = data["candidates"][0]["content"]["parts"][0]["text"]
+                    ROUTER.record(klass, backend, time.monotonic() - started, True)
+                    store_completion(text, prompt, backend, TEXT_TEMPERATURE, 8192, system)
+                    return text
+        except Exception as e:
+            last_error = e
+        ROUTER.record(klass, backend, time.monotonic() - started, False)
+    raise ValueError(f"فشل توليد النص — تأكد من صحة المفتاح ({str(last_error)[:200]})")
 
 
+@entry_point("text")
+@cacheable("text")
 def gemini_json(prompt: str, system: str = "") -> dict:
     """توليد JSON منظّم بـ Gemini"""
     key = _check_key()
@@ -105,45 +124,63 @@ def gemini_json(prompt: str, system: str = "") -> dict:
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {
             "responseMimeType": "application/json",
-            "temperature": 0.85
+            "temperature": TEXT_TEMPERATURE
         },
     }
     if system:
         body["systemInstruction"] = {"parts": [{"text": system}]}
 
-    for m in [MODEL_TEXT, MODEL_TEXT_FAST]:
+    models = [MODEL_TEXT, MODEL_TEXT_FAST]
+    for m in models:
+        cached = cached_completion(prompt, f"gemini/{m}", TEXT_TEMPERATURE, 0, system, "json")
+        if cached:
+            # يُحفظ الرد بعد نجاح استخراجه فقط
+            parsed = extract_json(cached)
+            return parsed[0] if isinstance(parsed, list) else parsed
+
+    last_error = None
+    for m in models:
         try:
-            r = requests.post(
+            r = http_client.post(
                 f"{GEMINI_BASE}/models/{m}:generateContent?key={key}",
                 json=body, timeout=60
             )
             if r.status_code == 404:
+                last_error = f"404 النموذج {m} غير متاح"
                 continue
             r.raise_for_status()
             data = r.json()
             if "error" in data:
+                last_error = data["error"].get("message", data["error"])
                 continue
             raw = data["candidates"][0]["content"]["parts"][0]["text"]
-            parsed = json.loads(raw.strip())
+            parsed = extract_json(raw)
+            store_completion(raw, prompt, f"gemini/{m}", TEXT_TEMPERATURE, 0, system, "json")
             return parsed[0] if isinstance(parsed, list) else parsed
-        except Exception:
+        except Exception as e:
+            last_error = e
             continue
-    raise ValueError("فشل توليد JSON")
+    raise ValueError(f"فشل توليد JSON ({str(last_error)[:200]})")
 
 
 # ══════════════════════════════════════════════════════════════════════════════
 # 2. توليد الصور
 # ══════════════════════════════════════════════════════════════════════════════
+@entry_point("image")
 def gemini_image(prompt: str, aspect: str = "1:1") -> bytes:
     """
     توليد صورة — يجرب Imagen 4.0 أولاً، ثم Gemini 2.0 Flash كـ fallback
     """
     key = _check_key()
+    imagen_models = ["imagen-4.0-generate-001", "imagen-3.0-generate-002"]
+    cached = cached_image(prompt, aspect, "gemini", imagen_models + [MODEL_IMAGE_2])
+    if cached:
+        return cached
 
     # ── المحاولة 1: Imagen 4.0 ──────────────────────────────────────────────
-    for img_model in ["imagen-4.0-generate-001", "imagen-3.0-generate-002"]:
+    for img_model in imagen_models:
         try:
-            r = requests.post(
+            r = http_client.post(
                 f"{GEMINI_BASE}/models/{img_model}:predict?key={key}",
                 json={
                     "instances": [{"prompt": prompt}],
@@ -164,13 +201,15 @@ def gemini_image(prompt: str, aspect: str = "1:1") -> bytes:
                 continue
             preds = data.get("predictions", [])
             if preds and preds[0].get("bytesBase64Encoded"):
-                return base64.b64decode(preds[0]["bytesBase64Encoded"])
+                img = base64.b64decode(preds[0]["bytesBase64Encoded"])
+                store_image(prompt, aspect, "gemini", img_model, img)
+                return img
         except Exception:
             continue
 
     # ── المحاولة 2: Gemini 2.0 Flash image generation (مجاني) ──────────────
     try:
-        r = requests.post(
+        r = http_client.post(
             f"{GEMINI_BASE}/models/{MODEL_IMAGE_2}:generateContent?key={key}",
             json={
                 "contents": [{"parts": [{"text": f"Generate this image: {prompt}"}]}],
@@ -182,7 +221,9 @@ def gemini_image(prompt: str, aspect: str = "1:1") -> bytes:
         data = r.json()
         for part in data.get("candidates", [{}])[0].get("content", {}).get("parts", []):
             if part.get("inlineData", {}).get("mimeType", "").startswith("image"):
-                return base64.b64decode(part["inlineData"]["data"])
+                img = base64.b64decode(part["inlineData"]["data"])
+                store_image(prompt, aspect, "gemini", MODEL_IMAGE_2, img)
+                return img
     except Exception:
         pass
 
@@ -220,7 +261,7 @@ def gemini_tts(text: str, voice: str = "Charon", language: str = "ar") -> bytes:
 
     for tts_model in ["gemini-2.5-flash-preview-tts", "gemini-2.0-flash-preview-tts"]:
         try:
-            r = requests.post(
+            r = http_client.post(
                 f"{GEMINI_BASE}/models/{tts_model}:generateContent?key={key}",
                 json=body, timeout=60
             )
@@ -293,7 +334,7 @@ def gemini_video_start(prompt: str, aspect: str = "9:16",
     }
 
     try:
-        r = requests.post(
+        r = http_client.post(
             f"{GEMINI_BASE}/models/{MODEL_VIDEO}:predictLongRunning?key={key}",
             json=body, timeout=30
         )
@@ -318,13 +359,13 @@ def gemini_video_start(prompt: str, aspect: str = "9:16",
         raise ValueError(f"❌ HTTP {e.response.status_code}: {e.response.text[:200]}")
 
 
-def gemini_video_status(operation_name: str) -> dict:
+def gemini_video_status(operation_name: str, api_key: str = "") -> dict:
     """
     فحص حالة عملية توليد الفيديو
     """
-    key = _check_key()
     try:
-        r = requests.get(
+        key = api_key or _check_key()
+        r = http_client.get(
             f"{GEMINI_BASE}/{operation_name}?key={key}",
             timeout=20
         )
@@ -360,7 +401,7 @@ def gemini_video_download(video_uri: str) -> bytes:
         url = f"{video_uri}{sep}key={key}&alt=media"
     else:
         url = video_uri
-    r = requests.get(url, timeout=120, stream=True)
+    r = http_client.get(url, timeout=120, stream=True)
     r.raise_for_status()
     return r.content
 
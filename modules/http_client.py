@@ -0,0 +1,394 @@
+"""
+🔌 طبقة HTTP المشتركة — Mahwous AI Studio v13.1
+جلسة requests مُجمّعة (keep-alive) لكل مزود مع حجم pool ومهلة اتصال خاصة بكل مضيف،
+وسياسة إعادة محاولة موحّدة (تراجع أُسّي مع jitter كامل + احترام Retry-After + مهلة كلية)
+"""
+
+import email.utils
+import random
+import re
+import threading
+import time
+from typing import Iterator, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+from modules.circuit import BREAKER, CircuitOpenError, key_fingerprint
+from modules.deadline import DeadlineExceeded, current_deadline
+from modules.rate_limit import LIMITER
+
+# ══════════════════════════════════════════════════════════════════════════════
+# إعدادات المزودين
+# ══════════════════════════════════════════════════════════════════════════════
+
+# pool  = أقصى عدد اتصالات مفتوحة لكل مضيف داخل جلسة المزود
+# connect / read = مهلة فتح الاتصال / مهلة القراءة الافتراضية (ثوانٍ)
+PROVIDER_POOLS = {
+    "gemini":     {"pool": 16, "connect": 5,  "read": 60},
+    "fal":        {"pool": 16, "connect": 5,  "read": 120},
+    "openrouter": {"pool": 8,  "connect": 5,  "read": 60},
+    "luma":       {"pool": 4,  "connect": 5,  "read": 30},
+    "runway":     {"pool": 4,  "connect": 5,  "read": 30},
+    "imgbb":      {"pool": 4,  "connect": 5,  "read": 30},
+    "elevenlabs": {"pool": 4,  "connect": 5,  "read": 30},
+    "supabase":   {"pool": 4,  "connect": 5,  "read": 15},
+    "default":    {"pool": 4,  "connect": 10, "read": 30},
+}
+
+# ربط المضيف بالمزود — يُستخدم عند عدم تمرير provider صراحةً
+HOST_PROVIDERS = {
+    "generativelanguage.googleapis.com": "gemini",
+    "fal.run":                           "fal",
+    "queue.fal.run":                     "fal",
+    "fal.media":                         "fal",
+    "v3.fal.media":                      "fal",
+    "rest.alpha.fal.ai":                 "fal",
+    "openrouter.ai":                     "openrouter",
+    "api.lumalabs.ai":                   "luma",
+    "api.runwayml.com":                  "runway",
+    "api.imgbb.com":                     "imgbb",
+    "api.elevenlabs.io":                 "elevenlabs",
+}
+
+_sessions: dict = {}
+_lock = threading.Lock()
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# سياسة إعادة المحاولة
+# ══════════════════════════════════════════════════════════════════════════════
+
+# POST قد يكون طلب توليد مدفوعاً — لا نعيده إلا إذا كان الخادم رفضه صراحةً
+RETRY_STATUS_POST = (429, 503)
+RETRY_STATUS_GET  = (429, 500, 502, 503, 504)
+
+
+class RetryPolicy:
+    """
+    تراجع أُسّي مع jitter كامل: الانتظار = عشوائي بين 0 و min(cap, base × 2^المحاولة)
+    Retry-After من الخادم يتقدم على الحساب، وكل الانتظارات محصورة في deadline الكلي
+    """
+
+    def __init__(self, max_attempts: int = 3, base: float = 1.0, cap: float = 30.0,
+                 deadline: float = 90.0, max_retry_after: float = 60.0):
+        self.max_attempts = max_attempts
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+        self.max_retry_after = max_retry_after
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+    def delay(self, attempt: int, retry_after: Optional[float], remaining: float) -> Optional[float]:
+        """مدة الانتظار قبل المحاولة التالية — None تعني التوقف وإرجاع آخر نتيجة"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            wait = retry_after
+        else:
+            wait = self.backoff(attempt)
+        return wait if wait < remaining else None
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+RETRY_POLICIES = {
+    "gemini":     RetryPolicy(max_attempts=4, base=1.0, cap=20, deadline=90),
+    "fal":        RetryPolicy(max_attempts=3, base=2.0, cap=30, deadline=180),
+    "openrouter": RetryPolicy(max_attempts=3, base=1.0, cap=15, deadline=60),
+    "luma":       RetryPolicy(max_attempts=3, base=2.0, cap=30, deadline=60),
+    "runway":     RetryPolicy(max_attempts=3, base=2.0, cap=30, deadline=60),
+    "imgbb":      RetryPolicy(max_attempts=3, base=1.0, cap=10, deadline=45),
+    "elevenlabs": RetryPolicy(max_attempts=3, base=1.0, cap=15, deadline=60),
+    "supabase":   RetryPolicy(max_attempts=3, base=0.5, cap=5,  deadline=20),
+    "default":    RetryPolicy(max_attempts=2, base=1.0, cap=10, deadline=30),
+}
+
+
+def retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    """قراءة Retry-After (ثوانٍ أو تاريخ HTTP)"""
+    value = resp.headers.get("Retry-After", "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _never_sent(exc: requests.exceptions.ConnectionError) -> bool:
+    """فشل قبل إرسال الطلب: مهلة الاتصال أو تعذر فتح الاتصال (DNS/رفض المنفذ)"""
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def safe_to_retry(method: str, exc: Exception) -> bool:
+    """
+    هل يُعاد الطلب بعد استثناء شبكة؟ GET دائماً عند فشل الاتصال، أما POST فقط إن لم
+    يُرسل أصلاً: "Connection aborted" بعد إرسال الجسم قد يعني توليداً مدفوعاً قيد التنفيذ
+    """
+    if not isinstance(exc, requests.exceptions.ConnectionError):
+        return False
+    return method.upper() == "GET" or _never_sent(exc)
+
+
+def configure_provider(provider: str, pool: Optional[int] = None,
+                       connect: Optional[float] = None, read: Optional[float] = None):
+    """تعديل إعدادات pool/المهلة لمزود — يُعيد بناء جلسته عند الطلب التالي"""
+    with _lock:
+        cfg = dict(PROVIDER_POOLS.get(provider, PROVIDER_POOLS["default"]))
+        if pool is not None:
+            cfg["pool"] = pool
+        if connect is not None:
+            cfg["connect"] = connect
+        if read is not None:
+            cfg["read"] = read
+        PROVIDER_POOLS[provider] = cfg
+        old = _sessions.pop(provider, None)
+    if old is not None:
+        old.close()
+
+
+def provider_for_url(url: str) -> str:
+    """استنتاج المزود من مضيف الرابط"""
+    host = (urlsplit(url).hostname or "").lower()
+    if host in HOST_PROVIDERS:
+        return HOST_PROVIDERS[host]
+    # نطاقات فرعية (مثل xyz.supabase.co أو *.fal.media)
+    if host.endswith(".supabase.co"):
+        return "supabase"
+    if host.endswith(".fal.media") or host.endswith(".fal.run") or host.endswith(".fal.ai"):
+        return "fal"
+    return "default"
+
+
+def _build_session(provider: str) -> requests.Session:
+    cfg = PROVIDER_POOLS.get(provider, PROVIDER_POOLS["default"])
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=cfg["pool"],
+        # إعادة محاولة واحدة عند فشل فتح الاتصال فقط (اتصال keep-alive مُغلق من الخادم)
+        max_retries=Retry(total=1, connect=1, read=0, status=0, redirect=0),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(provider: str = "default") -> requests.Session:
+    """جلب جلسة المزود المشتركة (تُنشأ مرة واحدة لكل عملية)"""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _build_session(provider)
+                _sessions[provider] = session
+    return session
+
+
+def _timeout(provider: str, timeout, deadline=None) -> tuple:
+    """
+    تحويل المهلة إلى (اتصال، قراءة) — الرقم المفرد يُعامل كمهلة قراءة.
+    مع موعد نهائي نشط لا تتجاوز أيٌّ منهما المتبقي (DeadlineExceeded إن نفد)
+    """
+    cfg = PROVIDER_POOLS.get(provider, PROVIDER_POOLS["default"])
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect, read = cfg["connect"], timeout if timeout is not None else cfg["read"]
+    if deadline is not None:
+        read = deadline.clamp(read)
+        connect = min(connect, read)
+    return (connect, read)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# تحديد المعدل
+# ══════════════════════════════════════════════════════════════════════════════
+
+_GEMINI_MODEL_RE = re.compile(r"/models/([^:/?]+)")
+
+
+def _text_chars(obj) -> int:
+    """طول النصوص في جسم الطلب (دون بيانات الصور المُرمّزة)"""
+    if isinstance(obj, dict):
+        return sum(len(v) if k in ("text", "content", "prompt") and isinstance(v, str)
+                   else _text_chars(v) for k, v in obj.items())
+    if isinstance(obj, list):
+        return sum(_text_chars(v) for v in obj)
+    return 0
+
+
+def rate_target(provider: str, url: str, body) -> tuple:
+    """(النموذج، تقدير الرموز) للطلب — لاختيار دلو المحدِّد"""
+    model = ""
+    if provider == "gemini":
+        m = _GEMINI_MODEL_RE.search(url)
+        model = m.group(1) if m else ""
+    elif provider == "fal":
+        model = urlsplit(url).path.split("/requests/")[0].strip("/")
+    elif provider == "openrouter" and isinstance(body, dict):
+        model = body.get("model", "")
+    tokens = 0
+    if provider in ("gemini", "openrouter") and isinstance(body, dict):
+        out = (body.get("generationConfig") or {}).get("maxOutputTokens") or body.get("max_tokens") or 0
+        tokens = _text_chars(body) // 4 + int(out)
+    return model, tokens
+
+
+def circuit_target(url: str, model: str) -> str:
+    """
+    هدف القاطع: النموذج إن عُرف، وإلا مسار الطلب — فشل دائم لصوت/جدول/webhook بعينه
+    (404 لـ voice_id خاطئ مثلاً) لا يحجب بقية طلبات المزود
+    """
+    return model or urlsplit(url).path.strip("/")
+
+
+def _request_key(url: str, headers: Optional[dict]) -> str:
+    """المفتاح المستخدم في الطلب (?key= لـ Gemini أو ترويسة Authorization)"""
+    key = parse_qs(urlsplit(url).query).get("key", [""])[0]
+    if not key and headers:
+        key = headers.get("Authorization", "") or headers.get("xi-api-key", "")
+    return key
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# واجهة الطلبات
+# ══════════════════════════════════════════════════════════════════════════════
+
+def request(method: str, url: str, provider: Optional[str] = None,
+            timeout=None, retry: Optional[RetryPolicy] = None, **kwargs) -> requests.Response:
+    """
+    إرسال طلب عبر جلسة المزود المُجمّعة — بعد حجز حصته من محدِّد المعدل —
+    مع سياسة إعادة المحاولة الخاصة به.
+    يُرجع آخر استجابة كما هي عند نفاد المحاولات — معالجة الحالة تبقى للمستدعي.
+    يرفع CircuitOpenError فوراً دون إرسال إن كان (المفتاح، المزود، النموذج) محجوباً،
+    و DeadlineExceeded إن نفد الموعد النهائي النشط (modules.deadline) قبل الإرسال.
+    """
+    provider = provider or provider_for_url(url)
+    policy = retry or RETRY_POLICIES.get(provider, RETRY_POLICIES["default"])
+    session = get_session(provider)
+    retry_status = RETRY_STATUS_GET if method.upper() == "GET" else RETRY_STATUS_POST
+    model, tokens = rate_target(provider, url, kwargs.get("json"))
+    # القاطع يحمي طلبات التوليد فقط — فحوص الحالة (GET) لمعرّف بعينه لا تعبّر عن قدرة النموذج
+    guarded = method.upper() != "GET"
+    fingerprint = key_fingerprint(_request_key(url, kwargs.get("headers"))) if guarded else ""
+    target = circuit_target(url, model)
+    deadline = current_deadline()
+    start = time.monotonic()
+
+    def remaining() -> float:
+        left = policy.deadline - (time.monotonic() - start)
+        return min(left, deadline.remaining()) if deadline is not None else left
+
+    attempt = 0
+    last = None
+    while True:
+        # قبل القاطع: نفاد الميزانية ليس فشلاً للمزود ولا يحجز الطلب التجريبي
+        try:
+            attempt_timeout = _timeout(provider, timeout, deadline)
+        except DeadlineExceeded:
+            if last is None:
+                raise
+            return last
+        probe = False
+        if guarded:
+            try:
+                probe = BREAKER.before(fingerprint, provider, target)
+            except CircuitOpenError:
+                if last is None:
+                    raise
+                return last  # فُتح القاطع أثناء إعادة المحاولة — نكتفي بآخر استجابة
+        try:
+            LIMITER.acquire(provider, model, tokens, max_wait=max(0.0, remaining()))
+            try:
+                resp = session.request(method, url, timeout=attempt_timeout, **kwargs)
+            except requests.exceptions.RequestException as e:
+                if guarded:
+                    BREAKER.record(fingerprint, provider, target, error=True)
+                    probe = False
+                if not safe_to_retry(method, e):
+                    raise
+                wait = policy.delay(attempt, None, remaining())
+                if wait is None:
+                    raise
+            else:
+                if guarded:
+                    BREAKER.record(fingerprint, provider, target, status=resp.status_code)
+                    probe = False
+                if resp.status_code not in retry_status:
+                    return resp
+                wait = policy.delay(attempt, retry_after_seconds(resp), remaining())
+                if wait is None:
+                    return resp
+                resp.close()
+                last = resp
+        finally:
+            # الطلب التجريبي لم يُرسل (نفاد المهلة عند المحدِّد أو استثناء آخر) — لا يبقى محجوزاً
+            if probe:
+                BREAKER.release(fingerprint, provider, target)
+        time.sleep(wait)
+        attempt += 1
+
+
+def iter_sse(resp: requests.Response) -> Iterator[str]:
+    """
+    قراءة بث Server-Sent Events من استجابة stream=True — يُرجع حقل data لكل حدث.
+    يتوقف عند نفاد الموعد النهائي النشط، ويُغلق الاستجابة في كل الأحوال
+    """
+    resp.encoding = "utf-8"
+    data: list = []
+    try:
+        for line in resp.iter_lines(decode_unicode=True):
+            deadline = current_deadline()
+            if deadline is not None and deadline.remaining() <= 0:
+                raise DeadlineExceeded("⏱️ انتهت المهلة الكلية أثناء البث")
+            if line is None:
+                continue
+            if not line:
+                if data:
+                    yield "\n".join(data)
+                    data = []
+            elif line.startswith("data:"):
+                data.append(line[5:].lstrip(" "))
+            # أسطر ":" تعليقات keep-alive — تُهمل
+        if data:
+            yield "\n".join(data)
+    finally:
+        resp.close()
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+
+def close_all():
+    """إغلاق جميع الجلسات (عند إيقاف العامل أو في نهاية دفعة)"""
+    with _lock:
+        sessions = list(_sessions.values())
+        _sessions.clear()
+    for s in sessions:
+        s.close()
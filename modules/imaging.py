@@ -0,0 +1,149 @@
+"""
+🖼️ أدوات معالجة الصور — Mahwous AI Studio v13.1
+تغيير المقاس وإعادة الترميز لمقاسات المنصات + البصمة الإدراكية (dHash)
+فك ترميز JPEG يتم مرة واحدة لكل صورة وبدقة مصغّرة (draft) تكفي أكبر مقاس مطلوب،
+ومجمّع عمليات اختياري يوزع العمل على الأنوية في الدفعات الكبيرة
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from typing import Iterable
+
+from PIL import Image
+
+from modules.disk_cache import DiskCache, content_key
+
+# نتائج تغيير المقاس حسب (بصمة المحتوى، العرض، الارتفاع) — التصدير المتكرر لا يعيد الترميز
+RESIZE_CACHE = DiskCache(
+    "resized",
+    max_bytes=int(os.environ.get("MAHWOUS_RESIZE_CACHE_MB", "512")) * 1024 * 1024,
+    ttl=7 * 86400,
+)
+
+
+# عدد عمليات مجمّع تغيير المقاس في الدفعات (0 = داخل العملية نفسها) — نواة تبقى
+# للعملية الأم (الشبكة والمجدول)
+RESIZE_WORKERS = int(os.environ.get("MAHWOUS_RESIZE_WORKERS", str(max((os.cpu_count() or 1) - 1, 0))))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# تغيير المقاس
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _encode_jpeg(img: Image.Image, size: tuple) -> bytes:
+    buf = io.BytesIO()
+    img.resize(size, Image.LANCZOS).save(buf, format="JPEG", quality=95, optimize=True)
+    return buf.getvalue()
+
+
+def _resize_variants_local(img_bytes: bytes, sizes: list) -> dict:
+    try:
+        img = Image.open(io.BytesIO(img_bytes))
+        # JPEG: فك الترميز بمقياس 1/2 أو 1/4 أو 1/8 ما دام الناتج ≥ أكبر هدف في البعدين
+        img.draft("RGB", (max(w for w, _ in sizes), max(h for _, h in sizes)))
+        img = img.convert("RGB")
+    except Exception:
+        return dict.fromkeys(sizes)
+    results = {}
+    for size in sizes:
+        try:
+            results[size] = _encode_jpeg(img, size)
+        except Exception:
+            results[size] = None
+    return results
+
+
+def resize_variants(img_bytes: bytes, sizes: Iterable[tuple]) -> dict:
+    """
+    كل المقاسات المطلوبة من فك ترميز واحد: {(عرض، ارتفاع): بايتات JPEG}.
+    المقاس الذي يفشل قيمته None — وعند تشغيل المجمّع يتم العمل في عملية منفصلة
+    """
+    sizes = list(dict.fromkeys(tuple(s) for s in sizes))
+    if not sizes:
+        return {}
+    pool = _pool
+    if pool is not None:
+        try:
+            return pool.submit(_resize_variants_local, img_bytes, sizes).result()
+        except concurrent.futures.BrokenExecutor:
+            shutdown_resize_pool()
+    return _resize_variants_local(img_bytes, sizes)
+
+
+def resize_image(img_bytes: bytes, target_w: int, target_h: int) -> bytes:
+    """تغيير مقاس الصورة إلى (عرض × ارتفاع) وإعادة ترميزها JPEG — يُرجع الأصل عند الفشل"""
+    return resize_variants(img_bytes, [(target_w, target_h)])[(target_w, target_h)] or img_bytes
+
+
+def fit_jpeg(img_bytes: bytes, target_w: int, target_h: int) -> bytes:
+    """
+    مثل resize_image لكن: JPEG بالمقاس المطلوب يُعاد كما هو (قراءة الترويسة فقط)،
+    وغيره يُغيَّر مقاسه مرة واحدة ويُحفظ في RESIZE_CACHE
+    """
+    try:
+        img = Image.open(io.BytesIO(img_bytes))
+        if img.format == "JPEG" and img.size == (target_w, target_h):
+            return img_bytes
+    except Exception:
+        return img_bytes
+    key = content_key("resize", hashlib.sha256(img_bytes).hexdigest(), target_w, target_h)
+    cached = RESIZE_CACHE.get(key)
+    if cached:
+        return cached
+    resized = resize_variants(img_bytes, [(target_w, target_h)])[(target_w, target_h)]
+    if resized is None:
+        return img_bytes
+    RESIZE_CACHE.put(key, resized)
+    return resized
+
+
+# ─── مجمّع العمليات ───────────────────────────────────────────────────────────
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def start_resize_pool(workers: int = RESIZE_WORKERS):
+    """
+    تشغيل مجمّع العمليات للدفعات — خيوط التوليد المتوازية تنتظر نتائجه دون حجز GIL.
+    spawn لا fork: العملية الأم فيها خيوط (HTTP/المجدول) قد تكون ممسكة بأقفال
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None or workers <= 0:
+            return
+        _pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_resize_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# البصمة الإدراكية
+# ══════════════════════════════════════════════════════════════════════════════
+
+def dhash(img_bytes: bytes, size: int = 8) -> int:
+    """
+    بصمة إدراكية (difference hash) بطول size² بت: تدرج رمادي مصغّر (size+1)×size
+    ومقارنة كل بكسل بجاره — ثابتة تقريباً أمام إعادة الحفظ والضغط وتغيير المقاس
+    """
+    img = Image.open(io.BytesIO(img_bytes))
+    # JPEG: فك الترميز مباشرةً بدقة مصغّرة بدل الصورة كاملة
+    img.draft("L", ((size + 1) * 8, size * 8))
+    pixels = list(img.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
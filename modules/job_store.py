@@ -0,0 +1,118 @@
+"""
+🗂️ سجل المهام الدائم — Mahwous AI Studio v13.1
+حالة كل (منتج × مُخرَج) في SQLite بوضع WAL: الحالة، عدد المحاولات، المزود،
+مصدر النتيجة (طلب/كاش/حزمة)، التكلفة، ومسار المُخرَج — ليتخطى العامل بعد إعادة التشغيل ما اكتمل ويعيد الفاشل فقط
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+PENDING = "pending"
+RUNNING = "running"
+DONE    = "done"
+FAILED  = "failed"
+
+
+class JobStore:
+    """جدول tasks(product, artifact) — آمن بين الخيوط والعمليات"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " product TEXT, artifact TEXT, status TEXT, attempts INTEGER DEFAULT 0,"
+            " provider TEXT DEFAULT '', cost REAL DEFAULT 0, output TEXT DEFAULT '',"
+            " error TEXT DEFAULT '', updated REAL, source TEXT DEFAULT '',"
+            " PRIMARY KEY (product, artifact))"
+        )
+        # سجلات التشغيلات السابقة (قبل عمود المصدر) تُرقّى في مكانها
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "source" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN source TEXT DEFAULT ''")
+        self._conn.commit()
+
+    def _exec(self, sql: str, params=()) -> list:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    # ─── دورة حياة المهمة ───────────────────────────────────────────────────
+    def ensure(self, product: str, artifacts: list):
+        """تسجيل المهام غير الموجودة بحالة pending"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO tasks(product, artifact, status, updated) VALUES (?,?,?,?)",
+                [(product, a, PENDING, now) for a in artifacts],
+            )
+            self._conn.commit()
+
+    def pending(self, product: str, artifacts: list, max_attempts: int = 3) -> list:
+        """المهام التي تحتاج تشغيلاً: غير مكتملة ولم تستنفد محاولاتها"""
+        self.ensure(product, artifacts)
+        rows = self._exec(
+            "SELECT artifact, status, attempts FROM tasks WHERE product=?", (product,)
+        )
+        state = {a: (s, n) for a, s, n in rows}
+        return [a for a in artifacts
+                if state[a][0] != DONE and state[a][1] < max_attempts]
+
+    def start(self, product: str, artifact: str):
+        self._exec(
+            "UPDATE tasks SET status=?, attempts=attempts+1, updated=? WHERE product=? AND artifact=?",
+            (RUNNING, time.time(), product, artifact),
+        )
+
+    def finish(self, product: str, artifact: str, ok: bool, provider: str = "",
+               cost: float = 0.0, output=None, error: str = "", source: str = ""):
+        """source: api (طلب مدفوع) / cache / bundle — كما سجّلها المحرك (modules.usage)"""
+        if output is not None and not isinstance(output, str):
+            output = json.dumps(output, ensure_ascii=False)
+        self._exec(
+            "UPDATE tasks SET status=?, provider=?, source=?, cost=cost+?, output=?, error=?,"
+            " updated=? WHERE product=? AND artifact=?",
+            (DONE if ok else FAILED, provider, source, cost, output or "", (error or "")[:500],
+             time.time(), product, artifact),
+        )
+
+    def get(self, product: str, artifact: str) -> Optional[dict]:
+        rows = self._exec(
+            "SELECT status, attempts, provider, source, cost, output, error FROM tasks"
+            " WHERE product=? AND artifact=?", (product, artifact),
+        )
+        if not rows:
+            return None
+        keys = ("status", "attempts", "provider", "source", "cost", "output", "error")
+        return dict(zip(keys, rows[0]))
+
+    def recover_running(self) -> int:
+        """المهام العالقة بحالة running من عملية ماتت تُعلَّم فاشلة لتُعاد"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE tasks SET status=?, error=?, updated=? WHERE status=?",
+                (FAILED, "interrupted", time.time(), RUNNING),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def reset(self):
+        self._exec("DELETE FROM tasks")
+
+    # ─── التقارير ────────────────────────────────────────────────────────────
+    def summary(self) -> dict:
+        rows = self._exec("SELECT status, COUNT(*), COALESCE(SUM(cost), 0) FROM tasks GROUP BY status")
+        return {s: {"count": n, "cost": round(c, 4)} for s, n, c in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,171 @@
+"""
+🩹 استخراج JSON وإصلاحه — Mahwous AI Studio v13.1
+يستخرج أول قيمة JSON من رد النموذج ويصلح العيوب الشائعة محلياً (أسوار ```،
+علامات تنصيص ذكية، فواصل زائدة، كائن مقطوع) ويتحقق من الحقول المطلوبة حسب مخطط
+بصيغة Gemini — فلا يُعاد توليد الرد كاملاً بسبب خطأ تنسيق
+"""
+
+import json
+import re
+
+# ══════════════════════════════════════════════════════════════════════════════
+# المخططات (نفس صيغة responseSchema في Gemini)
+# ══════════════════════════════════════════════════════════════════════════════
+
+STRING = {"type": "STRING"}
+NUMBER = {"type": "NUMBER"}
+STRING_LIST = {"type": "ARRAY", "items": STRING}
+
+
+def schema_object(properties: dict, required=None) -> dict:
+    """كائن بمخطط Gemini (مجموعة OpenAPI الجزئية) — كل الحقول مطلوبة افتراضياً"""
+    return {"type": "OBJECT", "properties": properties,
+            "required": list(properties) if required is None else list(required)}
+
+
+def schema_subset(schema: dict, keys: list) -> dict:
+    """نفس المخطط مقصوراً على مفاتيح معينة (لطلب الحقول الناقصة فقط)"""
+    props = schema.get("properties", {})
+    return schema_object({k: props[k] for k in keys if k in props})
+
+
+def missing_fields(data, schema: dict, path: str = "") -> list:
+    """مسارات الحقول المطلوبة الغائبة أو الفارغة — [] تعني أن الرد مكتمل"""
+    kind = schema.get("type")
+    if kind == "OBJECT":
+        if not isinstance(data, dict):
+            return [path or "$"]
+        missing = []
+        for key in schema.get("required", []):
+            sub = schema.get("properties", {}).get(key, {})
+            value = data.get(key)
+            key_path = f"{path}.{key}" if path else key
+            if value is None or value == "" or value == [] or value == {}:
+                missing.append(key_path)
+            else:
+                missing += missing_fields(value, sub, key_path)
+        return missing
+    if kind == "ARRAY":
+        if not isinstance(data, list):
+            return [path or "$"]
+        items = schema.get("items", {})
+        if items.get("type") == "OBJECT":
+            missing = []
+            for i, item in enumerate(data):
+                missing += missing_fields(item, items, f"{path}[{i}]")
+            return missing
+    return []
+
+
+def top_level_keys(paths: list) -> list:
+    """"seo.title" و "scenes[2].audio" ← "seo" و "scenes" (بالترتيب ودون تكرار)"""
+    return list(dict.fromkeys(re.split(r"[.\[]", p, 1)[0] for p in paths))
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# الإصلاح
+# ══════════════════════════════════════════════════════════════════════════════
+
+_SMART_OPEN  = re.compile(r'([{\[,:]\s*)[“”„‟″]')
+_SMART_CLOSE = re.compile(r'[“”„‟″](\s*[:,}\]])')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _strip_fences(text: str) -> str:
+    """محتوى أول كتلة ``` (حتى لو لم تُغلق) — وإلا النص كما هو"""
+    if "```" not in text:
+        return text
+    body = text.split("```", 1)[1]
+    body = body.split("```", 1)[0]
+    return re.sub(r"^\s*json\b", "", body, flags=re.IGNORECASE)
+
+
+def _from_first_bracket(text: str) -> str:
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):] if starts else text
+
+
+def _normalize_quotes(text: str) -> str:
+    """علامات التنصيص الذكية في موضع الفواصل فقط — داخل النصوص تبقى كما هي"""
+    return _SMART_CLOSE.sub(r'"\1', _SMART_OPEN.sub(r'\1"', text))
+
+
+def _scan(text: str):
+    """
+    مرور واحد خارج النصوص: يُرجع (المكدس عند النهاية، هل انتهى داخل نص،
+    [(موضع كل فاصلة، المكدس عنده)])
+    """
+    stack, commas = [], []
+    in_str = escape = False
+    for i, c in enumerate(text):
+        if in_str:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            stack.append(c)
+        elif c in "}]":
+            if stack:
+                stack.pop()
+        elif c == ",":
+            commas.append((i, list(stack)))
+    return stack, in_str, commas
+
+
+def _strip_trailing_commas(text: str) -> str:
+    _, _, commas = _scan(text)
+    drop = {i for i, _ in commas if re.match(r"\s*[}\]]", text[i + 1:])}
+    return "".join(c for i, c in enumerate(text) if i not in drop)
+
+
+def _close(text: str, stack: list) -> str:
+    return text + "".join(_CLOSERS[b] for b in reversed(stack))
+
+
+def _decode(text: str):
+    """json.loads متسامح مع ذيل زائد بعد القيمة"""
+    return json.JSONDecoder().raw_decode(text.strip())[0]
+
+
+def _repair_truncated(text: str):
+    """
+    كائن مقطوع: إغلاق الأقواس، أو حذف العنصر الأخير الناقص — النص المقطوع في منتصفه
+    يُحذف ولا يُقبل، فيظهر حقله ناقصاً ويُطلب وحده
+    """
+    stack, in_str, commas = _scan(text)
+    if not in_str:
+        try:
+            return _decode(_close(text, stack))
+        except ValueError:
+            pass
+    for pos, at in reversed(commas):
+        try:
+            return _decode(_close(text[:pos], at))
+        except ValueError:
+            continue
+    raise ValueError("تعذر إصلاح JSON المقطوع")
+
+
+def extract_json(text: str):
+    """
+    أول قيمة JSON في رد النموذج — الإصلاحات تُطبق بالتدريج ولا يُلمس الرد السليم.
+    يرفع ValueError إن لم يمكن استخراج أي شيء
+    """
+    text = (text or "").strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    candidate = _from_first_bracket(_strip_fences(text).strip())
+    for fix in (lambda t: t, _normalize_quotes, _strip_trailing_commas):
+        candidate = fix(candidate)
+        try:
+            return _decode(candidate)
+        except ValueError:
+            continue
+    return _repair_truncated(candidate)
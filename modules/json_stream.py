@@ -0,0 +1,90 @@
+"""
+🧩 محلل JSON تدريجي — Mahwous AI Studio v13.1
+يُغذّى بأجزاء النص أثناء البث ويُرجع كل حقل من المستوى الأعلى فور اكتمال قيمته —
+فتُعرض التعليقات والأوصاف حقلاً بحقل بدل انتظار الاستجابة كاملة
+"""
+
+import json
+
+
+class JsonFieldStream:
+    """
+    يتتبع حالة الكائن الأعلى فقط (العمق، النصوص، الهروب) — كل ما قبل أول "{"
+    (مثل ```json) يُهمل، وكل قيمة تُحلَّل بـ json.loads عند إغلاقها
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.fields: dict = {}
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._done = False
+        self._in_str = False
+        self._escape = False
+        self._key = None
+        self._key_start = -1
+        self._value_start = -1
+
+    def feed(self, chunk: str) -> list:
+        """إضافة جزء — يُرجع [(المفتاح، القيمة)] للحقول التي اكتملت بهذا الجزء"""
+        self.buf += chunk
+        completed = []
+        buf = self.buf
+        while self._pos < len(buf) and not self._done:
+            i = self._pos
+            c = buf[i]
+            self._pos += 1
+
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._depth == 1 and self._key is None and self._key_start >= 0:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                continue
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if c == '"':
+                self._in_str = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = i
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish(i, completed)
+                    self._done = True
+            elif self._depth == 1:
+                if c == ":" and self._key is not None and self._value_start < 0:
+                    self._value_start = i + 1
+                elif c == ",":
+                    self._finish(i, completed)
+        return completed
+
+    def _finish(self, end: int, completed: list):
+        if self._key is not None and self._value_start >= 0:
+            raw = self.buf[self._value_start:end].strip()
+            try:
+                value = json.loads(raw)
+            except ValueError:
+                value = raw
+            self.fields[self._key] = value
+            completed.append((self._key, value))
+        self._key = None
+        self._key_start = -1
+        self._value_start = -1
+
+    @property
+    def done(self) -> bool:
+        """أُغلق الكائن الأعلى"""
+        return self._done
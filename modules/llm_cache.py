@@ -0,0 +1,135 @@
+"""
+🗄️ كاش ردود النماذج النصية — Mahwous AI Studio v13.1
+نفس البرومت لنفس النموذج بنفس الإعدادات لا يُرسل مرتين: الرد يُحفظ على القرص
+بمدة صلاحية حسب نوع المحتوى، وزر "إعادة التوليد" يتجاوز الكاش صراحةً (fresh=True)
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import re
+from typing import Optional, Union
+
+from modules.disk_cache import DiskCache, content_key
+from modules.usage import API, CACHE, note_usage
+
+# صلاحية كل نوع (ساعات) — الترندات تتقادم سريعاً، والقصص والأوصاف تعيش أطول
+LLM_TTL_HOURS = {
+    "captions":     72,
+    "descriptions": 168,
+    "hashtags":     72,
+    "story":        168,
+    "scenario":     72,
+    "competitor":   72,
+    "trends":       12,
+    "text":         24,
+}
+
+LLM_CACHE = DiskCache(
+    "llm",
+    max_bytes=int(os.environ.get("MAHWOUS_LLM_CACHE_MB", "256")) * 1024 * 1024,
+    ttl=max(LLM_TTL_HOURS.values()) * 3600,
+)
+
+# MAHWOUS_LLM_CACHE=0 يعطل الكاش كلياً (قراءةً وكتابةً)
+ENABLED = os.environ.get("MAHWOUS_LLM_CACHE", "1") != "0"
+
+
+def _normalize(text: str) -> str:
+    """المسافات والأسطر الزائدة لا تغيّر المعنى — لا تغيّر المفتاح أيضاً"""
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def llm_cache_key(prompt: str, model: str, temperature: float, max_tokens: int = 0,
+                  system: str = "", schema: Union[dict, str, None] = None) -> str:
+    """المفتاح = البرومت المُطبَّع + تعليمات النظام + النموذج + الحرارة + الحد + المخطط"""
+    return content_key("llm", _normalize(prompt), _normalize(system), model,
+                       round(float(temperature), 3), int(max_tokens or 0), schema)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# سياسة الكاش للاستدعاء الحالي
+# ══════════════════════════════════════════════════════════════════════════════
+
+_POLICY: contextvars.ContextVar = contextvars.ContextVar("mahwous_llm_cache", default=None)
+
+
+@contextlib.contextmanager
+def cache_policy(kind: str = "text", fresh: bool = False):
+    """
+    تفعيل صلاحية نوع المحتوى داخل الكتلة — الاستدعاءات المتداخلة تأخذ الأقصر،
+    وfresh من أي مستوى يسري على كل ما بداخله
+    """
+    ttl = LLM_TTL_HOURS.get(kind, LLM_TTL_HOURS["text"]) * 3600
+    active = _POLICY.get()
+    if active is not None:
+        ttl = min(ttl, active[0])
+        fresh = fresh or active[1]
+    token = _POLICY.set((ttl, fresh))
+    try:
+        yield
+    finally:
+        _POLICY.reset(token)
+
+
+def _policy() -> tuple:
+    return _POLICY.get() or (LLM_TTL_HOURS["text"] * 3600, False)
+
+
+def cache_fresh() -> bool:
+    """طُلبت إعادة التوليد — تجاوز كل كاش (قرص أو ذاكرة) داخل هذا الاستدعاء"""
+    return _policy()[1]
+
+
+def cached_completion(prompt: str, model: str, temperature: float, max_tokens: int = 0,
+                      system: str = "", schema: Union[dict, str, None] = None) -> Optional[str]:
+    """الرد المحفوظ إن وُجد ضمن صلاحية النوع الحالي — None عند الغياب أو fresh"""
+    ttl, fresh = _policy()
+    if not ENABLED or fresh:
+        return None
+    data = LLM_CACHE.get(llm_cache_key(prompt, model, temperature, max_tokens, system, schema), ttl)
+    if not data:
+        return None
+    note_usage(model, CACHE)
+    return data.decode("utf-8")
+
+
+def store_completion(text: str, prompt: str, model: str, temperature: float, max_tokens: int = 0,
+                     system: str = "", schema: Union[dict, str, None] = None):
+    """حفظ رد ناجح — يُحفظ حتى مع fresh ليحل محل القديم (ويُسجَّل طلباً مدفوعاً للمهمة)"""
+    note_usage(model, API)
+    if ENABLED and text:
+        LLM_CACHE.put(llm_cache_key(prompt, model, temperature, max_tokens, system, schema),
+                      text.encode("utf-8"))
+
+
+def cacheable(kind: str):
+    """
+    مُزخرف لمولدات المحتوى: يضيف معامل fresh (تجاوز الكاش) ويفعّل صلاحية النوع.
+    للمولّدات (البث) تُفعَّل السياسة حول كل خطوة فقط كما في entry_point
+    """
+    def decorate(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def stream_wrapper(*args, fresh: bool = False, **kwargs):
+                it = fn(*args, **kwargs)
+                try:
+                    while True:
+                        with cache_policy(kind, fresh):
+                            try:
+                                item = next(it)
+                            except StopIteration as stop:
+                                return stop.value
+                        yield item
+                finally:
+                    it.close()
+            return stream_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, fresh: bool = False, **kwargs):
+            with cache_policy(kind, fresh):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,152 @@
+"""
+📦 خط إنتاج الحزمة الكاملة — Mahwous AI Studio v13.1
+صور + تعليقات + أوصاف + هاشتاقات + قصة + سيناريو + ترندات (+ فيديو اختياري)
+في تمريرة واحدة متوازية وفق شبكة اعتماديات (DAG)، مع بث كل نتيجة فور اكتمالها
+"""
+
+import asyncio
+import queue
+from typing import Iterator, Optional
+
+from modules.ai_engine import (
+    generate_all_captions, generate_descriptions, generate_hashtags,
+    generate_perfume_story, generate_scenario, generate_trend_insights,
+    PLATFORMS,
+)
+from modules.async_engine import (
+    SCHEDULER, run_text_task, submit_video_async, generate_platform_images_async,
+)
+from modules.usage import track_usage
+
+# ══════════════════════════════════════════════════════════════════════════════
+# تعريف المهام
+# ══════════════════════════════════════════════════════════════════════════════
+
+PACK_TASKS = {
+    "images":       {"label": "🖼️ الصور",       "deps": []},
+    "captions":     {"label": "✍️ التعليقات",   "deps": []},
+    "descriptions": {"label": "📖 الأوصاف",     "deps": []},
+    "hashtags":     {"label": "#️⃣ الهاشتاقات", "deps": []},
+    "story":        {"label": "📖 القصة",       "deps": []},
+    "scenario":     {"label": "🎭 السيناريو",   "deps": []},
+    "trends":       {"label": "🔥 الترندات",    "deps": []},
+    # الفيديو يحتاج برومت السيناريو وصورة مرجعية من الصور المولدة
+    "video":        {"label": "🎬 الفيديو",     "deps": ["scenario", "images"]},
+}
+
+
+def _reference_image(images: dict, aspect: str) -> Optional[bytes]:
+    """أول صورة ناجحة بنفس نسبة الفيديو (وإلا أي صورة ناجحة)"""
+    ok = [(k, v) for k, v in (images or {}).items() if v.get("bytes")]
+    for k, v in ok:
+        if PLATFORMS.get(k, {}).get("aspect") == aspect:
+            return v["bytes"]
+    return ok[0][1]["bytes"] if ok else None
+
+
+async def _run_task(name: str, info: dict, opts: dict, done: dict):
+    if name == "images":
+        return await generate_platform_images_async(
+            info, opts.get("platforms"), opts.get("outfit", "suit"), opts.get("scene", "store"),
+            opts.get("include_character", True), opts.get("ramadan_mode", False),
+        )
+    if name == "captions":
+        return await run_text_task(generate_all_captions, info)
+    if name == "descriptions":
+        return await run_text_task(generate_descriptions, info)
+    if name == "hashtags":
+        return await run_text_task(generate_hashtags, info)
+    if name == "story":
+        return await run_text_task(generate_perfume_story, info)
+    if name == "scenario":
+        return await run_text_task(
+            generate_scenario, info, opts.get("scene_type", "مهووس مع العطر"),
+            opts.get("scene", "store"), opts.get("outfit", "suit"), opts.get("duration", 7),
+        )
+    if name == "trends":
+        return await run_text_task(generate_trend_insights, info)
+    if name == "video":
+        scenario = done.get("scenario") or {}
+        prompt = scenario.get("video_prompt", "")
+        if not prompt or "error" in scenario:
+            return {"error": "لا يوجد برومت فيديو — فشل توليد السيناريو"}
+        aspect = opts.get("video_aspect", "9:16")
+        ref = _reference_image(done.get("images"), aspect)
+        provider = opts["video_provider"]
+        kwargs = {"image_bytes": ref, "aspect_ratio": aspect}
+        if provider in ("luma", "runway"):
+            kwargs["duration"] = opts.get("video_duration", 5)
+        return await submit_video_async(provider, prompt, **kwargs)
+    raise ValueError(f"مهمة غير معروفة: {name}")
+
+
+def pack_task_names(opts: dict) -> list:
+    """أسماء المهام المطلوبة مع اعتمادياتها"""
+    tasks = list(opts.get("tasks") or [t for t in PACK_TASKS if t != "video"])
+    if opts.get("video_provider") and "video" not in tasks:
+        tasks.append("video")
+    # الاعتماديات تُضاف تلقائياً — إلا إذا مُرِّرت نتيجتها مسبقاً في opts["prefilled"]
+    prefilled = opts.get("prefilled") or {}
+    for t in list(tasks):
+        for d in PACK_TASKS[t]["deps"]:
+            if d not in tasks and d not in prefilled:
+                tasks.append(d)
+    return tasks
+
+
+async def _run_pack(info: dict, opts: dict, emit):
+    names = pack_task_names(opts)
+    done: dict = dict(opts.get("prefilled") or {})
+    futures: dict = {}
+    usage_sink = opts.get("usage")
+
+    async def _node(name):
+        for dep in PACK_TASKS[name]["deps"]:
+            if dep in futures:
+                await futures[dep]
+        # كل مهمة تسجّل مزودها ومصدرها الفعلي (طلب/كاش/حزمة) — تنتقل لخيوط SCHEDULER
+        with track_usage() as usage:
+            try:
+                result = await _run_task(name, info, opts, done)
+            except Exception as e:
+                result = {"error": str(e)}
+        if usage_sink is not None:
+            usage_sink[name] = usage
+        done[name] = result
+        emit(name, result)
+
+    for name in names:
+        futures[name] = asyncio.ensure_future(_node(name))
+    await asyncio.gather(*futures.values())
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# نقطة الدخول
+# ══════════════════════════════════════════════════════════════════════════════
+
+def iter_content_pack(info: dict, opts: Optional[dict] = None) -> Iterator[tuple]:
+    """
+    توليد الحزمة الكاملة بالتوازي — يُنتج (اسم المهمة، النتيجة) فور اكتمال كل مهمة.
+    opts: platforms, outfit, scene, include_character, ramadan_mode, scene_type,
+          duration, tasks, video_provider, video_aspect, video_duration,
+          prefilled (نتائج جاهزة لمهام سابقة تُستخدم كاعتماديات دون إعادة توليدها)،
+          credentials (لقطة مفاتيح جاهزة — وإلا تُلتقط من خيط المستدعي)،
+          usage (قاموس يُملأ بسجل modules.usage.Usage لكل مهمة قبل إنتاج نتيجتها)
+    """
+    opts = opts or {}
+    names = pack_task_names(opts)
+    updates: queue.Queue = queue.Queue()
+    future = SCHEDULER.submit(_run_pack(info, opts, lambda n, r: updates.put((n, r))),
+                              creds=opts.get("credentials"))
+    # خطأ في بنية الحزمة نفسها يجب ألا يترك المستهلك منتظراً للأبد
+    future.add_done_callback(lambda f: f.exception() and updates.put((None, f.exception())))
+    for _ in names:
+        name, result = updates.get()
+        if name is None:
+            raise result
+        yield name, result
+
+
+def generate_content_pack(info: dict, opts: Optional[dict] = None) -> dict:
+    """نسخة تُرجع الحزمة كاملة دفعة واحدة"""
+    return dict(iter_content_pack(info, opts))
@@ -0,0 +1,206 @@
+"""
+🚦 محدِّد المعدل — Mahwous AI Studio v13.1
+دلو رموز (token bucket) لكل مزود/نموذج بميزانيتي RPM و TPM، مشترك بين كل الخيوط
+والجلسات في العملية — واختيارياً بين العمليات عبر SQLite (MAHWOUS_RATE_DB)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# ══════════════════════════════════════════════════════════════════════════════
+# الميزانيات
+# ══════════════════════════════════════════════════════════════════════════════
+
+# المفتاح: المزود أو "المزود:النموذج" — الطلب يستهلك من الاثنين إن وُجدا
+# rpm = طلبات في الدقيقة، tpm = رموز في الدقيقة (تقدير للنصوص فقط)
+RATE_LIMITS = {
+    "gemini":                          {"rpm": 120, "tpm": 2_000_000},
+    "gemini:gemini-2.0-flash-lite":    {"rpm": 30,  "tpm": 1_000_000},
+    "gemini:gemini-2.0-flash":         {"rpm": 15,  "tpm": 1_000_000},
+    "gemini:imagen-3.0-generate-002":  {"rpm": 10},
+    "gemini:imagen-4.0-generate-001":  {"rpm": 10},
+    "fal":                             {"rpm": 120},
+    "openrouter":                      {"rpm": 60,  "tpm": 400_000},
+    "luma":                            {"rpm": 20},
+    "runway":                          {"rpm": 20},
+    "imgbb":                           {"rpm": 30},
+    "elevenlabs":                      {"rpm": 30},
+}
+
+# سعة الدلو = ما يكفي لهذه المدة من الميزانية — دفعات صغيرة ثم معدل ثابت
+BURST_SECONDS = float(os.environ.get("MAHWOUS_RATE_BURST_S", "10"))
+
+_overrides_loaded = False
+
+
+def parse_limits(value: str) -> dict:
+    """صيغة "gemini:gemini-2.0-flash=2000, fal=600" → {المفتاح: العدد} — المدخلات غير الصالحة تُهمل"""
+    limits = {}
+    for item in str(value or "").split(","):
+        key, _, n = item.partition("=")
+        try:
+            limits[key.strip()] = float(n)
+        except ValueError:
+            continue
+    return {k: v for k, v in limits.items() if k}
+
+
+def _load_overrides():
+    """
+    الميزانيات أعلاه حدود المستوى المجاني — المفاتيح المدفوعة تُعدّلها من secrets.toml
+    ثم البيئة (الأولوية للبيئة): MAHWOUS_RPM / MAHWOUS_TPM بصيغة parse_limits.
+    تُقرأ مرة واحدة عند أول استخدام (الأسرار لا تتوفر عند الاستيراد)
+    """
+    global _overrides_loaded
+    if _overrides_loaded:
+        return
+    _overrides_loaded = True
+    try:
+        from modules.ai_engine import _file_secrets
+        sources = [_file_secrets(), os.environ]
+    except Exception:
+        sources = [os.environ]
+    for source in sources:
+        for kind in ("rpm", "tpm"):
+            for key, n in parse_limits(source.get(f"MAHWOUS_{kind.upper()}", "")).items():
+                RATE_LIMITS[key] = dict(RATE_LIMITS.get(key, {}), **{kind: n})
+
+
+def configure_limit(key: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+    """تعديل ميزانية مزود أو نموذج (مثلاً من سطر أوامر الدفعات) — يتقدم على الأسرار والبيئة"""
+    _load_overrides()
+    cfg = dict(RATE_LIMITS.get(key, {}))
+    if rpm is not None:
+        cfg["rpm"] = rpm
+    if tpm is not None:
+        cfg["tpm"] = tpm
+    RATE_LIMITS[key] = cfg
+
+
+def _bucket_params(per_minute: float) -> tuple:
+    rate = per_minute / 60.0
+    capacity = max(1.0, rate * BURST_SECONDS)
+    return rate, capacity
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# مخازن الدلاء
+# ══════════════════════════════════════════════════════════════════════════════
+
+class MemoryBuckets:
+    """دلاء داخل العملية — قفل واحد، لا نوم داخل القفل"""
+
+    def __init__(self):
+        self._state: dict = {}
+        self._lock = threading.Lock()
+
+    def take(self, name: str, per_minute: float, cost: float) -> float:
+        """سحب cost رمزاً — يُرجع 0 عند النجاح أو مدة الانتظار المطلوبة"""
+        rate, capacity = _bucket_params(per_minute)
+        cost = min(cost, capacity)
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._state.get(name, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                self._state[name] = (tokens - cost, now)
+                return 0.0
+            self._state[name] = (tokens, now)
+            return (cost - tokens) / rate
+
+
+class SqliteBuckets:
+    """دلاء مشتركة بين العمليات — معاملة IMMEDIATE تجعل التعبئة والسحب ذرّيين"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, name: str, per_minute: float, cost: float) -> float:
+        rate, capacity = _bucket_params(per_minute)
+        cost = min(cost, capacity)
+        now = time.time()  # ساعة الجدار — مشتركة بين العمليات
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE name=?", (name,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            db.execute("INSERT OR REPLACE INTO buckets(name, tokens, updated) VALUES (?,?,?)",
+                       (name, tokens, now))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return wait
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+# المحدِّد
+# ══════════════════════════════════════════════════════════════════════════════
+
+class RateLimiter:
+    def __init__(self, buckets):
+        self.buckets = buckets
+
+    def _budgets(self, provider: str, model: str) -> list:
+        _load_overrides()
+        keys = [provider] + ([f"{provider}:{model}"] if model else [])
+        return [(k, RATE_LIMITS[k]) for k in keys if k in RATE_LIMITS]
+
+    def acquire(self, provider: str, model: str = "", tokens: int = 0,
+                max_wait: float = 60.0) -> float:
+        """
+        الانتظار حتى تسمح كل الميزانيات المعنية بالطلب — يُرجع مدة الانتظار الفعلية.
+        بعد max_wait يُسمح بالطلب على أي حال (وتتولاه سياسة إعادة المحاولة عند 429).
+        """
+        budgets = self._budgets(provider, model)
+        if not budgets:
+            return 0.0
+        start = time.monotonic()
+        for key, cfg in budgets:
+            for kind, cost in (("rpm", 1), ("tpm", tokens)):
+                if not cfg.get(kind) or not cost:
+                    continue
+                name = f"{key}|{kind}"
+                while True:
+                    wait = self.buckets.take(name, cfg[kind], cost)
+                    if wait <= 0:
+                        break
+                    remaining = max_wait - (time.monotonic() - start)
+                    if remaining <= 0:
+                        return time.monotonic() - start
+                    time.sleep(min(wait, remaining))
+        return time.monotonic() - start
+
+
+def _default_buckets():
+    path = os.environ.get("MAHWOUS_RATE_DB", "")
+    return SqliteBuckets(path) if path else MemoryBuckets()
+
+
+LIMITER = RateLimiter(_default_buckets())
+
+
+def use_shared_store(path: str):
+    """تفعيل الدلاء المشتركة بين العمليات (عدة عمّال/خوادم على نفس الجهاز)"""
+    LIMITER.buckets = SqliteBuckets(path)
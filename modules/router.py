@@ -0,0 +1,167 @@
+"""
+🧭 الموجّه التكيفي — Mahwous AI Studio v13.1
+يسجل زمن الاستجابة (EWMA + p50/p95) ومعدل الخطأ والتكلفة لكل (فئة طلب، مزود/نموذج)
+ويرتّب البدائل لكل طلب — فتنجرف الحركة تلقائياً نحو الأسرع والأسلم، مع تثبيت
+اختياري لكل مشغّل
+"""
+
+import random
+import threading
+from collections import deque
+from typing import Optional
+
+# تكلفة تقديرية بالدولار لكل عملية ناجحة — للترتيب وللتقارير
+EST_COST_USD = {
+    ("fal", "image"):        0.025,
+    ("gemini", "image"):     0.04,
+    ("openrouter", "text"):  0.01,
+    ("gemini", "text"):      0.002,
+    ("luma", "video"):       0.40,
+    ("runway", "video"):     0.50,
+    ("fal", "video"):        0.35,
+}
+
+EWMA_ALPHA     = 0.2    # وزن القياس الجديد
+WINDOW         = 100    # نافذة p50/p95
+ERROR_PENALTY  = 4.0    # معدل خطأ 50% يضاعف الدرجة ثلاث مرات
+COST_WEIGHT    = 20.0   # ثوانٍ لكل دولار — الفرق في التكلفة يُعامل كتأخير
+EXPLORE_RATE   = 0.05   # نسبة الطلبات التي تُجرّب بديلاً غير الأول لتحديث قياساته
+
+# التحوّط (hedging): بديل ثانٍ يُطلق إن تجاوز الأول زمن p90 المعتاد له
+HEDGE_QUANTILE      = 0.9
+HEDGE_MIN_SAMPLES   = 5      # قبلها نستخدم التأخير الافتراضي
+HEDGE_DEFAULT_DELAY = 15.0
+HEDGE_MIN_DELAY     = 3.0
+HEDGE_MAX_DELAY     = 45.0
+HEDGE_RATIO         = 0.10   # سقف الميزانية: طلب تحوّط لكل عشرة طلبات في المتوسط
+HEDGE_BURST         = 2.0
+
+
+def estimate_cost(provider: str, kind: str) -> float:
+    return EST_COST_USD.get((provider, kind), 0.0)
+
+
+def request_class(kind: str, aspect: str = "", prompt: str = "", max_tokens: int = 0) -> str:
+    """فئة الطلب: image:<النسبة> ، text:short/long ، video"""
+    if kind == "image":
+        return f"image:{aspect or '1:1'}"
+    if kind == "text":
+        return "text:long" if len(prompt) > 4000 or max_tokens > 2000 else "text:short"
+    return kind
+
+
+class _Stats:
+    __slots__ = ("ewma", "err", "count", "window")
+
+    def __init__(self):
+        self.ewma = 0.0
+        self.err = 0.0
+        self.count = 0
+        self.window = deque(maxlen=WINDOW)
+
+    def add(self, latency: float, ok: bool):
+        if self.count == 0:
+            self.ewma = latency
+            self.err = 0.0 if ok else 1.0
+        else:
+            if ok:
+                self.ewma += EWMA_ALPHA * (latency - self.ewma)
+            self.err += EWMA_ALPHA * ((0.0 if ok else 1.0) - self.err)
+        if ok:
+            self.window.append(latency)
+        self.count += 1
+
+    def pct(self, q: float) -> float:
+        if not self.window:
+            return 0.0
+        values = sorted(self.window)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Router:
+    def __init__(self):
+        self._stats: dict = {}
+        self._lock = threading.Lock()
+
+    def record(self, klass: str, backend: str, latency: float, ok: bool):
+        with self._lock:
+            self._stats.setdefault((klass, backend), _Stats()).add(latency, ok)
+
+    def score(self, klass: str, backend: str, cost: float = 0.0) -> Optional[float]:
+        """الدرجة الأقل أفضل — None إن لم يُقَس المزود بعد في هذه الفئة"""
+        with self._lock:
+            st = self._stats.get((klass, backend))
+            if st is None or st.count == 0:
+                return None
+            return st.ewma * (1 + ERROR_PENALTY * st.err) + COST_WEIGHT * cost
+
+    def percentile(self, klass: str, backend: str, q: float,
+                   min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            st = self._stats.get((klass, backend))
+            if st is None or len(st.window) < min_samples:
+                return None
+            return st.pct(q)
+
+    def order(self, klass: str, backends: list, pin: str = "", costs: Optional[dict] = None) -> list:
+        """
+        ترتيب البدائل: المُقاس بالدرجة، ثم غير المُقاس بترتيبه الافتراضي.
+        المثبَّت يتقدم دائماً، ونسبة صغيرة من الطلبات تستكشف بديلاً آخر.
+        """
+        costs = costs or {}
+        scored = [(self.score(klass, b, costs.get(b, 0.0)), i, b) for i, b in enumerate(backends)]
+        ranked = [b for _, _, b in sorted(scored, key=lambda x: (x[0] is None, x[0] or 0.0, x[1]))]
+        if pin in ranked:
+            ranked.remove(pin)
+            return [pin] + ranked
+        if len(ranked) > 1 and random.random() < EXPLORE_RATE:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def snapshot(self) -> list:
+        """قياسات كل (فئة، مزود) — للوحة الإحصائيات"""
+        with self._lock:
+            return [
+                {"class": k, "backend": b, "calls": st.count,
+                 "ewma_s": round(st.ewma, 2), "p50_s": round(st.pct(0.5), 2),
+                 "p95_s": round(st.pct(0.95), 2), "error_rate": round(st.err, 2)}
+                for (k, b), st in sorted(self._stats.items())
+            ]
+
+
+class HedgeBudget:
+    """
+    متى وكم مرة نتحوّط: كل طلب قابل للتحوّط يضيف HEDGE_RATIO رصيداً (حتى HEDGE_BURST)
+    وكل تحوّط يستهلك رصيداً كاملاً — فلا يضاعف بطء مزود كامل الحمل والتكلفة
+    """
+
+    def __init__(self, router: Router):
+        self.router = router
+        self._credit = HEDGE_BURST
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+
+    def delay(self, klass: str, backend: str) -> float:
+        """مهلة انتظار الأول قبل إطلاق البديل"""
+        p = self.router.percentile(klass, backend, HEDGE_QUANTILE, HEDGE_MIN_SAMPLES)
+        if p is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, p))
+
+    def note_request(self):
+        with self._lock:
+            self.requests += 1
+            self._credit = min(HEDGE_BURST, self._credit + HEDGE_RATIO)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            self.hedges += 1
+            return True
+
+
+ROUTER = Router()
+HEDGE = HedgeBudget(ROUTER)
@@ -0,0 +1,62 @@
+"""
+🛬 استدعاء واحد لكل مفتاح — Mahwous AI Studio v13.1
+الطلبات المتزامنة لنفس المفتاح تنتظر استدعاءً واحداً وتتشارك نتيجته،
+والنتيجة الناجحة تُحفظ في الذاكرة لمدة قصيرة (لمهام الحزمة المتوازية)
+"""
+
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = 600.0, max_entries: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._done: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+
+    def peek(self, key: str) -> Any:
+        """النتيجة المحفوظة إن وُجدت وما زالت صالحة — وإلا None"""
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                return None
+            return entry[1]
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is not None and time.time() - entry[0] <= self.ttl:
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = concurrent.futures.Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            value = fn()
+        except BaseException as e:
+            # الفشل لا يُحفظ — المنتظرون يرون نفس الخطأ والطلب التالي يعيد المحاولة
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._inflight.pop(key, None)
+            self._done[key] = (time.time(), value)
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def forget(self, key: str):
+        with self._lock:
+            self._done.pop(key, None)
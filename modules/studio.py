@@ -4,28 +4,31 @@
 """
 
 import streamlit as st
-import base64
 import json
-import io
-import zipfile
+import time
+import uuid
 from datetime import datetime
-from PIL import Image
 
 from modules.ai_engine import (
     analyze_perfume_image, generate_platform_images,
-    generate_all_captions, generate_descriptions,
     generate_hashtags, generate_scenario,
-    generate_video_luma, check_luma_status, poll_luma_video,
-    generate_video_runway, check_runway_status,
-    generate_video_fal, check_fal_video_status,
-    generate_image_gemini, smart_generate_image, generate_perfume_story,
+    generate_video_luma, generate_video_runway, generate_video_fal,
+    generate_image_gemini, smart_generate_image,
     build_manual_info, build_video_prompt,
     send_to_make, build_make_payload,
     analyze_competitor, generate_image_remix_fal,
     load_asset_bytes,
     generate_concurrent_images, generate_voiceover_elevenlabs,
+    generate_trend_insights, video_provider_order,
+    stream_all_captions, stream_descriptions, stream_perfume_story,
     PLATFORMS, MAHWOUS_OUTFITS, FAL_VIDEO_MODELS, _get_secrets
 )
+from modules.async_engine import generate_image_hedged
+from modules.artifacts import ImageArtifact, as_bytes, display_source
+from modules.assets import image_ref
+from modules.blob_store import BLOBS, blob_bytes
+from modules.export import build_zip, cached_zip, exportable_images
+from modules.video_poller import POLLER, FINAL_STATES
 
 # ─── Helper functions for prompt building ─────────────────────────────────────
 def build_mahwous_product_prompt(info: dict, outfit: str, scene: str, aspect: str) -> str:
@@ -78,60 +81,14 @@ def build_ramadan_product_prompt(info: dict, aspect: str) -> str:
         f"elegant Ramadan Kareem atmosphere. Aspect ratio {aspect}. High quality 4K."
     )
 
-def generate_trend_insights(info: dict) -> dict:
-    """توليد تحليل ترندات للمنتج — يستخدم Claude أو Gemini تلقائياً"""
-    import json
-    from modules.ai_engine import _call_claude, _parse_json_response
-    brand = info.get("brand", "Unknown")
-    product = info.get("product_name", "Unknown")
-    mood = info.get("mood", "luxury")
-    prompt = f"""أنت خبير تسويق رقمي متخصص في العطور الفاخرة.
-حلّل هذا المنتج واقترح ترندات محتوى:
-العطر: {brand} - {product}
-المزاج: {mood}
-
-أعطني JSON فقط بهذا الشكل بدون أي نص إضافي:
-{{
-  "product_summary": "ملخص هوية العطر في جملتين",
-  "target_audience": "وصف الجمهور المستهدف",
-  "trending_topics": [
-    {{"platform": "TikTok", "topic": "موضوع رائج", "hook": "هوك جذاب", "relevance": "سبب الارتباط"}},
-    {{"platform": "Instagram", "topic": "موضوع رائج", "hook": "هوك جذاب", "relevance": "سبب الارتباط"}},
-    {{"platform": "Twitter", "topic": "موضوع رائج", "hook": "هوك جذاب", "relevance": "سبب الارتباط"}}
-  ],
-  "viral_hooks": ["هوك 1", "هوك 2", "هوك 3"],
-  "content_angles": [
-    {{"angle": "زاوية 1", "description": "وصف الزاوية", "format": "ريلز"}},
-    {{"angle": "زاوية 2", "description": "وصف الزاوية", "format": "بوست"}}
-  ],
-  "trending_hashtags": {{
-    "viral": ["#هاشتاق1", "#هاشتاق2"],
-    "niche": ["#هاشتاق3", "#هاشتاق4"],
-    "buying": ["#شراء_عطور_فاخرة", "#عطور_أصلية"]
-  }},
-  "best_post_times": {{"TikTok": "8-10 مساءً", "Instagram": "12-2 ظهراً"}},
-  "competitor_gap": "فرصة غير مستغلة في السوق",
-  "seasonal_angle": "زاوية موسمية مناسبة"
-}}"""
-    try:
-        # _call_claude يتضمن fallback تلقائي إلى Gemini عند نقص رصيد OpenRouter
-        text = _call_claude(prompt, max_tokens=1500)
-        if text.startswith("```"):
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-        return json.loads(text.strip())
-    except Exception as e:
-        return {"error": str(e)}
-
 def analyze_perfume_url(url: str) -> dict:
     """استخراج معلومات العطر من رابط المنتج — يستخدم Claude أو Gemini تلقائياً"""
-    import requests, json
+    import requests
     try:
         from bs4 import BeautifulSoup
     except ImportError:
         return {"error": "BeautifulSoup غير مثبت — قراءة URL غير متاحة"}
-    from modules.ai_engine import _call_claude
+    from modules.ai_engine import generate_json, PERFUME_INFO_SCHEMA
     if not url or not url.startswith("http"):
         return {"success": False, "error": "رابط غير صالح"}
     try:
@@ -153,10 +110,7 @@ def analyze_perfume_url(url: str) -> dict:
 {{"brand": "العلامة التجارية", "product_name": "اسم العطر", "type": "EDP/EDT", "gender": "masculine/feminine/unisex", "style": "luxury", "mood": "المزاج", "notes_guess": "ملاحظات العطر", "bottle_shape": "شكل الزجاجة", "colors": ["gold"]}}"""
 
         # _call_claude يتضمن fallback تلقائي إلى Gemini عند نقص رصيد OpenRouter
-        text = _call_claude(prompt, max_tokens=500)
-        if "```" in text:
-            text = text.split("```")[1].lstrip("json").strip()
-        result = json.loads(text.strip())
+        result = generate_json(prompt, PERFUME_INFO_SCHEMA, max_tokens=500)
         result["success"] = True
         return result
     except Exception as e:
@@ -183,26 +137,24 @@ def analyze_perfume_url(url: str) -> dict:
 def upscale_image_fal(image_bytes: bytes) -> dict:
     """رفع دقة الصورة باستخدام Fal.ai"""
     try:
-        import requests as _rq, base64 as _b64
+        from modules import http_client
         from modules.ai_engine import _get_secrets as _gs
+        from modules.assets import image_ref
         secrets = _gs()
         api_key = secrets.get("fal", "")
         if not api_key:
             return {"success": False, "error": "FAL_API_KEY مفقود"}
-        b64 = _b64.b64encode(image_bytes).decode()
-        data_uri = f"data:image/jpeg;base64,{b64}"
-        resp = _rq.post(
+        resp = http_client.post(
             "https://fal.run/fal-ai/ccsr",
             headers={"Authorization": f"Key {api_key}", "Content-Type": "application/json"},
-            json={"image_url": data_uri, "scale": 2},
+            json={"image_url": image_ref(image_bytes, ("fal",)), "scale": 2},
             timeout=120
         )
         resp.raise_for_status()
         result = resp.json()
         img_url = result.get("image", {}).get("url") or result.get("url", "")
         if img_url:
-            img_resp = _rq.get(img_url, timeout=30)
-            return {"success": True, "bytes": img_resp.content, "url": img_url}
+            return {"success": True, "image": ImageArtifact(img_url).prefetch(), "url": img_url}
         return {"success": False, "error": "لم يتم إرجاع صورة"}
     except Exception as e:
         return {"success": False, "error": str(e)[:200]}
@@ -339,38 +291,51 @@ function copyText(id) {
 
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
-def _pil_resize(img_bytes: bytes, target_w: int, target_h: int) -> bytes:
-    try:
-        img = Image.open(io.BytesIO(img_bytes))
-        img = img.convert("RGB")
-        img = img.resize((target_w, target_h), Image.LANCZOS)
-        buf = io.BytesIO()
-        img.save(buf, format="JPEG", quality=95, optimize=True)
-        return buf.getvalue()
-    except:
-        return img_bytes
-
-
-def _create_zip(images: dict, info: dict) -> bytes:
-    buf = io.BytesIO()
-    brand = info.get("brand", "mahwous").replace(" ", "_").lower()
-    ts = datetime.now().strftime("%Y%m%d_%H%M")
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        for key, data in images.items():
-            if data.get("bytes"):
-                resized = _pil_resize(data["bytes"], data["w"], data["h"])
-                fname = f"{key}_{data['w']}x{data['h']}.jpg"
-                zf.writestr(fname, resized)
-        meta = {
-            "brand": info.get("brand"),
-            "product_name": info.get("product_name"),
-            "generated_at": datetime.now().isoformat(),
-            "platforms": list(images.keys()),
-            "source": "Mahwous AI Studio v13.0"
-        }
-        zf.writestr("info.json", json.dumps(meta, ensure_ascii=False, indent=2))
-    buf.seek(0)
-    return buf.read()
+def _media_session() -> str:
+    """معرّف هذه الجلسة في مخزن الوسائط (BLOBS)"""
+    if "media_session" not in st.session_state:
+        st.session_state.media_session = uuid.uuid4().hex
+    return st.session_state.media_session
+
+
+def _keep_image(key: str, data: dict) -> dict:
+    """نتيجة منصة واحدة كما تُحفظ في الجلسة: مقبض "blob" في مخزن الوسائط بدل "bytes" """
+    entry = {k: v for k, v in data.items() if k != "bytes"}
+    if data.get("bytes"):
+        entry["blob"] = BLOBS.put(_media_session(), f"images/{key}", data["bytes"])
+    return entry
+
+
+def _keep_images(results: dict) -> dict:
+    """نتائج الصور كلها — الصور السابقة في الجلسة تُحرر"""
+    BLOBS.release(_media_session(), "images/")
+    return {key: _keep_image(key, data) for key, data in (results or {}).items()}
+
+
+def _img(data: dict):
+    """بايتات صورة محفوظة في الجلسة — None إن لم تكن أو أُخليت"""
+    return blob_bytes(data.get("blob"))
+
+
+def _img_source(data: dict):
+    """
+    ما يُمرَّر لـ st.image دون قراءة البايتات: رابط المزود، وإلا مسار ملف الكتلة —
+    None إن أُخليت الكتلة
+    """
+    blob = data.get("blob")
+    if blob is None or not blob.alive:
+        return None
+    return data.get("url") or blob.path
+
+
+def _keep_media(name: str, data, mime: str = "image/jpeg"):
+    """حفظ وسائط مفردة (مرجع الشخصية، الصوت) كمقبض في الجلسة — None يحررها"""
+    session = _media_session()
+    if data:
+        st.session_state[name] = BLOBS.put(session, name, data, mime)
+    else:
+        BLOBS.release(session, name)
+        st.session_state.pop(name, None)
 
 
 def _info_card(info: dict):
@@ -523,6 +488,10 @@ def _show_video_generation_tab(perfume_info: dict):
         provider_options.append("fal")
     if not provider_options:
         provider_options = ["luma"]
+    # الاختيار الافتراضي = الأسرع والأسلم حالياً حسب الموجّه
+    routed = next(iter(video_provider_order()), "")
+    routed = routed if routed in ("luma", "runway") else ("fal" if routed else "")
+    default_idx = provider_options.index(routed) if routed in provider_options else 0
 
     # إعدادات الفيديو
     vc1, vc2 = st.columns(2)
@@ -530,6 +499,7 @@ def _show_video_generation_tab(perfume_info: dict):
         video_provider = st.selectbox(
             "🎬 منصة التوليد",
             options=provider_options,
+            index=default_idx,
             format_func=lambda x: {"kling": "⭐ Kling 2.1 (Fal.ai) — الأفضل", "hailuo": "🎭 Hailuo (Fal.ai) — درامي", "seedance": "🌱 Seedance (Fal.ai)", "luma": "🌙 Luma Ray-2", "runway": "🎥 RunwayML Gen-4", "fal": "⚡ Fal.ai Auto"}.get(x, x),
             key="video_provider"
         )
@@ -654,7 +624,7 @@ def _show_video_generation_tab(perfume_info: dict):
     if generate_video_btn:
         # تحديد بايتات الصورة المرجعية
         if video_ref_source == "char_ref":
-            ref_bytes = st.session_state.get("char_reference_bytes")
+            ref_bytes = blob_bytes(st.session_state.get("char_reference_blob"))
         elif video_ref_source == "video_upload":
             ref_bytes = video_ref_img.getvalue() if video_ref_img else None
         else:
@@ -686,127 +656,179 @@ def _show_video_generation_tab(perfume_info: dict):
 
         if result.get("error"):
             st.markdown(f"<div class='video-status-error'>❌ {result['error']}</div>", unsafe_allow_html=True)
-        elif result.get("state") == "completed" and result.get("video_url"):
-            # Fal.ai أو أي مزود أعاد الفيديو فوراً
-            video_url = result["video_url"]
-            st.markdown(f"""
-            <div class='video-status-done'>
-              ✅ الفيديو جاهز!
-              <a href="{video_url}" target="_blank" style="color:#A0FFD8; font-weight:900;">
-                ← تحميل الفيديو
-              </a>
-            </div>
-            """, unsafe_allow_html=True)
-            st.video(video_url)
-            st.session_state["video_url_ready"] = video_url
-            st.session_state.gen_count = st.session_state.get("gen_count", 0) + 1
         else:
-            gen_id = result.get("id", "")
-            st.session_state["video_gen_id"] = gen_id
-            st.session_state["video_gen_provider"] = video_provider
-            st.session_state["video_gen_model_id"] = result.get("model_id","")
-            st.markdown(f"""
-            <div class='video-status-pending'>
-              ⏳ تم إرسال الطلب بنجاح! معرّف التوليد: <code>{gen_id}</code><br>
-              الفيديو قيد المعالجة — عادةً يستغرق 2-5 دقائق
-            </div>
-            """, unsafe_allow_html=True)
+            _track_video_result(result, video_provider, provider_label)
+            if result.get("state") == "completed" and result.get("video_url"):
+                st.markdown("<div class='video-status-done'>✅ الفيديو جاهز!</div>", unsafe_allow_html=True)
+            else:
+                st.markdown(f"""
+                <div class='video-status-pending'>
+                  ⏳ تم إرسال الطلب بنجاح! معرّف التوليد: <code>{result.get("id", "")}</code><br>
+                  الفيديو قيد المعالجة في الخلفية — يمكنك متابعة العمل أو إرسال فيديو آخر
+                </div>
+                """, unsafe_allow_html=True)
             st.session_state.gen_count = st.session_state.get("gen_count", 0) + 1
 
-    # ── فحص حالة الفيديو ──
-    if "video_gen_id" in st.session_state and st.session_state["video_gen_id"]:
-        st.markdown("---")
-        st.markdown("### 📊 حالة الفيديو")
-        gen_id = st.session_state["video_gen_id"]
-        provider = st.session_state.get("video_gen_provider", "luma")
-
-        check_col1, check_col2 = st.columns(2)
-        with check_col1:
-            if st.button("🔄 فحص الحالة الآن", use_container_width=True, key="check_video_status"):
-                with st.spinner("جاري الفحص..."):
-                    if provider == "luma":
-                        status = check_luma_status(gen_id)
-                    elif provider == "fal":
-                        status = check_fal_video_status(gen_id)
-                    else:
-                        status = check_runway_status(gen_id)
-
-                state = status.get("state", "")
-                video_url = status.get("video_url", "")
-
-                if state == "completed" and video_url:
+    # ── حالة طلبات الفيديو (تُحدَّث تلقائياً من المُتابِع الخلفي) ──
+    _show_video_jobs_panel()
+
+
+# ─── 🎞️ متابعة طلبات الفيديو ─────────────────────────────────────────────────
+_VIDEO_KEY_FOR = {"luma": "luma", "runway": "runway", "veo": "gemini"}
+
+
+def _track_video_result(result: dict, video_provider: str, label: str = ""):
+    """تسجيل نتيجة إرسال فيديو لدى المُتابِع الخلفي وربطها بالجلسة"""
+    provider = result.get("provider", video_provider)
+    if result.get("state") == "completed" and result.get("video_url"):
+        job_id = POLLER.add_completed(provider, result["video_url"], label)
+        st.session_state["video_url_ready"] = result["video_url"]
+    else:
+        # المفتاح يُلتقط هنا لأن خيط المتابعة لا يرى session_state
+        api_key = _get_secrets().get(_VIDEO_KEY_FOR.get(provider, "fal"), "")
+        job_id = POLLER.track(provider, result.get("id", ""), result.get("model_id", ""),
+                              api_key=api_key, label=label or video_provider,
+                              backend=video_provider)
+    st.session_state.setdefault("video_jobs", []).append(job_id)
+
+
+def _render_video_jobs():
+    jobs = POLLER.jobs(st.session_state.get("video_jobs", []))
+    seen = st.session_state.setdefault("video_jobs_done", [])
+    newly_done = False
+    for job in jobs:
+        state = job["state"]
+        with st.container(border=True):
+            jc1, jc2 = st.columns([5, 1])
+            with jc1:
+                if state == "completed":
                     st.markdown(f"""
                     <div class='video-status-done'>
-                      ✅ الفيديو جاهز! 
-                      <a href="{video_url}" target="_blank" style="color:#A0FFD8; font-weight:900;">
+                      ✅ {job['label']} — الفيديو جاهز!
+                      <a href="{job['video_url']}" target="_blank" style="color:#A0FFD8; font-weight:900;">
                         ← تحميل الفيديو
                       </a>
                     </div>
                     """, unsafe_allow_html=True)
-                    st.video(video_url)
-                    st.session_state["video_url_ready"] = video_url
-                elif state in ["failed", "error"]:
-                    err = status.get("error", "خطأ غير معروف")
-                    st.markdown(f"<div class='video-status-error'>❌ فشل التوليد: {err}</div>", unsafe_allow_html=True)
+                    st.video(job["video_url"])
+                    if job["id"] not in seen:
+                        seen.append(job["id"])
+                        st.session_state["video_url_ready"] = job["video_url"]
+                        newly_done = True
+                elif state in FINAL_STATES:
+                    st.markdown(f"<div class='video-status-error'>❌ {job['label']} — فشل التوليد: "
+                                f"{job['error'] or state}</div>", unsafe_allow_html=True)
                 else:
-                    progress = status.get("progress", 0)
+                    # Luma/Runway يُرجعان نسبة (0-1) و Veo نسبة مئوية
+                    progress = float(job.get("progress") or 0)
+                    pct = f"{int(progress * 100 if progress <= 1 else progress)}%"
+                    elapsed = int(time.time() - job["submitted"])
                     st.markdown(f"""
                     <div class='video-status-pending'>
-                      ⏳ الحالة: {state} — التقدم: {int(progress*100) if progress else '?'}%<br>
-                      انتظر قليلاً ثم انقر "فحص الحالة" مجدداً
+                      ⏳ {job['label']} — الحالة: {state} — التقدم: {pct if progress else '?'}
+                      — منذ {elapsed // 60}:{elapsed % 60:02d}
                     </div>
                     """, unsafe_allow_html=True)
+            with jc2:
+                if st.button("🗑️", key=f"forget_video_{job['id']}", help="إزالة من القائمة"):
+                    POLLER.forget(job["id"])
+                    st.session_state["video_jobs"].remove(job["id"])
+                    st.rerun()
+    # اكتمال فيديو جديد يحدّث بقية الصفحة (النشر، الحفظ في Supabase…)
+    if newly_done:
+        st.rerun(scope="app")
 
-        with check_col2:
-            if st.button("⏳ انتظار تلقائي (5 دقائق)", use_container_width=True, key="wait_video"):
-                progress_bar = st.progress(0, text="⏳ في انتظار اكتمال الفيديو...")
-                for i in range(30):
-                    time_wait = i / 30
-                    progress_bar.progress(time_wait, text=f"⏳ انتظار... {i*10} ثانية")
-                    if provider == "luma":
-                        status = check_luma_status(gen_id)
-                    elif provider == "fal":
-                        status = check_fal_video_status(gen_id)
-                    else:
-                        status = check_runway_status(gen_id)
-                    if status.get("state") == "completed":
-                        video_url = status.get("video_url", "")
-                        progress_bar.progress(1.0, text="✅ الفيديو جاهز!")
-                        st.markdown(f"""
-                        <div class='video-status-done'>
-                          ✅ الفيديو جاهز! 
-                          <a href="{video_url}" target="_blank" style="color:#A0FFD8; font-weight:900;">
-                            ← تحميل الفيديو
-                          </a>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        st.video(video_url)
-                        st.session_state["video_url_ready"] = video_url
-                        break
-                    elif status.get("state") in ["failed", "error"]:
-                        progress_bar.progress(1.0, text="❌ فشل التوليد")
-                        st.error(f"فشل: {status.get('error', '')}")
-                        break
-                    import time as time_module
-                    time_module.sleep(10)
-
-        # عرض الفيديو إذا كان جاهزاً
-        if "video_url_ready" in st.session_state:
-            st.markdown(f"""
-            <div style='background:rgba(52,211,153,0.10); border:1.5px solid #34d399;
-                 border-radius:0.65rem; padding:0.8rem; margin-top:0.5rem; text-align:center;'>
-              <a href="{st.session_state['video_url_ready']}" target="_blank"
-                 style='color:#A0FFD8; font-weight:900; font-size:1rem;'>
-                ⬇️ تحميل الفيديو المكتمل ←
-              </a>
-            </div>
-            """, unsafe_allow_html=True)
 
-        # مسح الجلسة
-        if st.button("🗑️ مسح وبدء فيديو جديد", key="clear_video_session"):
-            for k in ["video_gen_id", "video_gen_provider", "video_url_ready"]:
-                st.session_state.pop(k, None)
-            st.rerun()
+def _show_video_jobs_panel():
+    """لوحة كل طلبات الفيديو في الجلسة — تُحدَّث كل 5 ثوانٍ ما دام هناك طلب معلّق"""
+    job_ids = st.session_state.get("video_jobs", [])
+    if not job_ids:
+        return
+    st.markdown("---")
+    st.markdown("### 📊 حالة الفيديوهات")
+    pending = any(j["state"] not in FINAL_STATES for j in POLLER.jobs(job_ids))
+    st.fragment(_render_video_jobs, run_every=5 if pending else None)()
+
+    if st.button("🗑️ مسح القائمة وبدء فيديو جديد", key="clear_video_session"):
+        for job_id in job_ids:
+            POLLER.forget(job_id)
+        for k in ["video_jobs", "video_jobs_done", "video_url_ready"]:
+            st.session_state.pop(k, None)
+        st.rerun()
+
+
+# ─── عرض البث التدريجي ───────────────────────────────────────────────────────
+def _preview_text(value) -> str:
+    if isinstance(value, dict):
+        return value.get("caption") or value.get("content") or value.get("title") or ""
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return str(value)
+
+
+def _stream_fields(fields, labels: dict) -> dict:
+    """
+    عرض حقول JSON المبثوثة فور اكتمال كل حقل — يُرجع القاموس الكامل.
+    المعاينة تُمسح في النهاية ليتولى العرض العادي (بعناصره القابلة للتحرير) النتيجة
+    """
+    result = {}
+    live = st.empty()
+    try:
+        for key, value in fields:
+            result[key] = value
+            with live.container():
+                for k, v in result.items():
+                    st.markdown(f"**{labels.get(k, k)}**")
+                    st.caption(_preview_text(v))
+    except Exception as e:
+        # ما اكتمل قبل الخطأ يبقى صالحاً للعرض
+        if not result:
+            result = {"error": str(e)}
+        else:
+            st.warning(f"⚠️ انقطع البث بعد {len(result)} حقول: {e}")
+    finally:
+        live.empty()
+    return result
+
+
+def _stream_story(parts) -> str:
+    """عرض القصة كلمةً بكلمة أثناء وصولها"""
+    text = ""
+    live = st.empty()
+    try:
+        for chunk in parts:
+            text += chunk
+            live.markdown(text + " ▌")
+    except Exception as e:
+        if not text:
+            return f"خطأ في توليد القصة: {e}"
+    finally:
+        live.empty()
+    return text.strip()
+
+
+def _image_result(img, caption: str, label: str, file_name: str, key: str = None):
+    """
+    عرض صورة (بايتات أو ImageArtifact) مع زر تحميلها — نتيجة المزود تُعرض من رابطه
+    مباشرةً، وما دامت بايتاتها تُجلب في الخلفية يُحمَّل الملف من CDN المزود
+    """
+    st.image(display_source(img), caption=caption, use_container_width=True)
+    if isinstance(img, ImageArtifact) and not img.ready:
+        st.link_button(label, img.url, use_container_width=True)
+    else:
+        st.download_button(label, as_bytes(img), file_name, "image/jpeg",
+                           use_container_width=True, key=key)
+
+
+def _generate_buttons(label: str, key: str) -> tuple:
+    """زر التوليد + زر "جديد" بجانبه يتجاوز كاش الردود — (ضُغط أحدهما، fresh)"""
+    go_col, fresh_col = st.columns([4, 1])
+    with go_col:
+        go = st.button(label, type="primary", use_container_width=True, key=key)
+    with fresh_col:
+        fresh = st.button("🔄 جديد", use_container_width=True, key=f"{key}_fresh",
+                          help="تجاهل النتيجة المحفوظة وتوليد نسخة جديدة")
+    return go or fresh, fresh
 
 
 # ─── ✅ تبويب توليد الصورة المفردة ───────────────────────────────────────────
@@ -850,6 +872,10 @@ def _show_single_image_tab(perfume_info: dict):
             key="single_img_aspect"
         )
         img_extra = st.text_input("✨ إضافات خاصة", placeholder="مثال: golden rain, rose petals", key="single_img_extra")
+        img_hedge = st.checkbox(
+            "⚡ تحوّط ضد البطء — إن تأخر المزود الأول يُطلق الثاني بالتوازي (قد يضاعف التكلفة أحياناً)",
+            key="single_img_hedge",
+        )
 
     remix_bytes = None
     if img_type == "✨ ريمكس (تغيير الخلفية)":
@@ -879,20 +905,16 @@ def _show_single_image_tab(perfume_info: dict):
             try:
                 if img_type == "✨ ريمكس (تغيير الخلفية)" and remix_bytes:
                     img_bytes = generate_image_remix_fal(prompt, remix_bytes, remix_strength)
+                elif img_hedge:
+                    img_bytes, _ = generate_image_hedged(prompt, img_aspect)
                 else:
                     img_bytes = smart_generate_image(prompt, img_aspect)
             except Exception as e:
                 st.error(f"❌ فشل توليد الصورة: {e}")
 
             if img_bytes:
-                st.image(img_bytes, caption=f"✅ {img_type}", use_container_width=True)
-                st.download_button(
-                    "⬇️ تحميل الصورة",
-                    img_bytes,
-                    f"mahwous_{img_type}_{img_aspect.replace(':','x')}.jpg",
-                    "image/jpeg",
-                    use_container_width=True
-                )
+                _image_result(img_bytes, f"✅ {img_type}", "⬇️ تحميل الصورة",
+                              f"mahwous_{img_type}_{img_aspect.replace(':','x')}.jpg")
 
 
 # ─── Smart Trends Panel ───────────────────────────────────────────────────────
@@ -923,7 +945,8 @@ def _show_smart_trends_panel(perfume_info: dict):
     if refresh or not cached:
         with st.spinner("🔄 جاري تحليل الترندات..."):
             try:
-                data = generate_trend_insights(perfume_info)
+                # "تحديث" فوق نتيجة معروضة = تحليل جديد يتجاوز كاش الردود
+                data = generate_trend_insights(perfume_info, fresh=bool(refresh and cached))
                 st.session_state[product_key] = data
                 cached = data
             except Exception as e:
@@ -1001,7 +1024,7 @@ def _show_trends_tab(perfume_info: dict):
         if st.button("🔥 تحليل الترندات الآن", type="primary", use_container_width=True, key="trends_full_btn"):
             with st.spinner("🔍 يحلل الذكاء الاصطناعي المنتج ويبحث عن الترندات..."):
                 try:
-                    data = generate_trend_insights(perfume_info)
+                    data = generate_trend_insights(perfume_info, fresh=bool(cached))
                     st.session_state[product_key] = data
                     cached = data
                     st.session_state.gen_count = st.session_state.get("gen_count", 0) + 1
@@ -1190,9 +1213,10 @@ def _show_trends_tab(perfume_info: dict):
     st.markdown("---")
     st.markdown("#### 🕵️ جاسوس المنافسين")
     comp_name = st.text_input("اسم المنافس أو علامته التجارية", placeholder="مثال: Arabian Oud, Chanel...")
-    if comp_name and st.button("تحليل المنافس", key="analyze_comp_btn"):
+    comp_clicked, comp_fresh = _generate_buttons("تحليل المنافس", "analyze_comp_btn") if comp_name else (False, False)
+    if comp_clicked:
         with st.spinner("🕵️ جاري التجسس والتحليل..."):
-            comp_data = analyze_competitor(perfume_info, comp_name)
+            comp_data = analyze_competitor(perfume_info, comp_name, fresh=comp_fresh)
             
             c1, c2 = st.columns(2)
             with c1:
@@ -1203,9 +1227,88 @@ def _show_trends_tab(perfume_info: dict):
                 st.info(f"🎬 محتوى مقترح: {comp_data.get('suggested_content')}")
 
 
+# ─── Full Content Pack ────────────────────────────────────────────────────────
+_PACK_SESSION_KEYS = {
+    "images":       "generated_images",
+    "captions":     "captions_data",
+    "descriptions": "descriptions_data",
+    "hashtags":     "hashtags_data",
+    "story":        "story_data",
+    "scenario":     "scenario_data",
+}
+
+
+def _pack_result_ok(name: str, result) -> bool:
+    if name == "images":
+        return any(v.get("bytes") for v in (result or {}).values())
+    if name == "story":
+        return bool(result) and not str(result).startswith("خطأ")
+    return isinstance(result, dict) and "error" not in result
+
+
+def _show_content_pack_panel(perfume_info: dict):
+    """الحزمة الكاملة — كل المحتوى في تمريرة واحدة متوازية مع شريط تقدم موحّد"""
+    from modules.pipeline import iter_content_pack, pack_task_names, PACK_TASKS
+
+    pc1, pc2 = st.columns([3, 1])
+    with pc2:
+        with_video = st.checkbox("🎬 مع فيديو", value=False, key="pack_with_video",
+                                 help="إرسال فيديو تلقائياً بعد اكتمال السيناريو والصور")
+    with pc1:
+        run = st.button("⚡ توليد الحزمة الكاملة (صور + نصوص + سيناريو + ترندات)",
+                        type="primary", use_container_width=True, key="gen_full_pack")
+    if not run:
+        return
+
+    video_provider = ""
+    if with_video:
+        # الموجّه يختار الأسرع والأسلم حالياً (أو المثبَّت في الإعدادات)
+        video_provider = next(iter(video_provider_order()), "")
+        if not video_provider:
+            st.warning("⚠️ لا يوجد مفتاح فيديو — ستُولَّد الحزمة بدون فيديو")
+
+    opts = {
+        "platforms":         st.session_state.get("selected_platforms") or list(PLATFORMS.keys()),
+        "outfit":            st.session_state.get("outfit_select", "suit"),
+        "scene":             st.session_state.get("scene_select", "store"),
+        "include_character": st.session_state.get("include_char", True),
+        "ramadan_mode":      st.session_state.get("ramadan_mode", False),
+        "video_provider":    video_provider,
+    }
+    names = pack_task_names(opts)
+    trends_key = f"trends_{perfume_info.get('product_name','')}"
+
+    with st.status("⚡ جاري توليد الحزمة الكاملة بالتوازي...", expanded=True) as status:
+        progress = st.progress(0.0, text=f"0 / {len(names)}")
+        failed = 0
+        for i, (name, result) in enumerate(iter_content_pack(perfume_info, opts), 1):
+            ok = _pack_result_ok(name, result)
+            failed += 0 if ok else 1
+            if name in _PACK_SESSION_KEYS:
+                st.session_state[_PACK_SESSION_KEYS[name]] = _keep_images(result) if name == "images" else result
+            elif name == "trends":
+                st.session_state[trends_key] = result
+            elif name == "video" and ok:
+                _track_video_result(result, video_provider)
+            label = PACK_TASKS[name]["label"]
+            if ok:
+                st.write(f"✅ {label}")
+            else:
+                err = result.get("error", "") if isinstance(result, dict) else str(result)
+                st.write(f"❌ {label} — {str(err)[:150]}")
+            progress.progress(i / len(names), text=f"{i} / {len(names)}")
+        st.session_state.gen_count = st.session_state.get("gen_count", 0) + len(names) - failed
+        status.update(
+            label="✅ اكتملت الحزمة" if not failed else f"⚠️ اكتملت الحزمة — {failed} مهمة فشلت",
+            state="complete" if not failed else "error",
+            expanded=bool(failed),
+        )
+
+
 # ─── Main Studio Page ──────────────────────────────────────────────────────────
 def show_studio_page():
     st.markdown(STUDIO_CSS, unsafe_allow_html=True)
+    BLOBS.touch(_media_session())
 
     # تحميل المفاتيح في بداية الصفحة
     secrets = _get_secrets()
@@ -1382,22 +1485,20 @@ def show_studio_page():
                 )
                 if char_img:
                     st.image(char_img, caption="✅ مرجع مهووس", use_container_width=True)
-                    _ref_val = char_img.getvalue()
-                    st.session_state.char_reference = _ref_val
-                    st.session_state.char_reference_bytes = _ref_val
+                    _keep_media("char_reference_blob", char_img.getvalue())
                 else:
-                    st.session_state.char_reference_bytes = None
+                    _keep_media("char_reference_blob", None)
             elif ref_choice != "none":
                 asset_path = BUILTIN_REFS[ref_choice][1]
                 ref_bytes = load_asset_bytes(asset_path)
                 if ref_bytes:
                     st.image(ref_bytes, caption=f"✅ {BUILTIN_REFS[ref_choice][0]}", use_container_width=True)
-                    st.session_state.char_reference_bytes = ref_bytes
+                    _keep_media("char_reference_blob", ref_bytes)
                 else:
                     st.warning("⚠️ تعذّر تحميل الصورة المرجعية")
-                    st.session_state.char_reference_bytes = None
+                    _keep_media("char_reference_blob", None)
             else:
-                st.session_state.char_reference_bytes = None
+                _keep_media("char_reference_blob", None)
 
         if not uploaded:
             _show_how_it_works()
@@ -1442,6 +1543,15 @@ def show_studio_page():
             perfume_info["mood"]   = c6.text_input("المزاج", perfume_info.get("mood", "فاخر"))
             perfume_info["bottle_shape"] = st.text_area("شكل الزجاجة", perfume_info.get("bottle_shape", ""), height=60)
             perfume_info["notes_guess"]  = st.text_input("ملاحظات العطر المتوقعة", perfume_info.get("notes_guess", ""))
+            # التحليل قد يأتي من كاش البصمة لصورة مشابهة — إعادة التحليل تتجاوزه
+            if has_gemini and st.button("🔄 إعادة التحليل", key="reanalyze_btn"):
+                with st.spinner("🔍 إعادة تحليل صورة العطر..."):
+                    try:
+                        st.session_state[analyze_key] = analyze_perfume_image(image_bytes, fresh=True)
+                    except Exception as e:
+                        st.error(f"❌ فشل التحليل: {e}")
+                    else:
+                        st.rerun()
 
 
     else:  # Manual mode
@@ -1471,6 +1581,11 @@ def show_studio_page():
 
     st.markdown("---")
 
+    # ─── Full Content Pack: كل شيء بنقرة واحدة ─────────────────────────────
+    _show_content_pack_panel(perfume_info)
+
+    st.markdown("---")
+
     # ─── Main Tabs ───────────────────────────────────────────────────────────
     tab_images, tab_video, tab_single, tab_captions, tab_scenario, tab_content, tab_publish, tab_trends = st.tabs([
         "🖼️ توليد الصور",
@@ -1558,7 +1673,7 @@ def show_studio_page():
                                 include_character=include_char,
                                 ramadan_mode=ramadan_mode
                             )
-                        st.session_state.generated_images = results
+                        st.session_state.generated_images = _keep_images(results)
                         st.session_state.gen_count = st.session_state.get("gen_count", 0) + len(selected_platforms)
                         st.success(f"✅ تم توليد {len([r for r in results.values() if r.get('bytes')])} صورة بنجاح!")
                     except Exception as e:
@@ -1600,52 +1715,75 @@ def show_studio_page():
             st.markdown("---")
             st.markdown('<div class="step-badge">⑥ الصور المولدة</div>', unsafe_allow_html=True)
 
-            # ZIP download
-            zip_data = _create_zip(results, perfume_info)
+            # ZIP download — يُبنى عند الطلب فقط ويُعاد استخدامه ما دامت الصور نفسها
             brand_name = perfume_info.get("brand", "mahwous").replace(" ", "_").lower()
-            st.download_button(
-                f"📦 تحميل جميع الصور ZIP ({len([r for r in results.values() if r.get('bytes')])} صورة)",
-                zip_data,
-                f"{brand_name}_mahwous_studio.zip",
-                "application/zip",
-                use_container_width=True,
-                key="download_zip"
-            )
+            zip_label = f"📦 تحميل جميع الصور ZIP ({len(exportable_images(results))} صورة)"
+            zip_path = cached_zip(results, perfume_info)
+            if not zip_path and st.button(zip_label.replace("تحميل", "تجهيز", 1),
+                                          use_container_width=True, key="prepare_zip"):
+                with st.spinner("📦 تجهيز الأرشيف..."):
+                    zip_path = build_zip(results, perfume_info)
+            if zip_path:
+                with open(zip_path, "rb") as zip_file:
+                    st.download_button(
+                        zip_label,
+                        zip_file,
+                        f"{brand_name}_mahwous_studio.zip",
+                        "application/zip",
+                        use_container_width=True,
+                        key="download_zip"
+                    )
 
             # عرض الصور في شبكة
             cols = st.columns(3)
             col_idx = 0
             for key, data in results.items():
-                if data.get("bytes"):
-                    with cols[col_idx % 3]:
-                        st.image(data["bytes"], caption=f"{data['label']} ({data['w']}×{data['h']})", use_container_width=True)
+                if not data.get("blob"):
+                    continue
+                with cols[col_idx % 3]:
+                    source = _img_source(data)
+                    if source is None:
+                        # أُخليت من مخزن الوسائط (حصة الجلسة أو خمول طويل) — توليد هذه المنصة فقط
+                        st.info(f"🗑️ {data['emoji']} {data['label']} ({data['w']}×{data['h']}) — "
+                                f"انتهت صلاحية الصورة المحفوظة")
+                        if st.button("🔄 إعادة التوليد", key=f"regen_{key}", use_container_width=True):
+                            with st.spinner("⚡ جاري التوليد..."):
+                                try:
+                                    fresh = generate_platform_images(
+                                        info=perfume_info,
+                                        selected_platforms=[key],
+                                        outfit=outfit,
+                                        scene=scene,
+                                        include_character=include_char,
+                                        ramadan_mode=ramadan_mode
+                                    )
+                                    results[key] = _keep_image(key, fresh[key])
+                                    st.rerun()
+                                except Exception as e:
+                                    st.error(f"❌ فشل التوليد: {e}")
+                    else:
+                        st.image(source, caption=f"{data['label']} ({data['w']}×{data['h']})", use_container_width=True)
+                        img = _img(data)
                         st.download_button(
                             f"⬇️ {data['emoji']}",
-                            data["bytes"],
+                            img,
                             f"{key}.jpg",
                             "image/jpeg",
                             use_container_width=True,
                             key=f"dl_{key}"
                         )
-                        
+
                         # زر رفع الدقة
                         if st.button(f"🔍 رفع الدقة 4K", key=f"upscale_{key}", use_container_width=True):
                             with st.spinner("✨ جاري رفع دقة الصورة وتحسين التفاصيل..."):
-                                up_res = upscale_image_fal(data["bytes"])
+                                up_res = upscale_image_fal(img)
                                 if up_res["success"]:
                                     st.success("تم رفع الدقة!")
-                                    st.image(up_res["bytes"], caption=f"✨ {data['label']} (Upscaled)", use_container_width=True)
-                                    st.download_button(
-                                        "⬇️ تحميل 4K",
-                                        up_res["bytes"],
-                                        f"{key}_upscaled.jpg",
-                                        "image/jpeg",
-                                        use_container_width=True,
-                                        key=f"dl_up_{key}"
-                                    )
+                                    _image_result(up_res["image"], f"✨ {data['label']} (Upscaled)",
+                                                  "⬇️ تحميل 4K", f"{key}_upscaled.jpg", key=f"dl_up_{key}")
                                 else:
                                     st.error(f"فشل: {up_res.get('error')}")
-                    col_idx += 1
+                col_idx += 1
 
     # ════════════════════════════════════════════════════════════
     # TAB 2: توليد الفيديو المباشر
@@ -1667,32 +1805,30 @@ def show_studio_page():
     # ════════════════════════════════════════════════════════════
     with tab_captions:
         st.markdown("### ✍️ توليد التعليقات لجميع المنصات")
-        if st.button("✍️ توليد التعليقات الآن", type="primary", use_container_width=True, key="gen_captions"):
-            with st.spinner("✍️ توليد التعليقات..."):
-                try:
-                    captions = generate_all_captions(perfume_info)
-                    st.session_state.captions_data = captions
-                except Exception as e:
-                    st.error(f"❌ {e}")
+        platform_names = {
+            # المقاسات الثلاثة الجديدة (v13.0)
+            "post_1_1":   "📸 منشور مربع 1:1",
+            "story_9_16": "📱 قصة عمودية 9:16",
+            "wide_16_9":  "🎬 عريض أفقي 16:9",
+            # مفاتيح قديمة للتوافق مع generate_all_captions التي قد تُنتج مفاتيح بأسماء المنصات
+            "instagram_post": "📸 Instagram Post", "instagram_story": "📱 Instagram Story",
+            "tiktok": "🎵 TikTok", "youtube_short": "▶️ YouTube Short",
+            "youtube_thumb": "🎬 YouTube Thumbnail", "twitter": "🐦 Twitter/X",
+            "facebook": "👍 Facebook", "snapchat": "👻 Snapchat",
+            "linkedin": "💼 LinkedIn", "pinterest": "📌 Pinterest",
+            "whatsapp": "💬 WhatsApp", "telegram": "✈️ Telegram"
+        }
+        clicked, fresh = _generate_buttons("✍️ توليد التعليقات الآن", "gen_captions")
+        if clicked:
+            # كل منصة تظهر فور اكتمالها في البث
+            st.session_state.captions_data = _stream_fields(
+                stream_all_captions(perfume_info, fresh=fresh), platform_names)
 
         if "captions_data" in st.session_state:
             captions = st.session_state.captions_data
             if "error" in captions:
                 st.error(captions["error"])
             else:
-                platform_names = {
-                    # المقاسات الثلاثة الجديدة (v13.0)
-                    "post_1_1":   "📸 منشور مربع 1:1",
-                    "story_9_16": "📱 قصة عمودية 9:16",
-                    "wide_16_9":  "🎬 عريض أفقي 16:9",
-                    # مفاتيح قديمة للتوافق مع generate_all_captions التي قد تُنتج مفاتيح بأسماء المنصات
-                    "instagram_post": "📸 Instagram Post", "instagram_story": "📱 Instagram Story",
-                    "tiktok": "🎵 TikTok", "youtube_short": "▶️ YouTube Short",
-                    "youtube_thumb": "🎬 YouTube Thumbnail", "twitter": "🐦 Twitter/X",
-                    "facebook": "👍 Facebook", "snapchat": "👻 Snapchat",
-                    "linkedin": "💼 LinkedIn", "pinterest": "📌 Pinterest",
-                    "whatsapp": "💬 WhatsApp", "telegram": "✈️ Telegram"
-                }
                 for plat_key, plat_label in platform_names.items():
                     if plat_key in captions:
                         data = captions[plat_key]
@@ -1727,10 +1863,12 @@ def show_studio_page():
                                         key="scen_outfit")
             scen_dur = st.select_slider("المدة", [5,7,10,15], value=7, key="scen_dur")
 
-        if st.button("🎬 توليد السيناريو", type="primary", use_container_width=True, key="gen_scenario"):
+        clicked, fresh = _generate_buttons("🎬 توليد السيناريو", "gen_scenario")
+        if clicked:
             with st.spinner("🎬 توليد السيناريو..."):
                 try:
-                    scenario = generate_scenario(perfume_info, scen_type, scen_scene, scen_outfit, scen_dur)
+                    scenario = generate_scenario(perfume_info, scen_type, scen_scene, scen_outfit, scen_dur,
+                                                 fresh=fresh)
                     st.session_state.scenario_data = scenario
                 except Exception as e:
                     st.error(f"❌ {e}")
@@ -1784,15 +1922,16 @@ def show_studio_page():
                             voice_id=st.session_state.get("voice_id", "default"),
                             api_key=st.session_state.get("elevenlabs_key", "")
                         )
-                        st.session_state.voiceover_bytes = audio_bytes
+                        _keep_media("voiceover_blob", audio_bytes, "audio/mpeg")
                     except Exception as e:
                         st.error(f"❌ فشل التوليد: {e}")
 
-        if "voiceover_bytes" in st.session_state:
-            st.audio(st.session_state.voiceover_bytes, format="audio/mpeg")
+        voiceover = blob_bytes(st.session_state.get("voiceover_blob"))
+        if voiceover:
+            st.audio(voiceover, format="audio/mpeg")
             st.download_button(
                 "⬇️ تحميل الصوت (MP3)",
-                st.session_state.voiceover_bytes,
+                voiceover,
                 "voiceover.mp3",
                 "audio/mpeg",
                 use_container_width=True,
@@ -1808,15 +1947,16 @@ def show_studio_page():
         content_tabs = st.tabs(["📖 الأوصاف", "#️⃣ الهاشتاقات", "📖 القصة"])
 
         with content_tabs[0]:
-            if st.button("📖 توليد الأوصاف", type="primary", use_container_width=True, key="gen_desc"):
-                with st.spinner("📖 توليد الأوصاف..."):
-                    try:
-                        descs = generate_descriptions(perfume_info)
-                        st.session_state.descriptions_data = descs
-                    except Exception as e:
-                        st.error(f"❌ {e}")
+            desc_labels = {"short": "📱 قصير", "medium": "📸 متوسط", "long": "📖 طويل",
+                           "ad": "📣 إعلان", "seo": "🔍 SEO"}
+            clicked, fresh = _generate_buttons("📖 توليد الأوصاف", "gen_desc")
+            if clicked:
+                st.session_state.descriptions_data = _stream_fields(
+                    stream_descriptions(perfume_info, fresh=fresh), desc_labels)
             if "descriptions_data" in st.session_state:
                 descs = st.session_state.descriptions_data
+                if "error" in descs:
+                    st.error(descs["error"])
                 for key, label in [("short","📱 قصير"), ("medium","📸 متوسط"), ("long","📖 طويل"), ("ad","📣 إعلان")]:
                     if key in descs:
                         with st.expander(label):
@@ -1829,10 +1969,11 @@ def show_studio_page():
                         st.text_area("المحتوى", seo.get("content",""), height=100, key="seo_content")
 
         with content_tabs[1]:
-            if st.button("#️⃣ توليد الهاشتاقات", type="primary", use_container_width=True, key="gen_hash"):
+            clicked, fresh = _generate_buttons("#️⃣ توليد الهاشتاقات", "gen_hash")
+            if clicked:
                 with st.spinner("#️⃣ توليد الهاشتاقات..."):
                     try:
-                        hashtags = generate_hashtags(perfume_info)
+                        hashtags = generate_hashtags(perfume_info, fresh=fresh)
                         st.session_state.hashtags_data = hashtags
                     except Exception as e:
                         st.error(f"❌ {e}")
@@ -1847,13 +1988,9 @@ def show_studio_page():
                             st.markdown(tags_html, unsafe_allow_html=True)
 
         with content_tabs[2]:
-            if st.button("📖 توليد قصة العطر", type="primary", use_container_width=True, key="gen_story"):
-                with st.spinner("📖 توليد القصة..."):
-                    try:
-                        story = generate_perfume_story(perfume_info)
-                        st.session_state.story_data = story
-                    except Exception as e:
-                        st.error(f"❌ {e}")
+            clicked, fresh = _generate_buttons("📖 توليد قصة العطر", "gen_story")
+            if clicked:
+                st.session_state.story_data = _stream_story(stream_perfume_story(perfume_info, fresh=fresh))
             if "story_data" in st.session_state:
                 st.text_area("📖 قصة العطر", st.session_state.story_data, height=300, key="story_text")
 
@@ -1910,7 +2047,7 @@ def show_studio_page():
         sc1, sc2, sc3 = st.columns(3)
         with sc1:
             if has_images:
-                img_count = len([v for v in st.session_state.generated_images.values() if v.get("bytes")])
+                img_count = len([v for v in st.session_state.generated_images.values() if v.get("blob")])
                 st.markdown(f"<span class='api-badge-ok'>🖼️ {img_count} صور جاهزة</span>", unsafe_allow_html=True)
             else:
                 st.markdown("<span class='api-badge-no'>🖼️ لا توجد صور — ولّد صوراً أولاً</span>", unsafe_allow_html=True)
@@ -1954,8 +2091,8 @@ def show_studio_page():
             preview_images = {}
             if has_images:
                 for key, data in st.session_state.generated_images.items():
-                    if data.get("bytes") and key in selected_publish_platforms:
-                        preview_images[key] = f"[صورة {data['w']}×{data['h']} — {len(data['bytes'])//1024} KB]"
+                    if data.get("blob") and key in selected_publish_platforms:
+                        preview_images[key] = f"[صورة {data['w']}×{data['h']} — {data['blob'].size//1024} KB]"
             preview_payload = {
                 "perfume": {
                     "brand": perfume_info.get("brand", ""),
@@ -1978,13 +2115,13 @@ def show_studio_page():
             st.info("💡 أضف MAKE_WEBHOOK_URL في الإعدادات ثم انقر النشر")
         else:
             if st.button("📤 نشر الآن عبر Make.com", type="primary", use_container_width=True, key="publish_btn"):
-                # بناء image_urls من الصور المولّدة (base64 data URIs)
+                # بناء image_urls من الصور المولّدة (روابط مرفوعة مرة واحدة، أو data URIs)
                 image_urls = {}
                 if has_images:
                     for key, data in st.session_state.generated_images.items():
-                        if data.get("bytes") and key in selected_publish_platforms:
-                            b64 = base64.b64encode(data["bytes"]).decode()
-                            image_urls[key] = f"data:image/jpeg;base64,{b64}"
+                        img = _img(data) if key in selected_publish_platforms else None
+                        if img:
+                            image_urls[key] = image_ref(img)
 
                 video_url  = st.session_state.get("video_url_ready", "")
                 captions   = st.session_state.get("captions_data", {})
@@ -3,21 +3,17 @@
 حفظ واسترجاع بيانات العطور من Supabase
 """
 
-import requests
 import json
 import time
 
+from modules import http_client
+
 
 def _get_supabase_config():
     """جلب إعدادات Supabase"""
-    import streamlit as st
-    try:
-        url = st.session_state.get("supabase_url") or st.secrets.get("SUPABASE_URL", "")
-        key = st.session_state.get("supabase_key") or st.secrets.get("SUPABASE_KEY", "")
-    except Exception:
-        url = st.session_state.get("supabase_url", "")
-        key = st.session_state.get("supabase_key", "")
-    return url, key
+    from modules.ai_engine import _get_secrets
+    secrets = _get_secrets()
+    return secrets.get("supabase_url", ""), secrets.get("supabase_key", "")
 
 
 def save_perfume_to_supabase(info: dict, images: dict, video_url: str = "") -> dict:
@@ -40,7 +36,7 @@ def save_perfume_to_supabase(info: dict, images: dict, video_url: str = "") -> d
     }
 
     try:
-        resp = requests.post(
+        resp = http_client.post(
             f"{supabase_url}/rest/v1/perfume_history",
             headers={
                 "apikey": supabase_key,
@@ -65,7 +61,7 @@ def fetch_perfume_history(limit: int = 15) -> list:
         return []
 
     try:
-        resp = requests.get(
+        resp = http_client.get(
             f"{supabase_url}/rest/v1/perfume_history?select=*&order=created_at.desc&limit={limit}",
             headers={
                 "apikey": supabase_key,
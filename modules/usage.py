@@ -0,0 +1,69 @@
+"""
+🧾 محاسبة الاستخدام الفعلي — Mahwous AI Studio v13.1
+كل مهمة (تعليقات، أوصاف…) تفتح سجلاً في السياق، وطبقات المحرك تسجّل فيه ما حدث
+فعلاً: طلب مدفوع لدى مزود بعينه، أو إصابة كاش، أو جزء من حزمة مدمجة دفع ثمنها
+غيرها — فتُحسب التكلفة لكل مهمة من الواقع لا من المفاتيح المتاحة
+"""
+
+import contextlib
+import contextvars
+from typing import Optional
+
+from modules.router import estimate_cost
+
+API    = "api"       # طلب شبكة مدفوع
+CACHE  = "cache"     # رد محفوظ — بلا تكلفة
+BUNDLE = "bundle"    # جزء من حزمة مدمجة دفعت ثمنها مهمة أخرى — بلا تكلفة
+
+_USAGE: contextvars.ContextVar = contextvars.ContextVar("mahwous_usage", default=None)
+
+
+class Usage:
+    """ما سُجّل داخل المهمة: [(المزود، المصدر)] بترتيب الحدوث"""
+
+    def __init__(self):
+        self.events: list = []
+
+    def note(self, provider: str, source: str = API):
+        self.events.append((provider, source))
+
+    @property
+    def provider(self) -> str:
+        """المزود الذي أنتج النتيجة — آخر طلب مدفوع، وإلا آخر مصدر مسجّل"""
+        paid = [p for p, s in self.events if s == API]
+        if paid:
+            return paid[-1]
+        return self.events[-1][0] if self.events else ""
+
+    @property
+    def source(self) -> str:
+        """API إن دُفع أي طلب، وإلا مصدر آخر حدث (كاش/حزمة) — "" إن لم يُسجّل شيء"""
+        if any(s == API for _, s in self.events):
+            return API
+        return self.events[-1][1] if self.events else ""
+
+    def cost(self, kind: str) -> float:
+        """مجموع تكلفة الطلبات المدفوعة فقط (إعادة السؤال تُحتسب طلباً ثانياً)"""
+        return sum(estimate_cost(p, kind) for p, s in self.events if s == API)
+
+
+@contextlib.contextmanager
+def track_usage():
+    """سجل جديد للمهمة داخل الكتلة — ينتقل تلقائياً إلى asyncio.to_thread والمهام الفرعية"""
+    usage = Usage()
+    token = _USAGE.set(usage)
+    try:
+        yield usage
+    finally:
+        _USAGE.reset(token)
+
+
+def current_usage() -> Optional[Usage]:
+    return _USAGE.get()
+
+
+def note_usage(provider: str, source: str = API):
+    """تسجيل حدث في سجل المهمة النشط (إن وُجد) — "gemini/gemini-2.0-flash" ← "gemini" """
+    usage = _USAGE.get()
+    if usage is not None:
+        usage.note(provider.split("/", 1)[0], source)
@@ -0,0 +1,178 @@
+"""
+🎞️ مُتابِع الفيديو الخلفي — Mahwous AI Studio v13.1
+يتابع كل طلبات الفيديو المعلّقة (Luma / Runway / Fal / Veo) في حلقة asyncio الخلفية
+بفواصل فحص متزايدة، ويحفظ آخر حالة في مخزن مشترك تقرؤه الواجهة عند كل إعادة تشغيل —
+فلا يُحجز خيط الجلسة بانتظار الفيديو
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from typing import Optional
+
+from modules.ai_engine import (
+    check_luma_status, check_runway_status, check_fal_video_status,
+)
+from modules.async_engine import SCHEDULER
+from modules.router import ROUTER
+
+# الفاصل يبدأ قصيراً ويتضاعف حتى الحد الأقصى (ثوانٍ)
+POLL_FIRST    = 5.0
+POLL_BACKOFF  = 1.5
+POLL_MAX      = 60.0
+POLL_TIMEOUT  = 20 * 60
+FINAL_STATES  = ("completed", "failed", "error", "timeout")
+
+# عدد أخطاء الشبكة المتتالية قبل اعتبار المهمة فاشلة
+MAX_CHECK_ERRORS = 5
+
+
+def _check(job: dict) -> dict:
+    """فحص حالة مهمة واحدة لدى مزودها"""
+    provider, gen_id, key = job["provider"], job["gen_id"], job["api_key"]
+    if provider == "luma":
+        return check_luma_status(gen_id, api_key=key)
+    if provider == "runway":
+        return check_runway_status(gen_id, api_key=key)
+    if provider == "veo":
+        from modules.gemini_engine import gemini_video_status
+        status = gemini_video_status(gen_id, api_key=key)
+        status.pop("raw", None)
+        if status.get("video_uri"):
+            status["video_url"] = status["video_uri"]
+        return status
+    # kling / hailuo / seedance / veo2 … كلها عبر طابور Fal
+    return check_fal_video_status(gen_id, job.get("model_id", ""), api_key=key)
+
+
+def _status_provider(provider: str) -> str:
+    """حصة التزامن التي يُحتسب عليها الفحص"""
+    if provider in ("luma", "runway"):
+        return provider
+    return "gemini" if provider == "veo" else "fal"
+
+
+class VideoPoller:
+    """مخزن مشترك لمهام الفيديو + مهمة متابعة لكل طلب في حلقة SCHEDULER"""
+
+    def __init__(self):
+        self._jobs: dict = {}
+        self._lock = threading.Lock()
+
+    # ─── التسجيل ─────────────────────────────────────────────────────────────
+    def track(self, provider: str, gen_id: str, model_id: str = "", api_key: str = "",
+              label: str = "", backend: str = "") -> str:
+        """
+        بدء متابعة طلب فيديو — يُرجع معرف المهمة فوراً.
+        backend = اسم المزود عند الموجّه (kling / luma …) لتسجيل زمن الاكتمال
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        job = {
+            "id": job_id, "provider": provider, "gen_id": gen_id, "model_id": model_id,
+            "api_key": api_key, "label": label or provider, "backend": backend or provider,
+            "state": "pending", "progress": 0, "video_url": "", "error": "",
+            "submitted": now, "checked": 0.0, "next_check": now + POLL_FIRST,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+        SCHEDULER.submit(self._watch(job_id))
+        return job_id
+
+    def add_completed(self, provider: str, video_url: str, label: str = "") -> str:
+        """تسجيل فيديو جاهز فوراً (Fal المتزامن) ليظهر مع بقية المهام"""
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "id": job_id, "provider": provider, "gen_id": "", "model_id": "",
+                "api_key": "", "label": label or provider, "backend": provider, "state": "completed",
+                "progress": 1, "video_url": video_url, "error": "",
+                "submitted": now, "checked": now, "next_check": 0.0,
+            }
+        return job_id
+
+    # ─── القراءة ─────────────────────────────────────────────────────────────
+    def status(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            # المفتاح لا يغادر المخزن
+            return {k: v for k, v in job.items() if k != "api_key"}
+
+    def jobs(self, job_ids: list) -> list:
+        return [s for s in (self.status(j) for j in job_ids) if s]
+
+    def forget(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def wait(self, job_id: str, timeout: float = 300) -> dict:
+        """انتظار متزامن لمهمة (للسكربتات والتشغيل الدفعي — لا يُستخدم في الواجهة)"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            status = self.status(job_id) or {"state": "error", "error": "مهمة غير معروفة"}
+            if status["state"] in FINAL_STATES:
+                return status
+            time.sleep(1)
+        return {"state": "timeout", "error": "انتهت المهلة الزمنية"}
+
+    # ─── المتابعة ────────────────────────────────────────────────────────────
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    async def _watch(self, job_id: str):
+        interval = POLL_FIRST
+        errors = 0
+        while True:
+            await asyncio.sleep(interval)
+            with self._lock:
+                job = dict(self._jobs[job_id]) if job_id in self._jobs else None
+            if job is None:
+                return  # أُلغيت من الواجهة
+            if time.time() - job["submitted"] > POLL_TIMEOUT:
+                self._update(job_id, state="timeout", error="انتهت المهلة الزمنية")
+                ROUTER.record("video", job["backend"], POLL_TIMEOUT, False)
+                return
+            try:
+                status = await SCHEDULER.call(_status_provider(job["provider"]), _check, job)
+            except Exception as e:
+                status = {"state": "error", "error": str(e)[:200]}
+
+            state = status.get("state", "")
+            now = time.time()
+            if state == "error":
+                # خطأ شبكة عابر — نعيد المحاولة قبل إعلان الفشل
+                errors += 1
+                if errors < MAX_CHECK_ERRORS:
+                    interval = min(interval * POLL_BACKOFF, POLL_MAX)
+                    self._update(job_id, checked=now, next_check=now + interval,
+                                 error=status.get("error", ""))
+                    continue
+            else:
+                errors = 0
+
+            # زمن الاكتمال الكلي (من الإرسال) هو ما يقيسه الموجّه لفئة الفيديو
+            if state == "completed" and status.get("video_url"):
+                self._update(job_id, state="completed", progress=1,
+                             video_url=status["video_url"], error="", checked=now)
+                ROUTER.record("video", job["backend"], now - job["submitted"], True)
+                return
+            if state in ("completed", "failed", "error"):
+                self._update(job_id, state="failed" if state == "completed" else state,
+                             error=status.get("error", "") or "لم يتم إرجاع رابط الفيديو",
+                             checked=now)
+                ROUTER.record("video", job["backend"], now - job["submitted"], False)
+                return
+
+            interval = min(interval * POLL_BACKOFF, POLL_MAX)
+            self._update(job_id, state=state or "processing",
+                         progress=status.get("progress", 0) or 0, error="",
+                         checked=now, next_check=now + interval)
+
+
+POLLER = VideoPoller()
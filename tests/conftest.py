@@ -0,0 +1,34 @@
+"""
+إعداد الاختبارات: كل الكاشات والفهارس في مجلد مؤقت، ولا مفاتيح حقيقية —
+يجب ضبط البيئة قبل استيراد أي وحدة من modules (الكاشات تُنشأ عند الاستيراد)
+"""
+
+import os
+import tempfile
+
+os.environ["MAHWOUS_CACHE_DIR"] = tempfile.mkdtemp(prefix="mahwous-tests-")
+os.environ["MAHWOUS_SECRETS_FILE"] = os.path.join(os.environ["MAHWOUS_CACHE_DIR"], "none.toml")
+os.environ.pop("MAHWOUS_RATE_DB", None)
+
+import pytest  # noqa: E402
+
+
+class FakeClock:
+    """ساعة يدوية بديلة لـ time.time / time.monotonic / time.sleep"""
+
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += max(0.0, seconds)
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
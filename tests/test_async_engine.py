@@ -0,0 +1,41 @@
+import pytest
+
+from modules import async_engine as ae
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """يستبدل SCHEDULER.call ويسجل حصة أي مزود حُجزت لكل استدعاء"""
+    seen = []
+
+    async def fake_call(provider, fn, *args, **kwargs):
+        seen.append(provider)
+        return fn(*args, **kwargs)
+    monkeypatch.setattr(ae.SCHEDULER, "call", fake_call)
+    monkeypatch.setattr(ae, "cached_image_any", lambda prompt, aspect: None)
+    return seen
+
+
+def test_router_choice_takes_its_own_slot(monkeypatch, calls):
+    monkeypatch.setattr(ae, "image_backend_order", lambda aspect: ("k", ["gemini", "fal"]))
+    monkeypatch.setattr(ae, "generate_image_on", lambda backend, prompt, aspect: b"img-" + backend.encode())
+    img, provider = ae.SCHEDULER.run(ae.generate_image_routed_async("p"))
+    assert (img, provider) == (b"img-gemini", "gemini")
+    assert calls == ["gemini"]
+
+
+def test_fallback_takes_next_backend_slot(monkeypatch, calls):
+    def generate(backend, prompt, aspect):
+        if backend == "fal":
+            raise ValueError("down")
+        return b"ok"
+    monkeypatch.setattr(ae, "image_backend_order", lambda aspect: ("k", ["fal", "gemini"]))
+    monkeypatch.setattr(ae, "generate_image_on", generate)
+    assert ae.SCHEDULER.run(ae.generate_image_routed_async("p")) == (b"ok", "gemini")
+    assert calls == ["fal", "gemini"]
+
+
+def test_no_backend(monkeypatch, calls):
+    monkeypatch.setattr(ae, "image_backend_order", lambda aspect: ("k", []))
+    with pytest.raises(ValueError):
+        ae.SCHEDULER.run(ae.generate_image_routed_async("p"))
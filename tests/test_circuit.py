@@ -0,0 +1,104 @@
+import pytest
+
+from modules import circuit
+from modules.circuit import (
+    CLOSED, COOLDOWN_FIRST, COOLDOWN_MAX, FAILURE_THRESHOLD, HALF_OPEN, OPEN, PERMANENT_TTL,
+    CircuitBreaker, CircuitOpenError, key_fingerprint,
+)
+from modules.http_client import circuit_target
+
+TARGET = ("fp", "gemini", "gemini-2.0-flash")
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    monkeypatch.setattr(circuit.time, "time", clock)
+    return CircuitBreaker()
+
+
+def _fail(breaker, times=1, status=503):
+    for _ in range(times):
+        breaker.record(*TARGET, status=status)
+
+
+def test_permanent_status_opens_for_hours(breaker, clock):
+    breaker.record(*TARGET, status=404)
+    assert breaker.state(*TARGET) == OPEN
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before(*TARGET)
+    assert info.value.reason == "HTTP 404"
+    clock.advance(PERMANENT_TTL - 1)
+    assert breaker.state(*TARGET) == OPEN
+    clock.advance(1)
+    assert breaker.state(*TARGET) == HALF_OPEN
+
+
+def test_transient_failures_open_at_threshold(breaker):
+    _fail(breaker, FAILURE_THRESHOLD - 1)
+    assert breaker.before(*TARGET) is False
+    breaker.record(*TARGET, error=True)
+    assert breaker.state(*TARGET) == OPEN
+    with pytest.raises(CircuitOpenError) as info:
+        breaker.before(*TARGET)
+    assert info.value.reason == "network"
+
+
+def test_half_open_allows_single_probe(breaker, clock):
+    _fail(breaker, FAILURE_THRESHOLD)
+    clock.advance(COOLDOWN_FIRST)
+    assert breaker.before(*TARGET) is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before(*TARGET)
+    # الطلب التجريبي لم يُرسل — التالي يأخذ مكانه
+    breaker.release(*TARGET)
+    assert breaker.before(*TARGET) is True
+
+
+def test_failed_probe_doubles_cooldown_up_to_max(breaker, clock):
+    _fail(breaker, FAILURE_THRESHOLD)
+    cooldown = COOLDOWN_FIRST
+    while cooldown < COOLDOWN_MAX:
+        clock.advance(cooldown)
+        assert breaker.before(*TARGET) is True
+        _fail(breaker)
+        cooldown = min(cooldown * 2, COOLDOWN_MAX)
+        clock.advance(cooldown - 1)
+        assert breaker.state(*TARGET) == OPEN
+        clock.advance(1)
+        assert breaker.state(*TARGET) == HALF_OPEN
+    breaker.before(*TARGET)
+    _fail(breaker)
+    clock.advance(COOLDOWN_MAX)
+    assert breaker.state(*TARGET) == HALF_OPEN
+
+
+def test_success_closes(breaker, clock):
+    _fail(breaker, FAILURE_THRESHOLD)
+    clock.advance(COOLDOWN_FIRST)
+    breaker.before(*TARGET)
+    breaker.record(*TARGET, status=200)
+    assert breaker.state(*TARGET) == CLOSED
+    assert breaker.snapshot() == []
+    # العدّاد بدأ من جديد
+    _fail(breaker, FAILURE_THRESHOLD - 1)
+    assert breaker.state(*TARGET) == CLOSED
+
+
+def test_targets_are_independent(breaker):
+    breaker.record("fp", "elevenlabs", "v1/text-to-speech/bad-voice", status=404)
+    assert breaker.before("fp", "elevenlabs", "v1/text-to-speech/good-voice") is False
+    assert breaker.before("other", "elevenlabs", "v1/text-to-speech/bad-voice") is False
+    assert [s["model"] for s in breaker.snapshot()] == ["v1/text-to-speech/bad-voice"]
+
+
+def test_is_open_uses_key_fingerprint(breaker):
+    breaker.record(key_fingerprint("secret"), "fal", "", status=402)
+    assert breaker.is_open("secret", "fal")
+    assert not breaker.is_open("another", "fal")
+    assert key_fingerprint("") == ""
+
+
+def test_circuit_target():
+    assert circuit_target("https://x.test/v1/models/m:generate", "m") == "m"
+    assert circuit_target("https://api.elevenlabs.io/v1/text-to-speech/abc?x=1", "") == \
+        "v1/text-to-speech/abc"
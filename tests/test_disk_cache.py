@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from modules import disk_cache
+from modules.disk_cache import DiskCache, content_key
+
+
+@pytest.fixture
+def make_cache(monkeypatch, tmp_path, clock):
+    monkeypatch.setattr(disk_cache, "CACHE_ROOT", str(tmp_path))
+    monkeypatch.setattr(disk_cache.time, "time", clock)
+
+    def _make(max_bytes=1_000, ttl=100.0):
+        return DiskCache("test", max_bytes=max_bytes, ttl=ttl)
+    return _make
+
+
+def test_content_key_is_stable():
+    assert content_key("a", {"x": 1, "y": 2}) == content_key("a", {"y": 2, "x": 1})
+    assert content_key("a", 1) != content_key("a", "1")
+    assert len(content_key()) == 64
+
+
+def test_roundtrip_and_delete(make_cache):
+    cache = make_cache()
+    cache.put("k1", b"data")
+    cache.put("empty", b"")
+    assert cache.get("k1") == b"data"
+    assert cache.get("empty") is None
+    cache.delete("k1")
+    assert cache.get("k1") is None
+
+
+def test_ttl_expiry_removes_file(make_cache, clock):
+    cache = make_cache(ttl=100)
+    cache.put("k", b"data")
+    clock.advance(100)
+    assert cache.get("k") == b"data"
+    clock.advance(1)
+    assert cache.get("k") is None
+    assert not os.path.exists(cache._path("k"))
+
+
+def test_shorter_read_ttl_keeps_entry(make_cache, clock):
+    cache = make_cache(ttl=100)
+    cache.put("k", b"data")
+    clock.advance(30)
+    assert cache.get("k", ttl=10) is None
+    assert cache.get("k") == b"data"
+
+
+def test_lru_eviction_by_size(make_cache, clock):
+    cache = make_cache(max_bytes=10)
+    cache.put("a", b"1234")
+    clock.advance(1)
+    cache.put("b", b"1234")
+    clock.advance(1)
+    cache.get("a")  # a أحدث استخداماً من b
+    clock.advance(1)
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"1234"
+
+
+def test_put_drops_expired_entries(make_cache, clock):
+    cache = make_cache(ttl=10)
+    cache.put("old", b"x")
+    clock.advance(11)
+    cache.put("new", b"y")
+    keys = [k for (k,) in cache._db().execute("SELECT key FROM entries")]
+    assert keys == ["new"]
+
+
+def test_missing_file_is_a_miss(make_cache):
+    cache = make_cache()
+    cache.put("k", b"data")
+    os.remove(cache._path("k"))
+    assert cache.get("k") is None
+    assert cache._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 0
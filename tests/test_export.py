@@ -0,0 +1,48 @@
+import io
+import zipfile
+
+from PIL import Image
+
+from modules.blob_store import BLOBS
+from modules.export import build_zip, cached_zip, exportable_images, zip_signature
+
+INFO = {"brand": "b", "product_name": "p"}
+
+
+def _jpeg(color, size=(40, 40)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _images(session, colors=("red", "blue")):
+    return {
+        "post": {"blob": BLOBS.put(session, "images/post", _jpeg(colors[0])), "w": 40, "h": 40},
+        "story": {"blob": BLOBS.put(session, "images/story", _jpeg(colors[1])), "w": 20, "h": 40},
+    }
+
+
+def test_zip_cached_by_content():
+    images = _images("zip-a")
+    assert cached_zip(images, INFO) is None
+    path = build_zip(images, INFO)
+    assert cached_zip(images, INFO) == path
+    with zipfile.ZipFile(path) as zf:
+        names = sorted(zf.namelist())
+        assert names == ["info.json", "post_40x40.jpg", "story_20x40.jpg"]
+        assert zf.getinfo("post_40x40.jpg").compress_type == zipfile.ZIP_STORED
+
+
+def test_evicted_blob_not_cached_under_full_signature():
+    images = _images("zip-b", ("green", "yellow"))
+    full = zip_signature(images, INFO)
+    BLOBS.release("zip-b", "images/story")
+    assert list(exportable_images(images)) == ["post"]
+    assert zip_signature(images, INFO) != full
+    path = build_zip(images, INFO)
+    with zipfile.ZipFile(path) as zf:
+        assert "story_20x40.jpg" not in zf.namelist()
+    # الصورة نفسها بعد إعادة توليدها (نفس المفتاح) تحتاج أرشيفاً جديداً كاملاً
+    regenerated = _images("zip-b", ("green", "yellow"))
+    assert zip_signature(regenerated, INFO) == full
+    assert cached_zip(regenerated, INFO) != path
@@ -0,0 +1,129 @@
+import email.utils
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from modules import http_client
+from modules.http_client import RetryPolicy, retry_after_seconds, safe_to_retry
+
+
+def _response(status: int, headers: dict = None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp.headers.update(headers or {})
+    resp._content, resp._content_consumed = b"", True
+    return resp
+
+
+# ─── RetryPolicy.delay ────────────────────────────────────────────────────────
+@pytest.fixture
+def full_jitter(monkeypatch):
+    # jitter كامل بأقصى قيمته — الانتظار يساوي السقف المحسوب
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+
+
+def test_backoff_doubles_up_to_cap(full_jitter):
+    policy = RetryPolicy(max_attempts=10, base=1.0, cap=5.0)
+    assert [policy.delay(n, None, 100) for n in range(4)] == [1.0, 2.0, 4.0, 5.0]
+
+
+def test_stops_after_max_attempts(full_jitter):
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.delay(1, None, 100) is not None
+    assert policy.delay(2, None, 100) is None
+
+
+def test_retry_after_overrides_backoff(full_jitter):
+    policy = RetryPolicy(max_attempts=3, max_retry_after=60)
+    assert policy.delay(0, 12.0, 100) == 12.0
+    assert policy.delay(0, 61.0, 100) is None
+
+
+def test_wait_beyond_remaining_gives_up(full_jitter):
+    policy = RetryPolicy(max_attempts=5, base=4.0)
+    assert policy.delay(0, None, 4.0) is None
+    assert policy.delay(0, 3.0, 2.5) is None
+    assert policy.delay(0, 3.0, 3.5) == 3.0
+
+
+# ─── Retry-After ──────────────────────────────────────────────────────────────
+def test_retry_after_seconds(monkeypatch, clock):
+    monkeypatch.setattr(http_client.time, "time", clock)
+    assert retry_after_seconds(_response(429)) is None
+    assert retry_after_seconds(_response(429, {"Retry-After": "7"})) == 7.0
+    assert retry_after_seconds(_response(429, {"Retry-After": "-3"})) == 0.0
+    assert retry_after_seconds(_response(429, {"Retry-After": "soon"})) is None
+    date = email.utils.formatdate(clock() + 30, usegmt=True)
+    assert retry_after_seconds(_response(503, {"Retry-After": date})) == pytest.approx(30, abs=1)
+
+
+# ─── safe_to_retry ────────────────────────────────────────────────────────────
+def _refused() -> requests.exceptions.ConnectionError:
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.exceptions.ConnectionError(MaxRetryError(None, "/", reason))
+
+
+def _aborted() -> requests.exceptions.ConnectionError:
+    return requests.exceptions.ConnectionError(ProtocolError("Connection aborted."))
+
+
+def test_post_retried_only_if_never_sent():
+    assert safe_to_retry("POST", _refused())
+    assert safe_to_retry("POST", requests.exceptions.ConnectTimeout())
+    assert not safe_to_retry("POST", _aborted())
+    assert not safe_to_retry("POST", requests.exceptions.ReadTimeout())
+
+
+def test_get_retried_on_any_connection_error():
+    assert safe_to_retry("get", _aborted())
+    assert not safe_to_retry("GET", requests.exceptions.ReadTimeout())
+
+
+# ─── حلقة الطلب ──────────────────────────────────────────────────────────────
+class FakeSession:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def session(monkeypatch, clock):
+    def _install(*outcomes):
+        fake = FakeSession(*outcomes)
+        monkeypatch.setattr(http_client, "get_session", lambda provider: fake)
+        return fake
+
+    monkeypatch.setattr(http_client.time, "sleep", clock.sleep)
+    monkeypatch.setattr(http_client.time, "monotonic", clock)
+    monkeypatch.setattr(http_client.LIMITER, "acquire", lambda *a, **k: None)
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+    return _install
+
+
+def test_post_retries_503_then_succeeds(session, clock):
+    fake = session(_response(503, {"Retry-After": "2"}), _response(200))
+    start = clock()
+    resp = http_client.request("POST", "https://example.test/retry-503", provider="default")
+    assert resp.status_code == 200 and fake.calls == 2
+    assert clock() - start == 2.0
+
+
+def test_post_returns_500_without_retry(session):
+    fake = session(_response(500), _response(200))
+    resp = http_client.request("POST", "https://example.test/no-retry-500", provider="default")
+    assert resp.status_code == 500 and fake.calls == 1
+
+
+def test_post_aborted_connection_not_resent(session):
+    fake = session(_aborted(), _response(200))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.request("POST", "https://example.test/aborted", provider="default")
+    assert fake.calls == 1
@@ -0,0 +1,53 @@
+import sqlite3
+
+from modules.job_store import DONE, FAILED, RUNNING, JobStore
+
+
+def test_pending_skips_done_and_exhausted(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    artifacts = ["captions", "video", "hashtags"]
+    assert store.pending("p", artifacts) == artifacts
+    store.start("p", "captions")
+    store.finish("p", "captions", True, provider="gemini", source="bundle")
+    for _ in range(3):
+        store.start("p", "video")
+        store.finish("p", "video", False, error="boom")
+    assert store.pending("p", artifacts, max_attempts=3) == ["hashtags"]
+    assert store.pending("p", artifacts, max_attempts=4) == ["video", "hashtags"]
+
+
+def test_finish_records_provider_source_and_cost(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.ensure("p", ["image:tiktok"])
+    store.start("p", "image:tiktok")
+    store.finish("p", "image:tiktok", True, provider="fal", source="api", cost=0.0125)
+    row = store.get("p", "image:tiktok")
+    assert (row["status"], row["provider"], row["source"], row["cost"]) == (DONE, "fal", "api", 0.0125)
+
+
+def test_recover_running(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    store.ensure("p", ["captions", "video"])
+    store.start("p", "captions")
+    store.finish("p", "captions", True)
+    store.start("p", "video")
+    assert store.get("p", "video")["status"] == RUNNING
+    assert store.recover_running() == 1
+    row = store.get("p", "video")
+    assert (row["status"], row["error"], row["attempts"]) == (FAILED, "interrupted", 1)
+    assert store.get("p", "captions")["status"] == DONE
+
+
+def test_old_database_gains_source_column(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tasks (product TEXT, artifact TEXT, status TEXT, attempts INTEGER DEFAULT 0,"
+        " provider TEXT DEFAULT '', cost REAL DEFAULT 0, output TEXT DEFAULT '',"
+        " error TEXT DEFAULT '', updated REAL, PRIMARY KEY (product, artifact))"
+    )
+    conn.execute("INSERT INTO tasks(product, artifact, status) VALUES ('p', 'captions', 'done')")
+    conn.commit()
+    conn.close()
+    row = JobStore(path).get("p", "captions")
+    assert (row["status"], row["source"]) == (DONE, "")
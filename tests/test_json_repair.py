@@ -0,0 +1,107 @@
+import pytest
+import requests
+
+from modules import ai_engine
+from modules.json_repair import (
+    STRING, STRING_LIST, extract_json, missing_fields, schema_object, top_level_keys,
+)
+
+SCHEMA = schema_object({
+    "a": STRING,
+    "b": STRING,
+    "tags": STRING_LIST,
+    "seo": schema_object({"title": STRING}),
+})
+
+
+# ─── extract_json ─────────────────────────────────────────────────────────────
+def test_clean_json_untouched():
+    assert extract_json('{"a": "x", "n": 1}') == {"a": "x", "n": 1}
+
+
+def test_fences_and_prose():
+    text = 'إليك النتيجة:\n```json\n{"a": "x"}\n```\nشكراً'
+    assert extract_json(text) == {"a": "x"}
+
+
+def test_smart_quotes_and_trailing_commas():
+    assert extract_json('{“a”: “x”, "b": [1, 2,],}') == {"a": "x", "b": [1, 2]}
+
+
+def test_truncated_object_closed():
+    assert extract_json('{"a": "x", "seo": {"title": "t"') == {"a": "x", "seo": {"title": "t"}}
+
+
+def test_truncated_string_dropped():
+    # القيمة المقطوعة في منتصفها لا تُقبل — يظهر حقلها ناقصاً
+    assert extract_json('{"a": "x", "b": "نص مقط') == {"a": "x"}
+
+
+def test_unrecoverable_raises():
+    with pytest.raises(ValueError):
+        extract_json("لا يوجد JSON هنا")
+
+
+# ─── missing_fields ───────────────────────────────────────────────────────────
+def test_missing_fields_nested_and_empty():
+    data = {"a": "x", "b": "", "tags": [], "seo": {}}
+    assert missing_fields(data, SCHEMA) == ["b", "tags", "seo"]
+    assert missing_fields({"a": "x", "b": "y", "tags": ["t"], "seo": {"title": ""}}, SCHEMA) \
+        == ["seo.title"]
+
+
+def test_missing_fields_complete():
+    data = {"a": "x", "b": "y", "tags": ["t"], "seo": {"title": "t"}}
+    assert missing_fields(data, SCHEMA) == []
+
+
+def test_top_level_keys():
+    assert top_level_keys(["seo.title", "scenes[2].audio", "seo.desc", "a"]) == ["seo", "scenes", "a"]
+
+
+# ─── generate_json ────────────────────────────────────────────────────────────
+def _replies(monkeypatch, *replies):
+    calls = []
+
+    def fake(prompt, max_tokens=2000, *args, **kwargs):
+        calls.append(prompt)
+        reply = replies[len(calls) - 1]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+    monkeypatch.setattr(ai_engine, "_call_claude", fake)
+    return calls
+
+
+def test_generate_json_reasks_only_missing(monkeypatch):
+    calls = _replies(monkeypatch,
+                     '{"a": "x", "tags": ["t"], "seo": {"title": "s"}',
+                     '{"b": "y", "a": "تجاهل"}')
+    data = ai_engine.generate_json("p", SCHEMA)
+    assert data == {"a": "x", "b": "y", "tags": ["t"], "seo": {"title": "s"}}
+    assert len(calls) == 2 and "b" in calls[1].split("---")[1]
+
+
+def test_generate_json_keeps_fields_when_reask_fails(monkeypatch):
+    _replies(monkeypatch, '{"a": "x"', requests.exceptions.ReadTimeout("slow"))
+    assert ai_engine.generate_json("p", SCHEMA) == {"a": "x"}
+
+
+def test_generate_json_provider_error_propagates(monkeypatch):
+    _replies(monkeypatch, ValueError("GEMINI_API_KEY مفقود"))
+    with pytest.raises(ValueError, match="GEMINI_API_KEY"):
+        ai_engine.generate_json("p", SCHEMA)
+
+
+def test_generate_json_reask_error_without_data_propagates(monkeypatch):
+    _replies(monkeypatch, "لا JSON", requests.exceptions.ReadTimeout("slow"))
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        ai_engine.generate_json("p", SCHEMA)
+
+
+# ─── الحزمة المدمجة ───────────────────────────────────────────────────────────
+def test_bundle_repairs_truncated_gemini_reply(monkeypatch):
+    truncated = '{"captions": {"instagram_post": {"caption": "نص"}}, "descriptions": {"short": "و'
+    monkeypatch.setattr(ai_engine, "_call_gemini_text", lambda *a, **k: truncated)
+    bundle = ai_engine._generate_bundle({"brand": "b", "product_name": "p"}, creds={"gemini": "k"})
+    assert bundle["captions"] == {"instagram_post": {"caption": "نص"}}
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from modules import ai_engine
+from modules.json_stream import JsonFieldStream
+
+DOC = {
+    "instagram_post": {"caption": "عطر \"فاخر\" {مميز}", "hashtags": ["#a", "#b"]},
+    "tiktok": {"caption": "سطر\nثانٍ \\ ورمز }"},
+    "count": 3,
+    "tags": ["x", "[y]"],
+}
+
+
+def _chunks(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_fields_complete_in_order(size):
+    text = "```json\n" + json.dumps(DOC, ensure_ascii=False, indent=2) + "\n```"
+    parser = JsonFieldStream()
+    seen = []
+    for chunk in _chunks(text, size):
+        seen += parser.feed(chunk)
+    assert seen == list(DOC.items())
+    assert parser.fields == DOC
+    assert parser.done
+
+
+def test_field_emitted_as_soon_as_it_closes():
+    parser = JsonFieldStream()
+    assert parser.feed('{"a": {"caption": "x"}') == []
+    assert parser.feed(', "b": ') == [("a", {"caption": "x"})]
+    assert not parser.done
+    assert parser.feed('"y"}  trailing') == [("b", "y")]
+    assert parser.done
+    assert parser.feed(', "c": 1}') == []
+
+
+def test_truncated_stream_keeps_closed_fields():
+    parser = JsonFieldStream()
+    parser.feed('{"a": 1, "b": "نص مقط')
+    assert parser.fields == {"a": 1}
+    assert not parser.done
+
+
+def test_stream_json_fields_falls_back_to_full_parse(monkeypatch):
+    # علامات تنصيص ذكية لا يفهمها المحلّل التدريجي — يُصلح النص الكامل في النهاية
+    monkeypatch.setattr(ai_engine, "stream_text", lambda prompt, max_tokens: iter(['{“a”: ', '1,}']))
+    assert list(ai_engine.stream_json_fields("p")) == [("a", 1)]
@@ -0,0 +1,92 @@
+import pytest
+
+from modules import ai_engine, rate_limit
+from modules.rate_limit import MemoryBuckets, RateLimiter, SqliteBuckets, parse_limits
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+    monkeypatch.setattr(rate_limit.time, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """ميزانيات معزولة — بلا قراءة أسرار أو بيئة ما لم يطلبها الاختبار"""
+    table = {}
+    monkeypatch.setattr(rate_limit, "RATE_LIMITS", table)
+    monkeypatch.setattr(rate_limit, "_overrides_loaded", True)
+    monkeypatch.setattr(rate_limit, "BURST_SECONDS", 10.0)
+    return table
+
+
+# ─── الدلاء ───────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("make", [lambda tmp: MemoryBuckets(),
+                                  lambda tmp: SqliteBuckets(str(tmp / "rate.db"))])
+def test_bucket_burst_then_refill(make, tmp_path, fake_time, limits):
+    buckets = make(tmp_path)
+    # 60/دقيقة = رمز في الثانية، والسعة 10 ثوانٍ منها
+    assert all(buckets.take("x|rpm", 60, 1) == 0 for _ in range(10))
+    assert buckets.take("x|rpm", 60, 1) == pytest.approx(1.0)
+    fake_time.advance(2.5)
+    assert buckets.take("x|rpm", 60, 2) == 0
+    assert buckets.take("x|rpm", 60, 1) == pytest.approx(0.5)
+
+
+def test_cost_above_capacity_is_clamped(fake_time, limits):
+    buckets = MemoryBuckets()
+    assert buckets.take("big|tpm", 60, 1_000) == 0
+    assert buckets.take("big|tpm", 60, 1_000) == pytest.approx(10.0)
+
+
+# ─── المحدِّد ─────────────────────────────────────────────────────────────────
+def test_acquire_waits_for_provider_and_model(fake_time, limits):
+    limits.update({"p": {"rpm": 600}, "p:m": {"rpm": 6}})
+    limiter = RateLimiter(MemoryBuckets())
+    assert limiter.acquire("p", "m") == 0
+    # دلو النموذج (سعة 1) هو الأضيق: رمز كل 10 ثوانٍ
+    assert limiter.acquire("p", "m") == pytest.approx(10.0)
+    assert limiter.acquire("p", "other") == 0
+
+
+def test_acquire_gives_up_after_max_wait(fake_time, limits):
+    limits["q"] = {"rpm": 6}
+    limiter = RateLimiter(MemoryBuckets())
+    limiter.acquire("q")
+    assert limiter.acquire("q", max_wait=3.0) == pytest.approx(3.0)
+
+
+def test_tokens_charged_against_tpm(fake_time, limits):
+    limits["t"] = {"tpm": 6_000}
+    limiter = RateLimiter(MemoryBuckets())
+    assert limiter.acquire("t", tokens=1_000) == 0
+    assert limiter.acquire("t", tokens=0) == 0  # بلا رموز — لا سحب من TPM
+    assert limiter.acquire("t", tokens=500) == pytest.approx(5.0)
+
+
+def test_unknown_provider_not_limited(limits):
+    assert RateLimiter(MemoryBuckets()).acquire("nobody") == 0
+
+
+# ─── الميزانيات ───────────────────────────────────────────────────────────────
+def test_parse_limits_skips_invalid():
+    assert parse_limits("gemini:gemini-2.0-flash=2000, fal=600, bad, x=abc, =5") == {
+        "gemini:gemini-2.0-flash": 2000.0, "fal": 600.0,
+    }
+    assert parse_limits(None) == {}
+
+
+def test_override_precedence(monkeypatch, limits):
+    limits.update({"fal": {"rpm": 120}, "gemini": {"rpm": 120, "tpm": 10}})
+    monkeypatch.setattr(rate_limit, "_overrides_loaded", False)
+    monkeypatch.setattr(ai_engine, "_file_secrets",
+                        lambda: {"MAHWOUS_RPM": "fal=300, gemini=200", "MAHWOUS_TPM": "gemini=50"})
+    monkeypatch.setenv("MAHWOUS_RPM", "fal=900")
+    monkeypatch.delenv("MAHWOUS_TPM", raising=False)
+    rate_limit._load_overrides()
+    assert limits["fal"] == {"rpm": 900.0}                    # البيئة تتقدم على الأسرار
+    assert limits["gemini"] == {"rpm": 200.0, "tpm": 50.0}     # الأسرار تتقدم على الافتراضي
+    rate_limit.configure_limit("fal", rpm=30)                  # سطر الأوامر يتقدم على الكل
+    assert limits["fal"] == {"rpm": 30}
@@ -0,0 +1,74 @@
+import concurrent.futures
+import threading
+
+import pytest
+
+from modules import single_flight
+from modules.single_flight import SingleFlight
+
+
+@pytest.fixture
+def flight(monkeypatch, clock):
+    monkeypatch.setattr(single_flight.time, "time", clock)
+    return SingleFlight(ttl=60, max_entries=2)
+
+
+def test_concurrent_callers_share_one_call(flight):
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return {"v": 1}
+
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.run, "k", slow) for _ in range(4)]
+        while not flight._inflight:
+            pass
+        release.set()
+        results = [f.result(5) for f in futures]
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+def test_result_kept_for_ttl(flight, clock):
+    calls = []
+    fn = lambda: calls.append(1) or len(calls)  # noqa: E731
+    assert flight.run("k", fn) == 1
+    clock.advance(60)
+    assert flight.run("k", fn) == 1 and flight.peek("k") == 1
+    clock.advance(1)
+    assert flight.peek("k") is None
+    assert flight.run("k", fn) == 2
+
+
+def test_forget_and_max_entries(flight):
+    for key in ("a", "b", "c"):
+        flight.run(key, lambda key=key: key)
+    assert flight.peek("a") is None
+    assert flight.peek("c") == "c"
+    flight.forget("c")
+    assert flight.run("c", lambda: "again") == "again"
+
+
+def test_errors_shared_but_not_cached(flight):
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("boom")
+
+    with concurrent.futures.ThreadPoolExecutor(2) as pool:
+        owner = pool.submit(flight.run, "k", fail)
+        while not flight._inflight:
+            pass
+        waiter = pool.submit(flight.run, "k", lambda: "unused")
+        # المنتظر داخل future.result() قبل أن يفشل المالك
+        while not flight._inflight["k"]._condition._waiters:
+            pass
+        release.set()
+        for future in (owner, waiter):
+            with pytest.raises(ValueError):
+                future.result(5)
+    assert flight.run("k", lambda: "ok") == "ok"
@@ -0,0 +1,95 @@
+import io
+
+import pytest
+from PIL import Image
+
+from modules import ai_engine
+from modules.llm_cache import cached_completion, store_completion
+from modules.router import estimate_cost
+from modules.usage import API, BUNDLE, CACHE, Usage, note_usage, track_usage
+
+
+def _jpeg(color="red", size=(60, 100)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+# ─── Usage ────────────────────────────────────────────────────────────────────
+def test_usage_empty():
+    usage = Usage()
+    assert (usage.provider, usage.source, usage.cost("text")) == ("", "", 0)
+
+
+def test_usage_paid_request_wins():
+    usage = Usage()
+    usage.note("gemini", CACHE)
+    usage.note("openrouter", API)
+    assert usage.provider == "openrouter"
+    assert usage.source == API
+    assert usage.cost("text") == estimate_cost("openrouter", "text")
+
+
+def test_usage_cache_only_is_free():
+    usage = Usage()
+    usage.note("gemini", CACHE)
+    assert (usage.provider, usage.source, usage.cost("text")) == ("gemini", CACHE, 0)
+
+
+def test_note_usage_strips_model_and_needs_tracking():
+    note_usage("gemini/gemini-2.0-flash")  # بلا سجل نشط — لا شيء
+    with track_usage() as usage:
+        note_usage("openrouter/anthropic/claude-3.5-sonnet")
+    assert usage.events == [("openrouter", API)]
+
+
+def test_llm_cache_notes_request_then_hit():
+    with track_usage() as first:
+        store_completion("رد", "usage prompt", "gemini/m", 0.7, 100)
+    with track_usage() as second:
+        assert cached_completion("usage prompt", "gemini/m", 0.7, 100) == "رد"
+    assert first.events == [("gemini", API)]
+    assert second.events == [("gemini", CACHE)]
+
+
+# ─── الحزمة المدمجة ──────────────────────────────────────────────────────────
+@pytest.fixture
+def bundle_calls(monkeypatch):
+    calls = []
+
+    def fake(info, creds=None):
+        calls.append(info)
+        note_usage("gemini/gemini-2.0-flash")
+        return {"captions": {}, "descriptions": {}, "hashtags": {}, "_provider": "gemini"}
+
+    monkeypatch.setattr(ai_engine, "COMBINED_TEXT", True)
+    monkeypatch.setattr(ai_engine, "_generate_bundle", fake)
+    return calls
+
+
+def test_bundle_charged_once(bundle_calls):
+    info = {"brand": "usage", "product_name": "bundle-once"}
+    with track_usage() as owner:
+        ai_engine._bundle_part(info, "captions")
+    with track_usage() as other:
+        ai_engine._bundle_part(info, "hashtags")
+    assert len(bundle_calls) == 1
+    assert owner.events == [("gemini", API)]
+    assert (other.provider, other.source, other.cost("text")) == ("gemini", BUNDLE, 0)
+
+
+# ─── توزيع الصور ──────────────────────────────────────────────────────────────
+GROUP = {"platforms": ["instagram_story", "tiktok"]}
+
+
+def test_fan_out_splits_generation_cost():
+    out = ai_engine._fan_out_group(GROUP, _jpeg(), provider="fal")
+    share = estimate_cost("fal", "image") / 2
+    assert [e["cost"] for e in out.values()] == [share, share]
+    assert {e["source"] for e in out.values()} == {API}
+
+
+def test_fan_out_cache_hit_is_free():
+    out = ai_engine._fan_out_group(GROUP, _jpeg("blue"), provider="gemini", cached=True)
+    assert all(e["cost"] == 0 and e["source"] == CACHE and e["provider"] == "gemini"
+               for e in out.values())